@@ -1,5 +1,6 @@
 #!/usr/bin/env python
-from jsonrpc import ServiceProxy
+from jsonrpc import ServiceProxy, AmountHook
+from chainutil import BITCOIN_PROFILE, decode_message, BlockArchive, is_archive
 import sys
 import csv
 import argparse
@@ -23,8 +24,8 @@ parser.add_argument("-d", "--debug", action="store_true", help="Enable debug out
 # Enable DB dry-run -- do not send to DB, but print out to stdout
 parser.add_argument("--dryrun", action="store_true", help="Do dry run for DB, i.e. print to stdout instead of sending to DB.")
 
-# Load from directory with pickles, not AMQP
-parser.add_argument("--loadpickles", action="store", help="Load from directory with pickles, not AMQP. Requires [path] (default: .)")
+# Load from a block archive (or a directory with pickles), not AMQP
+parser.add_argument("--loadarchive", "--loadpickles", dest="loadarchive", action="store", help="Load from a block archive, or a directory with pickles, not AMQP. Requires [path] (default: .)")
 
 # Go through options passed.
 args = parser.parse_args()
@@ -47,7 +48,7 @@ for section in ["logging", "db"]:
         print("Missing section %s in config file." % section)
         config_read_fail = True
 
-if not scp.has_section("amqp") and not args.loadpickles:
+if not scp.has_section("amqp") and not args.loadarchive:
     print("Missing section amqp in config file, but AMQP loading requested." % section)
     config_read_fail = True
 
@@ -57,7 +58,7 @@ level = logging.DEBUG if args.debug else logging.INFO
 logging.basicConfig(filename=log_file, filemode="w", level=level, format='%(asctime)s:%(levelname)s:%(threadName)s: %(message)s') 
 
 # Test and get AMQP configuration
-if not args.loadpickles:
+if not args.loadarchive:
     for option in ["amqp_host", "amqp_port", "amqp_exchange", "amqp_queue", "amqp_user", "amqp_password", "amqp_routing_key"]:
         if option not in scp.options("amqp"):
             print("Missing option %s in AMQP confguration." % option)
@@ -90,7 +91,7 @@ if config_read_fail:
 
 
 # set up AMQP
-if not args.loadpickles:
+if not args.loadarchive:
     connection = pika.BlockingConnection(parameters=parameters)
     channel = connection.channel()
     channel.exchange_declare(amqp_exchange, type="fanout")
@@ -105,6 +106,9 @@ if not dry_run:
     cursor = conn.cursor()
 
 
+# the decoder reads the vout values straight into satoshi
+amounts = AmountHook(["value"], BITCOIN_PROFILE.decimals, OrderedDict)
+
 
 query_counter = 0
 def db_query_execute(query, parms):
@@ -152,6 +156,8 @@ def data_insert(body):
     parsed_txs = OrderedDict()
     for key in sorted(parsed_txs_tmp):
         parsed_txs[key] = parsed_txs_tmp[key]
+    # from here on, all amounts are in satoshi
+    helper_normalize_vout_values(parsed_txs)
 
     tx_volume = do_compute_tx_volume(parsed_txs)
     tx_fees = do_compute_tx_fee_volume(parsed_txs)
@@ -171,9 +177,28 @@ def data_insert(body):
 
 
 
+def do_rollback(block_hashes):
+    """Removes blocks that have left the chain, with everything that came with them."""
+    for block_hash in block_hashes:
+        # vins have no key to cascade along, and the addresses seen first in the block go as well
+        sql_delete_vins = "DELETE FROM " + db_schema + ".vins WHERE tx_id IN (SELECT tx_id FROM " + db_schema + ".transactions WHERE block_hash = %s)"
+        db_query_execute(sql_delete_vins, (block_hash,))
+        sql_delete_addresses = "DELETE FROM " + db_schema + ".addresses WHERE block_first_seen = %s"
+        db_query_execute(sql_delete_addresses, (block_hash,))
+        # the transactions, vouts and spks go with the block
+        sql_delete_block = "DELETE FROM " + db_schema + ".blocks WHERE block_hash = %s"
+        db_query_execute(sql_delete_block, (block_hash,))
+
+
 def amqp_callback(ch, method, properties, body):
-    body_json = json.loads(body, object_pairs_hook=OrderedDict)
-    data_insert(body_json)
+    # the extractor says if it compressed a message
+    compression = properties.content_encoding if properties is not None and properties.content_encoding else "none"
+    body_json = decode_message(body, compression, amounts)
+    # a provisional block replaced by another
+    if "rollback" in body_json:
+        do_rollback(body_json["rollback"])
+    else:
+        data_insert(body_json)
 
 
 def pickle_insert(path):
@@ -192,6 +217,16 @@ def pickle_insert(path):
             data_insert(body_json)
 
 
+def archive_insert(path):
+    # the blocks come in order of their height, the ones rolled back left out
+    archive = BlockArchive(path)
+    try:
+        for (height, body_json) in archive.blocks(amounts=amounts):
+            data_insert(body_json)
+    finally:
+        archive.close()
+
+
 
 def do_insert_vins(parsed_txs):
     for tx_index in parsed_txs:
@@ -247,7 +282,7 @@ def do_insert_vouts(parsed_txs):
         tx = parsed_txs[tx_index]
         tx_id = tx["txid"]
         for vout in tx["vout"]:
-            value = btc_to_satoshi(vout["value"])
+            value = vout["value"]
             vout_n = vout["n"]
             sql_insert_vout = "INSERT INTO " + db_schema + ".vouts (tx_id, value, vout_n) VALUES (%s, %s, %s)"
             # Just as with TX, we need to check for duplicate TX ID.
@@ -358,7 +393,7 @@ def do_compute_tx_fee(tx_index, parsed_txs):
                 # We found a referenced TX in the same block
                 for vout in parsed_txs[tx_index]["vout"]:
                     if vout["n"] == ref_vout_n:
-                        same_block_res = same_block_res + btc_to_satoshi(vout["value"])
+                        same_block_res = same_block_res + vout["value"]
                         logging.debug("Computed fees found in current block for TX %s: %s" % (tx["txid"], same_block_res))
     
     sum_vins = db_res + same_block_res
@@ -430,10 +465,19 @@ def do_insert_block(block, tx_volume, tx_fees):
 
 
 
+def helper_normalize_vout_values(parsed_txs):
+    # Values decoded with amounts are satoshi already; anything else
+    # (pickles, say) still holds floats, converted here once and for all.
+    for tx_index in parsed_txs:
+        for vout in parsed_txs[tx_index]["vout"]:
+            if isinstance(vout["value"], float):
+                vout["value"] = btc_to_satoshi(vout["value"])
+
+
 def helper_compute_vout_sum(tx):
     vout_sum = 0
     for vout in tx["vout"]:
-        vout_sum = vout_sum + btc_to_satoshi(vout["value"])
+        vout_sum = vout_sum + vout["value"]
     return vout_sum
 
 
@@ -447,12 +491,15 @@ def satoshi_to_btc(satoshi_val):
 
 
 print(' [*] Waiting for logs. To exit press CTRL+C')
-if not args.loadpickles:
+if not args.loadarchive:
     channel.basic_consume(amqp_callback, queue=amqp_queue, no_ack=True)
     channel.start_consuming()
 else:
-    if os.path.exists(args.loadpickles) and os.path.isdir(args.loadpickles):
-        pickle_insert(args.loadpickles)
+    if os.path.exists(args.loadarchive) and os.path.isdir(args.loadarchive):
+        if is_archive(args.loadarchive):
+            archive_insert(args.loadarchive)
+        else:
+            pickle_insert(args.loadarchive)
     else:
-        print("Directory %s does not exist." % args.loadpickles)
+        print("Directory %s does not exist." % args.loadarchive)
         sys.exit(-1)
@@ -0,0 +1,13 @@
+from chainutil.chains import Chain, CHAINS, BITCOIN, BITCOIN_TESTNET, NAMECOIN, PEERCOIN
+from chainutil.hashes import sha256d, hash160, ripemd160
+from chainutil.base58 import b58encode, b58encode_check, b58decode, b58decode_check
+from chainutil.bech32 import segwit_address, decode_segwit_address
+from chainutil.script import decode_script, parse_script, script_to_asm
+from chainutil.address import is_valid_address, AddressValidator
+from chainutil.pipeline import OrderedPipeline
+from chainutil.follow import TipFollower
+from chainutil.block import BlockHeader, deserialize_block, deserialize_transaction
+from chainutil.blockfile import BlockFileReader
+from chainutil.profiles import ChainProfile, PROFILES, BITCOIN_PROFILE, NAMECOIN_PROFILE, PEERCOIN_PROFILE
+from chainutil.message import encode_message, decode_message, MessageFormatException, JSON_CONTENT_TYPE, COMPRESSIONS
+from chainutil.archive import BlockArchive, ArchiveException, is_archive
@@ -0,0 +1,42 @@
+from jsonrpc.cache import LRUCache
+from chainutil.base58 import b58decode_check
+from chainutil.bech32 import decode_segwit_address
+from chainutil.chains import BITCOIN
+
+
+def is_valid_address(address, chain=BITCOIN):
+    """
+    Whether address is one of chain's, the way the isvalid of the daemon's
+    validateaddress tells: a Base58Check hash160 with its pubkey hash or
+    script hash version byte, or a witness program with its bech32 prefix.
+    """
+    try:
+        (version, payload) = b58decode_check(address)
+    except ValueError:
+        pass
+    else:
+        return len(payload) == 20 and version in (chain.pubkey_hash_version, chain.script_hash_version)
+    try:
+        decode_segwit_address(chain.bech32_hrp, address)
+    except ValueError:
+        return False
+    return True
+
+
+class AddressValidator(object):
+    """
+    is_valid_address for one chain, remembering the answers for the
+    cache_size addresses seen most recently, as the same ones tend to
+    come up again and again.
+    """
+
+    def __init__(self, chain, cache_size=10000):
+        self.chain = chain
+        self.__cache = LRUCache(cache_size)
+
+    def is_valid(self, address):
+        valid = self.__cache.get(address)
+        if valid is None:
+            valid = is_valid_address(address, self.chain)
+            self.__cache.put(address, valid)
+        return valid
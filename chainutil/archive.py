@@ -0,0 +1,222 @@
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+from chainutil.message import encode_message, decode_message
+
+INDEX_NAME = "index.dat"
+_SEGMENT_FILE = re.compile(r"^segment(\d{5})\.dat$")
+
+# a record: its kind, the height it is for, the length of the payload that follows and the CRC32 of it
+_RECORD = struct.Struct(">BiII")
+# an index entry: the kind and height of a record, and the segment and offset it is at
+_INDEX_ENTRY = struct.Struct(">BiIQ")
+_BLOCK = 1
+_ROLLBACK = 2
+
+
+class ArchiveException(Exception):
+    pass
+
+
+def is_archive(path):
+    """Whether the directory at path holds a BlockArchive."""
+    return os.path.exists(os.path.join(path, INDEX_NAME))
+
+
+class BlockArchive(object):
+    """
+    Block messages kept in a directory, appended to segment files of up to
+    segment_size bytes (segment00000.dat, segment00001.dat, ...) as records
+    of their height and length and the message, encoded by encode_message
+    and compressed with zlib.
+    A rollback, dropping the blocks from a height up, is a record as well.
+    index.dat lists where each record went; it tells read() where the block
+    at a height is, and the segments are mapped into memory to read it from.
+
+    Appends are crash-safe: a record goes to the index once it is written,
+    and sync() puts both on disk. Opened for writing, a record a crash tore
+    at the end of the last segment is cut off, along with any segment after
+    the last whole record, and the records the index lacks are added to it
+    again.
+    """
+
+    def __init__(self, path, write=False, segment_size=256 * 1024 * 1024):
+        self.path = path
+        self.write = write
+        self.segment_size = segment_size
+        self.__lock = threading.Lock()
+        # block height -> (segment, offset)
+        self.__index = {}
+        # where the next record goes
+        self.__end = (0, 0)
+        # the segments mapped into memory, by number
+        self.__maps = {}
+        self.__segment_fh = None
+        self.__index_fh = None
+        if write and not os.path.isdir(path):
+            os.makedirs(path)
+
+        index_fn = os.path.join(path, INDEX_NAME)
+        entries = []
+        if os.path.exists(index_fn):
+            with open(index_fn, "rb") as index_fh:
+                data = index_fh.read()
+            # the end of a torn entry is not there
+            for pos in xrange(0, len(data) - _INDEX_ENTRY.size + 1, _INDEX_ENTRY.size):
+                entries.append(_INDEX_ENTRY.unpack_from(data, pos))
+        elif not write:
+            raise ArchiveException("No block archive in %s" % path)
+
+        # the records are appended in order, so the index holds as far as its last entry whose record is whole;
+        # the records after that one are taken from the segments
+        indexed = len(entries)
+        while indexed > 0:
+            (kind, height, segment, offset) = entries[indexed - 1]
+            record = self.__read_record(segment, offset)
+            if record is not None and record[0] == kind and record[1] == height:
+                self.__end = (segment, offset + _RECORD.size + record[2])
+                break
+            indexed -= 1
+        for (kind, height, segment, offset) in entries[:indexed]:
+            self.__apply(kind, height, segment, offset)
+        missed = []
+        (segment, offset) = self.__end
+        while True:
+            record = self.__read_record(segment, offset)
+            if record is None:
+                if offset > 0 and os.path.exists(self.__segment_fn(segment + 1)):
+                    (segment, offset) = (segment + 1, 0)
+                    continue
+                break
+            (kind, height, length) = record
+            self.__apply(kind, height, segment, offset)
+            missed.append((kind, height, segment, offset))
+            offset += _RECORD.size + length
+            self.__end = (segment, offset)
+
+        if write:
+            (segment, offset) = self.__end
+            # a segment started when the crash came holds nothing whole, or the records would have been read
+            for name in os.listdir(path):
+                match = _SEGMENT_FILE.match(name)
+                if match and int(match.group(1)) > segment:
+                    os.remove(os.path.join(path, name))
+            self.__segment_fh = open(self.__segment_fn(segment), "ab")
+            self.__segment_fh.truncate(offset)
+            self.__index_fh = open(index_fn, "ab")
+            self.__index_fh.truncate(indexed * _INDEX_ENTRY.size)
+            for entry in missed:
+                self.__index_fh.write(_INDEX_ENTRY.pack(*entry))
+            self.__index_fh.flush()
+
+    def append(self, height, msg):
+        """Appends the message for the block at height."""
+        self.__append(_BLOCK, height, encode_message(msg, "zlib"))
+
+    def rollback(self, height):
+        """Drops the blocks from height up, as they left the chain."""
+        self.__append(_ROLLBACK, height, "")
+
+    def sync(self):
+        """Puts the records appended so far on disk."""
+        with self.__lock:
+            for fh in [self.__segment_fh, self.__index_fh]:
+                fh.flush()
+                os.fsync(fh.fileno())
+
+    def heights(self):
+        """The heights of the blocks in the archive, from the lowest up."""
+        return sorted(self.__index)
+
+    def has_block(self, height):
+        return height in self.__index
+
+    def read(self, height, amounts=None):
+        """
+        The message for the block at height, as decode_message returns it;
+        with an AmountHook as amounts, the way a database writer reads the
+        messages from AMQP.
+        """
+        (segment, offset) = self.__index[height]
+        data = self.__map(segment, offset + _RECORD.size)
+        (kind, record_height, length, crc) = _RECORD.unpack_from(data, offset)
+        data = self.__map(segment, offset + _RECORD.size + length)
+        payload = data[offset + _RECORD.size:offset + _RECORD.size + length]
+        if zlib.crc32(payload) & 0xffffffff != crc:
+            raise ArchiveException("Block %d is damaged" % height)
+        return decode_message(payload, "zlib", amounts)
+
+    def blocks(self, start=None, amounts=None):
+        """The blocks in the archive as (height, message), from start or the lowest up, read as read() does."""
+        for height in self.heights():
+            if start is None or height >= start:
+                yield (height, self.read(height, amounts))
+
+    def close(self):
+        for data in self.__maps.values():
+            data.close()
+        self.__maps = {}
+        for fh in [self.__segment_fh, self.__index_fh]:
+            if fh is not None:
+                fh.close()
+        (self.__segment_fh, self.__index_fh) = (None, None)
+
+    def __append(self, kind, height, payload):
+        with self.__lock:
+            (segment, offset) = self.__end
+            if offset > 0 and offset + _RECORD.size + len(payload) > self.segment_size:
+                # on to a new segment; sync() only sees to the last one
+                self.__segment_fh.flush()
+                os.fsync(self.__segment_fh.fileno())
+                self.__segment_fh.close()
+                (segment, offset) = (segment + 1, 0)
+                # not appended to, so the offset in the index is where the record is whatever the file held
+                self.__segment_fh = open(self.__segment_fn(segment), "wb")
+            self.__segment_fh.write(_RECORD.pack(kind, height, len(payload), zlib.crc32(payload) & 0xffffffff) + payload)
+            self.__segment_fh.flush()
+            self.__index_fh.write(_INDEX_ENTRY.pack(kind, height, segment, offset))
+            self.__index_fh.flush()
+            self.__apply(kind, height, segment, offset)
+            self.__end = (segment, offset + _RECORD.size + len(payload))
+
+    def __apply(self, kind, height, segment, offset):
+        if kind == _BLOCK:
+            self.__index[height] = (segment, offset)
+        else:
+            for dropped in [block_height for block_height in self.__index if block_height >= height]:
+                del self.__index[dropped]
+
+    def __read_record(self, segment, offset):
+        # the kind, height and payload length of the record at offset, or None if it is not there whole
+        segment_fn = self.__segment_fn(segment)
+        if not os.path.exists(segment_fn):
+            return None
+        with open(segment_fn, "rb") as segment_fh:
+            segment_fh.seek(offset)
+            header = segment_fh.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return None
+            (kind, height, length, crc) = _RECORD.unpack(header)
+            if kind not in (_BLOCK, _ROLLBACK):
+                return None
+            payload = segment_fh.read(length)
+        if len(payload) < length or zlib.crc32(payload) & 0xffffffff != crc:
+            return None
+        return (kind, height, length)
+
+    def __map(self, segment, size):
+        # the segment mapped into memory, at least size bytes of it; it may have grown since it was mapped
+        data = self.__maps.get(segment)
+        if data is None or len(data) < size:
+            if data is not None:
+                data.close()
+            with open(self.__segment_fn(segment), "rb") as segment_fh:
+                data = mmap.mmap(segment_fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__maps[segment] = data
+        return data
+
+    def __segment_fn(self, segment):
+        return os.path.join(self.path, "segment%05d.dat" % segment)
@@ -0,0 +1,45 @@
+from binascii import hexlify, unhexlify
+from chainutil.hashes import sha256d
+
+B58_DIGITS = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def b58encode(data):
+    n = int(hexlify(data), 16) if data else 0
+    digits = []
+    while n > 0:
+        (n, rest) = divmod(n, 58)
+        digits.append(B58_DIGITS[rest])
+    # every leading zero byte is written as a 1
+    zeros = len(data) - len(data.lstrip("\x00"))
+    return B58_DIGITS[0] * zeros + "".join(reversed(digits))
+
+
+def b58encode_check(version, payload):
+    """The Base58Check address of payload (e.g. a hash160) with the given version byte."""
+    data = chr(version) + payload
+    return b58encode(data + sha256d(data)[:4])
+
+
+def b58decode(text):
+    # surrounding whitespace is skipped, as bitcoind does
+    text = text.strip(" \t\n\v\f\r")
+    n = 0
+    for c in text:
+        digit = B58_DIGITS.find(c)
+        if digit < 0:
+            raise ValueError("Invalid Base58 character %r" % c)
+        n = n * 58 + digit
+    data = "%x" % n if n else ""
+    if len(data) % 2:
+        data = "0" + data
+    zeros = len(text) - len(text.lstrip(B58_DIGITS[0]))
+    return "\x00" * zeros + unhexlify(data)
+
+
+def b58decode_check(text):
+    """Returns (version, payload) of a Base58Check string; raises ValueError if it is not one."""
+    data = b58decode(text)
+    if len(data) < 5 or sha256d(data[:-4])[:4] != data[-4:]:
+        raise ValueError("Bad Base58Check checksum")
+    return (ord(data[0]), data[1:-4])
@@ -0,0 +1,92 @@
+BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+_GENERATOR = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+# the checksum constants of bech32 (BIP 173), for witness version 0, and of bech32m (BIP 350), for the later ones
+BECH32_CONST = 1
+BECH32M_CONST = 0x2bc830a3
+
+
+def _polymod(values):
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1ffffff) << 5 ^ value
+        for i in range(5):
+            if (top >> i) & 1:
+                chk ^= _GENERATOR[i]
+    return chk
+
+
+def _hrp_expand(hrp):
+    return [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+
+
+def _to_5bit(data):
+    acc = 0
+    bits = 0
+    out = []
+    for byte in bytearray(data):
+        acc = (acc << 8) | byte
+        bits += 8
+        while bits >= 5:
+            bits -= 5
+            out.append((acc >> bits) & 31)
+    if bits:
+        out.append((acc << (5 - bits)) & 31)
+    return out
+
+
+def _checksum_const(version):
+    return BECH32_CONST if version == 0 else BECH32M_CONST
+
+
+def segwit_address(hrp, version, program):
+    """The address of a witness program, in bech32 for version 0 and in bech32m for the later versions."""
+    data = [version] + _to_5bit(program)
+    polymod = _polymod(_hrp_expand(hrp) + data + [0] * 6) ^ _checksum_const(version)
+    checksum = [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + "1" + "".join(BECH32_CHARSET[d] for d in data + checksum)
+
+
+def _from_5bit(data):
+    acc = 0
+    bits = 0
+    out = []
+    for value in data:
+        acc = (acc << 5) | value
+        bits += 5
+        if bits >= 8:
+            bits -= 8
+            out.append((acc >> bits) & 0xff)
+    # what is left over has to be zero padding of less than a byte
+    if bits >= 5 or (acc << (8 - bits)) & 0xff:
+        return None
+    return out
+
+
+def decode_segwit_address(hrp, address):
+    """
+    The (version, program) of a BIP 173 (version 0) or BIP 350 (later
+    versions) address with prefix hrp; raises ValueError for anything else.
+    """
+    if any(ord(c) < 33 or ord(c) > 126 for c in address):
+        raise ValueError("Invalid character in bech32 address")
+    if address.lower() != address and address.upper() != address:
+        raise ValueError("Mixed case bech32 address")
+    address = address.lower()
+    pos = address.rfind("1")
+    if pos < 1 or pos + 7 > len(address) or len(address) > 90:
+        raise ValueError("Malformed bech32 address")
+    if address[:pos] != hrp:
+        raise ValueError("Wrong bech32 prefix")
+    data = [BECH32_CHARSET.find(c) for c in address[pos + 1:]]
+    if -1 in data or len(data) < 7:
+        raise ValueError("Malformed bech32 address")
+    if _polymod(_hrp_expand(hrp) + data) != _checksum_const(data[0]):
+        raise ValueError("Bad bech32 checksum")
+    data = data[:-6]
+    program = _from_5bit(data[1:])
+    if program is None or not 2 <= len(program) <= 40 or data[0] > 16:
+        raise ValueError("Invalid witness program")
+    if data[0] == 0 and len(program) not in (20, 32):
+        raise ValueError("Invalid witness v0 program")
+    return (data[0], "".join(chr(byte) for byte in program))
@@ -0,0 +1,172 @@
+import struct
+from binascii import hexlify
+from chainutil.chains import BITCOIN
+from chainutil.hashes import sha256d
+from chainutil.script import parse_script, script_to_asm, solve_script, destination_address
+
+NULL_HASH = "\x00" * 32
+COIN = 100000000
+
+_HEADER = struct.Struct("<i32s32sIII")
+_UINT16 = struct.Struct("<H")
+_UINT32 = struct.Struct("<I")
+_INT32 = struct.Struct("<i")
+_INT64 = struct.Struct("<q")
+_UINT64 = struct.Struct("<Q")
+
+
+def read_compact_size(data, pos):
+    """Returns the CompactSize integer at pos and the position after it."""
+    n = ord(data[pos])
+    if n < 0xfd:
+        return (n, pos + 1)
+    elif n == 0xfd:
+        return (_UINT16.unpack_from(data, pos + 1)[0], pos + 3)
+    elif n == 0xfe:
+        return (_UINT32.unpack_from(data, pos + 1)[0], pos + 5)
+    return (_UINT64.unpack_from(data, pos + 1)[0], pos + 9)
+
+
+def hash_hex(hash_bytes):
+    """A hash the way the daemon prints it, i.e. hex in reversed byte order."""
+    return hexlify(hash_bytes[::-1])
+
+
+class BlockHeader(object):
+    """The 80 byte header of a block; hash and prev_hash are raw bytes."""
+
+    __slots__ = ("hash", "version", "prev_hash", "merkle_root", "time", "bits", "nonce")
+
+    def __init__(self, data, pos=0):
+        (self.version, self.prev_hash, self.merkle_root, self.time, self.bits, self.nonce) = _HEADER.unpack_from(data, pos)
+        self.hash = sha256d(data[pos:pos + 80])
+
+
+def bits_to_target(bits):
+    """The target a compact nBits stands for."""
+    size = bits >> 24
+    word = bits & 0x007fffff
+    if size <= 3:
+        return word >> 8 * (3 - size)
+    return word << 8 * (size - 3)
+
+
+def block_work(bits):
+    """The expected number of hashes behind a block with the given nBits, as bitcoind counts chainwork."""
+    target = bits_to_target(bits)
+    if target <= 0 or bits & 0x00800000:
+        return 0
+    return (1 << 256) // (target + 1)
+
+
+def difficulty(bits):
+    """The difficulty of nBits the way getblock reports it."""
+    shift = (bits >> 24) & 0xff
+    diff = float(0x0000ffff) / float(bits & 0x00ffffff)
+    while shift < 29:
+        diff *= 256.0
+        shift += 1
+    while shift > 29:
+        diff /= 256.0
+        shift -= 1
+    return diff
+
+
+def _script_pubkey(script, chain):
+    (ops, complete) = parse_script(script)
+    result = {"asm": script_to_asm(ops, complete), "hex": hexlify(script)}
+    (script_type, required, destinations) = solve_script(script, ops, complete)
+    if destinations:
+        result["reqSigs"] = required
+        result["addresses"] = [destination_address(kind, data, chain) for (kind, data) in destinations]
+    result["type"] = script_type
+    return result
+
+
+def deserialize_transaction(data, pos=0, chain=BITCOIN):
+    """
+    Reads the serialized transaction at pos. Returns it the way
+    decoderawtransaction does, with the addresses made with the version
+    bytes of chain, and the position after it.
+    """
+    start = pos
+    version = _INT32.unpack_from(data, pos)[0]
+    pos += 4
+    # an empty input list followed by flags marks the extended (BIP 144) format
+    witness = data[pos] == "\x00" and data[pos + 1] != "\x00"
+    if witness:
+        pos += 2
+    body_start = pos
+
+    (count, pos) = read_compact_size(data, pos)
+    vin = []
+    sequences = []
+    coinbase = count == 1 and data[pos:pos + 32] == NULL_HASH and data[pos + 32:pos + 36] == "\xff\xff\xff\xff"
+    for i in xrange(count):
+        prev_hash = data[pos:pos + 32]
+        prev_n = _UINT32.unpack_from(data, pos + 32)[0]
+        (size, pos) = read_compact_size(data, pos + 36)
+        script = data[pos:pos + size]
+        pos += size
+        sequences.append(_UINT32.unpack_from(data, pos)[0])
+        pos += 4
+        if coinbase:
+            vin.append({"coinbase": hexlify(script)})
+        else:
+            (ops, complete) = parse_script(script)
+            vin.append({"txid": hash_hex(prev_hash), "vout": prev_n,
+                        "scriptSig": {"asm": script_to_asm(ops, complete, True), "hex": hexlify(script)}})
+
+    (count, pos) = read_compact_size(data, pos)
+    vout = []
+    for n in xrange(count):
+        value = _INT64.unpack_from(data, pos)[0]
+        (size, pos) = read_compact_size(data, pos + 8)
+        script = data[pos:pos + size]
+        pos += size
+        vout.append({"value": value / float(COIN), "n": n, "scriptPubKey": _script_pubkey(script, chain)})
+    body_end = pos
+
+    if witness:
+        for txin in vin:
+            (items, pos) = read_compact_size(data, pos)
+            stack = []
+            for i in xrange(items):
+                (size, pos) = read_compact_size(data, pos)
+                stack.append(hexlify(data[pos:pos + size]))
+                pos += size
+            if stack:
+                txin["txinwitness"] = stack
+    for (txin, sequence) in zip(vin, sequences):
+        txin["sequence"] = sequence
+    locktime = _UINT32.unpack_from(data, pos)[0]
+    pos += 4
+
+    if witness:
+        stripped = data[start:start + 4] + data[body_start:body_end] + data[pos - 4:pos]
+        wtxid = hash_hex(sha256d(data[start:pos]))
+    else:
+        stripped = data[start:pos]
+    txid = hash_hex(sha256d(stripped))
+    size = pos - start
+    weight = len(stripped) * 3 + size
+    tx = {"txid": txid, "hash": wtxid if witness else txid, "version": version, "size": size,
+          "vsize": (weight + 3) // 4, "weight": weight, "locktime": locktime, "vin": vin, "vout": vout}
+    return (tx, pos)
+
+
+def deserialize_block(data, chain=BITCOIN):
+    """
+    Reads a serialized block. Returns its BlockHeader, its transactions the
+    way decoderawtransaction returns them and the size it would have
+    without the witness data.
+    """
+    header = BlockHeader(data)
+    (count, pos) = read_compact_size(data, 80)
+    txs = []
+    stripped_size = pos
+    for i in xrange(count):
+        (tx, pos) = deserialize_transaction(data, pos, chain)
+        txs.append(tx)
+        stripped_size += (tx["weight"] - tx["size"]) // 3
+    return (header, txs, stripped_size)
@@ -0,0 +1,260 @@
+import mmap
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict
+from chainutil.block import BlockHeader, NULL_HASH, block_work, deserialize_block, difficulty, hash_hex
+from chainutil.chains import BITCOIN
+
+_BLOCK_FILE = re.compile(r"^blk(\d{5})\.dat$")
+# no block is larger (MAX_BLOCK_SERIALIZED_SIZE); a record claiming more is damaged
+_MAX_BLOCK_SIZE = 4000000
+
+
+class _IndexEntry(object):
+    __slots__ = ("hash", "prev_hash", "file", "offset", "size", "time", "bits", "height", "chainwork")
+
+    def __init__(self, header, file_number, offset, size):
+        self.hash = header.hash
+        self.prev_hash = header.prev_hash
+        self.file = file_number
+        self.offset = offset
+        self.size = size
+        self.time = header.time
+        self.bits = header.bits
+        self.height = None
+        self.chainwork = None
+
+
+class BlockFileReader(object):
+    """
+    Reads blocks straight from the blk?????.dat files in a daemon's blocks
+    directory, without the daemon having to answer for them:
+
+        reader = BlockFileReader("/home/bitcoin/.bitcoin/blocks")
+        for height in xrange(reader.height + 1):
+            (block, txs) = reader.read_block(height)
+
+    The files are memory-mapped. Rather than reading the daemon's LevelDB
+    block index, the reader indexes the headers of the blocks stored in the
+    files and follows the chain with the most work, as the daemon does; on
+    a node that is in sync that is the daemon's best chain. Blocks and
+    transactions are returned the way getblock and decoderawtransaction
+    return them. Only blocks in Bitcoin's serialization are understood,
+    and the files must not be obfuscated (xor.dat) or pruned.
+    """
+
+    def __init__(self, blocks_dir, chain=BITCOIN, max_open_files=64):
+        self.blocks_dir = blocks_dir
+        self.chain = chain
+        self.max_open_files = max_open_files
+        xor_file = os.path.join(blocks_dir, "xor.dat")
+        if os.path.exists(xor_file):
+            with open(xor_file, "rb") as fh:
+                if fh.read().strip("\x00"):
+                    raise ValueError("Obfuscated block files are not supported")
+        self.__lock = threading.Lock()
+        # file number -> mmap, the least recently used first
+        self.__maps = OrderedDict()
+        # file number -> how far its records have been indexed
+        self.__scanned = {}
+        self.__index = {}
+        # index entries waiting for their parent to turn up
+        self.__orphans = {}
+        self.__tip = None
+        self.__best = []
+        self.update()
+
+    def update(self):
+        """
+        Indexes the blocks added to the files since they were last looked
+        at and returns the height of the best chain's tip (-1 while there
+        is none).
+        """
+        self.__lock.acquire()
+        try:
+            self.__update()
+            return len(self.__best) - 1
+        finally:
+            self.__lock.release()
+
+    def best_block_hash(self):
+        """
+        Indexes the blocks added to the files, as update() does, and returns
+        the hash of the best chain's tip (None while there is none), as
+        getbestblockhash does; unlike the height, it changes with a reorg
+        to a chain of the same length.
+        """
+        self.__lock.acquire()
+        try:
+            self.__update()
+            return hash_hex(self.__best[-1].hash) if self.__best else None
+        finally:
+            self.__lock.release()
+
+    @property
+    def height(self):
+        self.__lock.acquire()
+        try:
+            return len(self.__best) - 1
+        finally:
+            self.__lock.release()
+
+    def block_hash(self, height):
+        self.__lock.acquire()
+        try:
+            return hash_hex(self.__best[height].hash)
+        finally:
+            self.__lock.release()
+
+    def read_block(self, height):
+        """
+        Returns the block at height on the best chain the way getblock
+        returns it, and its transactions the way decoderawtransaction does.
+        """
+        # what the best chain says about the block, all at once, as update() may change it meanwhile
+        self.__lock.acquire()
+        try:
+            entry = self.__best[height]
+            times = sorted(ancestor.time for ancestor in self.__best[max(height - 10, 0):height + 1])
+            confirmations = len(self.__best) - height
+            next_entry = self.__best[height + 1] if height + 1 < len(self.__best) else None
+        finally:
+            self.__lock.release()
+        data = self.__read(entry.file, entry.offset, entry.size)
+        (header, txs, stripped_size) = deserialize_block(data, self.chain)
+
+        block = OrderedDict()
+        block["hash"] = hash_hex(header.hash)
+        block["confirmations"] = confirmations
+        block["strippedsize"] = stripped_size
+        block["size"] = entry.size
+        block["weight"] = stripped_size * 3 + entry.size
+        block["height"] = height
+        block["version"] = header.version
+        block["versionHex"] = "%08x" % (header.version & 0xffffffff)
+        block["merkleroot"] = hash_hex(header.merkle_root)
+        block["tx"] = [tx["txid"] for tx in txs]
+        block["time"] = header.time
+        block["mediantime"] = times[len(times) // 2]
+        block["nonce"] = header.nonce
+        block["bits"] = "%08x" % header.bits
+        block["difficulty"] = difficulty(header.bits)
+        block["chainwork"] = "%064x" % entry.chainwork
+        block["nTx"] = len(txs)
+        if height > 0:
+            block["previousblockhash"] = hash_hex(header.prev_hash)
+        if next_entry is not None:
+            block["nextblockhash"] = hash_hex(next_entry.hash)
+        return (block, txs)
+
+    def close(self):
+        self.__lock.acquire()
+        try:
+            for block_map in self.__maps.values():
+                block_map.close()
+            self.__maps.clear()
+        finally:
+            self.__lock.release()
+
+    def __update(self):
+        # called with the lock held
+        numbers = []
+        for name in os.listdir(self.blocks_dir):
+            match = _BLOCK_FILE.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        for number in sorted(numbers):
+            self.__scan(number)
+        if self.__tip is not None:
+            self.__follow_tip()
+
+    def __map(self, number):
+        # called with the lock held
+        block_map = self.__maps.pop(number, None)
+        path = os.path.join(self.blocks_dir, "blk%05d.dat" % number)
+        if block_map is not None and len(block_map) != os.path.getsize(path):
+            # the daemon appended to it since; size() would be the file's, not the mapping's
+            block_map.close()
+            block_map = None
+        if block_map is None:
+            while len(self.__maps) >= self.max_open_files:
+                self.__maps.popitem(last=False)[1].close()
+            with open(path, "rb") as fh:
+                block_map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__maps[number] = block_map
+        return block_map
+
+    def __read(self, number, offset, size):
+        self.__lock.acquire()
+        try:
+            return self.__map(number)[offset:offset + size]
+        finally:
+            self.__lock.release()
+
+    def __scan(self, number):
+        pos = self.__scanned.get(number, 0)
+        path = os.path.join(self.blocks_dir, "blk%05d.dat" % number)
+        if os.path.getsize(path) <= pos:
+            return
+        block_map = self.__map(number)
+        magic = self.chain.magic
+        end = len(block_map)
+        while pos + 88 <= end:
+            if block_map[pos:pos + 4] != magic:
+                # the rest is preallocated and not written yet, or a record
+                # left unfinished by a crash the daemon wrote on after
+                found = block_map.find(magic, pos + 1)
+                if found < 0:
+                    break
+                pos = found
+                continue
+            size = struct.unpack("<I", block_map[pos + 4:pos + 8])[0]
+            if size < 81 or size > _MAX_BLOCK_SIZE:
+                # a damaged record; go on with the next one
+                pos += 4
+                continue
+            if pos + 8 + size > end:
+                if block_map.find(magic, pos + 8) < 0:
+                    # the last record, not written in full yet; it is read again next time
+                    break
+                # a record cut short, with others written after it
+                pos += 4
+                continue
+            header = BlockHeader(block_map[pos + 8:pos + 88])
+            if header.hash not in self.__index:
+                self.__add(_IndexEntry(header, number, pos + 8, size))
+            pos += 8 + size
+        self.__scanned[number] = pos
+
+    def __add(self, entry):
+        self.__index[entry.hash] = entry
+        if entry.prev_hash == NULL_HASH:
+            parent = None
+        else:
+            parent = self.__index.get(entry.prev_hash)
+            if parent is None or parent.height is None:
+                self.__orphans.setdefault(entry.prev_hash, []).append(entry)
+                return
+        # connect it, and whatever was waiting for it
+        pending = [(entry, parent)]
+        while pending:
+            (entry, parent) = pending.pop()
+            entry.height = parent.height + 1 if parent is not None else 0
+            entry.chainwork = (parent.chainwork if parent is not None else 0) + block_work(entry.bits)
+            # on a tie, the block seen first stays the tip
+            if self.__tip is None or entry.chainwork > self.__tip.chainwork:
+                self.__tip = entry
+            for child in self.__orphans.pop(entry.hash, []):
+                pending.append((child, entry))
+
+    def __follow_tip(self):
+        # walk back from the tip to where the known best chain joins
+        entry = self.__tip
+        branch = []
+        while entry is not None and not (entry.height < len(self.__best) and self.__best[entry.height] is entry):
+            branch.append(entry)
+            entry = self.__index.get(entry.prev_hash)
+        del self.__best[self.__tip.height + 1 - len(branch):]
+        self.__best.extend(reversed(branch))
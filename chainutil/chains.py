@@ -0,0 +1,23 @@
+class Chain(object):
+    """
+    The version bytes and bech32 prefix a chain's addresses are made with,
+    and the magic bytes its messages and block file records start with.
+    """
+
+    def __init__(self, name, pubkey_hash_version, script_hash_version, bech32_hrp, magic):
+        self.name = name
+        self.pubkey_hash_version = pubkey_hash_version
+        self.script_hash_version = script_hash_version
+        self.bech32_hrp = bech32_hrp
+        self.magic = magic
+
+    def __repr__(self):
+        return "Chain(%r)" % self.name
+
+
+BITCOIN = Chain("bitcoin", 0, 5, "bc", "\xf9\xbe\xb4\xd9")
+BITCOIN_TESTNET = Chain("bitcoin-testnet", 111, 196, "tb", "\x0b\x11\x09\x07")
+NAMECOIN = Chain("namecoin", 52, 13, "nc", "\xf9\xbe\xb4\xfe")
+PEERCOIN = Chain("peercoin", 55, 117, "pc", "\xe6\xe8\xe9\xe5")
+
+CHAINS = dict((chain.name, chain) for chain in [BITCOIN, BITCOIN_TESTNET, NAMECOIN, PEERCOIN])
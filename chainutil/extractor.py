@@ -0,0 +1,997 @@
+import argparse
+import ConfigParser
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import pika
+from collections import OrderedDict
+from multiprocessing import Pool
+from jsonrpc import ServiceProxy, JSONRPCException, HTTPTransport, ResultCache, CachingServiceProxy, RPCStats, MultiServiceProxy
+from chainutil.address import AddressValidator
+from chainutil.archive import BlockArchive
+from chainutil.blockfile import BlockFileReader
+from chainutil.follow import TipFollower
+from chainutil.message import encode_message, COMPRESSIONS, JSON_CONTENT_TYPE
+from chainutil.pipeline import OrderedPipeline
+from chainutil.script import decode_script
+
+# the error codes of a daemon rejecting getblock's verbosity 2: a misc error (a boolean was expected), a type error
+# or an invalid parameter
+VERBOSITY_REJECTED = frozenset([-1, -3, -8, -32602])
+
+
+def config_option(scp, section, option, default, kind=str):
+    """The value of an option in the config file, or default if it is missing or empty."""
+    if not scp.has_option(section, option) or scp.get(section, option) == "":
+        return default
+    return kind(scp.get(section, option))
+
+
+class ChainConfig(object):
+    """
+    The options for extracting a chain, from the section of its daemon in
+    the config file. What is wrong with them is listed in errors.
+    """
+
+    def __init__(self, scp, profile, genesis_dir="."):
+        section = profile.daemon
+        self.errors = []
+        if not scp.has_section(section):
+            self.errors.append("Missing section %s in config file." % section)
+            return
+
+        # Configure daemon access
+        self.rpc_protocol = config_option(scp, section, "rpc_protocol", "http")
+        self.rpc_host = config_option(scp, section, "rpc_host", None)
+        if self.rpc_host is None:
+            self.errors.append("Missing 'rpc_host' for %s in config file." % section)
+        self.rpc_port = config_option(scp, section, "rpc_port", profile.rpc_port, int)
+        self.rpc_user = config_option(scp, section, "rpc_user", None)
+        self.rpc_password = config_option(scp, section, "rpc_password", None)
+        if self.rpc_user is None or self.rpc_password is None:
+            self.errors.append("Missing user and/or password for %s in config file or environment." % section)
+
+        # Number of calls that go into one JSON-RPC batch request
+        self.rpc_batch_size = config_option(scp, section, "rpc_batch_size", 1000, int)
+
+        # Keep-alive connections to the daemon: how many, and how long an unused one is kept
+        self.rpc_pool_size = config_option(scp, section, "rpc_pool_size", 4, int)
+        self.rpc_idle_timeout = config_option(scp, section, "rpc_idle_timeout", 30, float)
+
+        # Cache for the daemon's answers that never change: entries kept in memory, and a file keeping them across runs
+        self.rpc_cache_size = config_option(scp, section, "rpc_cache_size", 10000, int)
+        self.rpc_cache_file = config_option(scp, section, "rpc_cache_file", None)
+
+        # Addresses are checked locally, the way validateaddress would; the last address_cache_size of them are remembered
+        self.address_cache_size = config_option(scp, section, "address_cache_size", 10000, int)
+
+        # How transactions are fetched: "block" gets a whole block with its transactions in one getblock call,
+        # "tx" gets them with getrawtransaction and decoderawtransaction (needs txindex). "block" falls back
+        # to "tx" for daemons that do not support it.
+        self.rpc_fetch_mode = config_option(scp, section, "rpc_fetch_mode", "block")
+        if self.rpc_fetch_mode not in ["block", "tx"]:
+            self.errors.append("rpc_fetch_mode must be either block or tx.")
+
+        # Blocks are fetched by this many workers, up to rpc_fetch_window blocks ahead of the one to publish next
+        # and, past the next one, only while the blocks waiting to be published add up to rpc_fetch_max_bytes
+        # (raw block size) at most
+        self.rpc_fetch_workers = config_option(scp, section, "rpc_fetch_workers", 4, int)
+        self.rpc_fetch_window = config_option(scp, section, "rpc_fetch_window", 16, int)
+        self.rpc_fetch_max_bytes = config_option(scp, section, "rpc_fetch_max_bytes", 33554432, int)
+
+        # Read the blocks straight from the daemon's blk*.dat files in this directory instead of over JSON-RPC
+        self.blocks_dir = config_option(scp, section, "blocks_dir", None)
+        if self.blocks_dir is not None and not profile.block_files:
+            self.errors.append("blocks_dir is not supported for %s." % profile.name)
+        # Decoding the blocks read from the files takes the CPU; with blocks_processes, it is done in that many
+        # worker processes instead of the fetch workers
+        self.blocks_processes = config_option(scp, section, "blocks_processes", 0, int)
+
+        # Where genesis_block.json and genesis_tx.json are; the daemon does not return the genesis transaction
+        self.genesis_dir = config_option(scp, section, "genesis_dir", genesis_dir)
+
+        # The exchange and queue the blocks go to, and the port -blocknotify tells about new blocks on;
+        # set in the daemon's section, they take precedence over [amqp] and [follow]
+        self.amqp_exchange = config_option(scp, section, "amqp_exchange", config_option(scp, "amqp", "amqp_exchange", profile.name))
+        self.amqp_queue = config_option(scp, section, "amqp_queue", config_option(scp, "amqp", "amqp_queue", profile.name))
+        self.notify_port = config_option(scp, section, "notify_port", config_option(scp, "follow", "notify_port", None, int), int)
+
+
+class CheckpointStore(object):
+    """
+    A small JSON file of how far the extraction of each chain got, by chain
+    name. save() writes it anew to a temporary file, puts that on disk and
+    renames it over the old one, so a crash leaves either the old or the new
+    one behind, and never half of one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r") as store_fh:
+                self.entries = json.load(store_fh)
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def save(self, name, entry):
+        with self.lock:
+            self.entries[name] = entry
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as store_fh:
+                json.dump(self.entries, store_fh, indent=1, sort_keys=True)
+                store_fh.flush()
+                os.fsync(store_fh.fileno())
+            os.rename(tmp_path, self.path)
+            # the rename is on disk once the directory is
+            dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+
+class ChainState(object):
+    """
+    How far the extraction of a chain got: the last block published, and
+    the blocks published provisionally that are not confirmed yet, as
+    (height, hash) from the lowest up. save() writes it to the chain's entry
+    in a CheckpointStore, for the next run to start after it, as far as the
+    publisher has delivered the messages (see checkpoint()); the last block
+    published goes along as last_published_block. Without an entry yet, it
+    starts from the section of the config file the state used to be kept in.
+    """
+
+    def __init__(self, store, name, scp=None, section="state"):
+        self.store = store
+        self.name = name
+        entry = store.get(name)
+        if entry is not None:
+            self.last_known_block = entry["last_known_block"]
+            self.provisional_blocks = [(height, str(block_hash)) for (height, block_hash) in entry["provisional_blocks"]]
+        elif scp is not None:
+            self.last_known_block = config_option(scp, section, "last_known_block", -1, int)
+            self.provisional_blocks = [(int(entry.split(":")[0]), entry.split(":")[1])
+                                       for entry in config_option(scp, section, "provisional_blocks", "").split(",") if entry]
+        else:
+            (self.last_known_block, self.provisional_blocks) = (-1, [])
+        self.__delivered = (self.last_known_block, list(self.provisional_blocks))
+        self.__saved = None
+
+    def checkpoint(self):
+        """
+        The state as it is now, as a function for the publisher to call once
+        the messages published up to here are delivered. Until then, save()
+        writes the state of the checkpoint delivered before.
+        """
+        delivered = (self.last_known_block, list(self.provisional_blocks))
+
+        def deliver():
+            self.__delivered = delivered
+        return deliver
+
+    def save(self):
+        (last_known_block, provisional_blocks) = self.__delivered
+        entry = {"last_known_block": last_known_block, "provisional_blocks": provisional_blocks,
+                 "last_published_block": self.last_known_block}
+        if entry != self.__saved:
+            self.store.save(self.name, entry)
+            self.__saved = entry
+
+
+class AMQPPublisher(object):
+    """
+    Publishes the messages of any number of chains over one AMQP
+    connection, each chain to an exchange of its own. The connection must
+    not be used by two threads at once, so they take turns; idle() keeps it
+    alive in between, answering the broker's heartbeats.
+
+    The messages go out as JSON, compressed with message_compression (see
+    encode_message); the content encoding tells the consumers how.
+
+    They are published in batches, each an AMQP transaction: once the broker
+    has taken batch_size messages, or the first of them is flush_interval
+    seconds old at idle(), they are committed, and their delivered functions
+    are called. Should a commit fail, the broker drops the batch and the
+    exception is raised. (pika's BlockingConnection waits for each publisher
+    confirm in turn, a round trip per message; a commit takes one per batch.)
+    """
+
+    def __init__(self, host, port, user, password, message_compression="none", batch_size=32, flush_interval=1.0):
+        credentials = pika.PlainCredentials(user, password)
+        parameters = pika.ConnectionParameters(host=host, port=port, virtual_host="/", credentials=credentials)
+        self.__connection = pika.BlockingConnection(parameters=parameters)
+        self.__channel = self.__connection.channel()
+        self.__channel.tx_select()
+        self.__lock = threading.Lock()
+        self.__routes = {}
+        self.message_compression = message_compression
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # the delivered functions of the messages published since the last commit, and when the first came
+        self.__uncommitted = []
+        self.__batch_started = None
+
+    def add_chain(self, name, exchange, queue, decimals):
+        with self.__lock:
+            self.__channel.exchange_declare(exchange, type="fanout")
+            self.__channel.queue_declare(queue=queue)
+            self.__channel.queue_bind(exchange=exchange, queue=queue)
+            self.__routes[name] = (exchange, queue, decimals)
+
+    def publish(self, name, height, msg, delivered=None):
+        """
+        Publishes the message for the block at height on the named chain;
+        delivered is called once it is committed.
+        """
+        (exchange, queue, decimals) = self.__routes[name]
+        body = encode_message(msg, self.message_compression)
+        if self.message_compression == "none":
+            properties = pika.BasicProperties(content_type=JSON_CONTENT_TYPE)
+        else:
+            properties = pika.BasicProperties(content_type=JSON_CONTENT_TYPE, content_encoding=self.message_compression)
+        with self.__lock:
+            self.__channel.basic_publish(exchange=exchange, routing_key=queue, body=body, properties=properties)
+            if not self.__uncommitted:
+                self.__batch_started = time.time()
+            self.__uncommitted.append(delivered)
+            if len(self.__uncommitted) >= self.batch_size:
+                self.__commit()
+
+    def rollback(self, name, orphaned, msg, delivered=None):
+        """Publishes the message rolling back the orphaned blocks, (height, hash) from the lowest up."""
+        self.publish(name, None, msg, delivered)
+
+    def flush(self):
+        """Commits the messages published so far."""
+        with self.__lock:
+            self.__commit()
+
+    def idle(self):
+        with self.__lock:
+            if self.__uncommitted and time.time() - self.__batch_started >= self.flush_interval:
+                self.__commit()
+            self.__connection.process_data_events()
+
+    def close(self):
+        with self.__lock:
+            try:
+                self.__commit()
+            finally:
+                self.__connection.close()
+
+    def __commit(self):
+        if not self.__uncommitted:
+            return
+        self.__channel.tx_commit()
+        (uncommitted, self.__uncommitted) = (self.__uncommitted, [])
+        for delivered in uncommitted:
+            if delivered is not None:
+                delivered()
+
+
+class DryRunPublisher(object):
+    """Prints the messages instead of publishing them."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+
+    def add_chain(self, name, exchange, queue, decimals):
+        pass
+
+    def publish(self, name, height, msg, delivered=None):
+        with self.__lock:
+            print(msg)
+        if delivered is not None:
+            delivered()
+
+    def rollback(self, name, orphaned, msg, delivered=None):
+        self.publish(name, None, msg, delivered)
+
+    def flush(self):
+        pass
+
+    def idle(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ArchivePublisher(object):
+    """
+    Appends the blocks of each chain to its BlockArchive in archives, by
+    name, instead of publishing them. The archives are synced to disk at
+    flush() or, at idle(), once the first block appended since the last
+    sync is sync_interval seconds old; then the blocks are delivered.
+    """
+
+    def __init__(self, archives, sync_interval=1.0):
+        self.archives = archives
+        self.sync_interval = sync_interval
+        self.__lock = threading.Lock()
+        # one sync at a time, so that the blocks are delivered in order
+        self.__sync_lock = threading.Lock()
+        # the delivered functions of the blocks appended since the last sync, and when the first came
+        self.__unsynced = []
+        self.__first_unsynced = None
+
+    def add_chain(self, name, exchange, queue, decimals):
+        pass
+
+    def publish(self, name, height, msg, delivered=None):
+        # each chain appends to its own archive, so they need not take turns
+        self.archives[name].append(height, msg)
+        self.__appended(delivered)
+
+    def rollback(self, name, orphaned, msg, delivered=None):
+        self.archives[name].rollback(orphaned[0][0])
+        self.__appended(delivered)
+
+    def flush(self):
+        self.__sync()
+
+    def idle(self):
+        with self.__lock:
+            due = self.__unsynced and time.time() - self.__first_unsynced >= self.sync_interval
+        if due:
+            self.__sync()
+
+    def close(self):
+        try:
+            self.__sync()
+        finally:
+            for archive in self.archives.values():
+                archive.close()
+
+    def __appended(self, delivered):
+        with self.__lock:
+            if not self.__unsynced:
+                self.__first_unsynced = time.time()
+            self.__unsynced.append(delivered)
+
+    def __sync(self):
+        with self.__sync_lock:
+            # what was appended before the list is taken is synced with it
+            with self.__lock:
+                (unsynced, self.__unsynced) = (self.__unsynced, [])
+            if not unsynced:
+                return
+            for archive in self.archives.values():
+                archive.sync()
+            for delivered in unsynced:
+                if delivered is not None:
+                    delivered()
+
+
+class _Stopped(Exception):
+    pass
+
+
+class InconsistentIndexError(Exception):
+    """A transaction of a block the daemon returned cannot be found by the daemon."""
+
+    def __init__(self, tx_id):
+        Exception.__init__(self, "Raw TX %s not found. This points to an inconsistency in the server's index. "
+                                 "Better rollback on receiver's side." % tx_id)
+        self.tx_id = tx_id
+
+
+# the extractors whose blocks are decoded by a process pool, by name; the worker processes have
+# copies of them from when they were forked
+_forked_extractors = {}
+
+
+def _read_block_forked(name, height, block_hash):
+    return _forked_extractors[name].read_block_forked(height, block_hash)
+
+
+class ChainExtractor(object):
+    """
+    Extracts one chain, as set apart by its ChainProfile: fetches its blocks
+    over JSON-RPC, or from its block files, and hands the messages for them
+    to a publisher in order, once they are profile.confirmations deep or,
+    with provisional, right away. Where it got to is kept in state, saved
+    every checkpoint_blocks blocks or checkpoint_interval seconds.
+
+    HTTP connections are taken from transports, a dict of HTTPTransports by
+    URL, so that chains (or replicas) behind the same URL share a pool.
+    """
+
+    def __init__(self, profile, config, state, transports=None, rpc_stats=None, startfrom=None, stopat=None,
+                 follow=False, provisional=False, min_poll_interval=1, max_poll_interval=10, checkpoint_interval=60,
+                 checkpoint_blocks=1000):
+        self.profile = profile
+        self.config = config
+        self.state = state
+        self.rpc_stats = rpc_stats
+        self.startfrom = startfrom
+        self.stopat = stopat
+        self.provisional = provisional
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_blocks = checkpoint_blocks
+        self.rpc_fetch_mode = config.rpc_fetch_mode
+        self.__stopped = threading.Event()
+        transports = transports if transports is not None else {}
+
+        # Set up JSON-RPC connection
+        # rpc_host may list several replicas of the daemon, as host or host:port separated by commas
+        rpc_urls = []
+        for host in config.rpc_host.split(","):
+            host = host.strip()
+            if ":" not in host:
+                host = host + ":" + str(config.rpc_port)
+            rpc_urls.append(config.rpc_protocol + "://" + config.rpc_user + ":" + config.rpc_password + "@" + host)
+        transport = lambda url: transports.setdefault(url, HTTPTransport(url, config.rpc_pool_size, config.rpc_idle_timeout))
+        if len(rpc_urls) == 1:
+            service_proxy = ServiceProxy(rpc_urls[0], transport=transport(rpc_urls[0]), stats=rpc_stats)
+        else:
+            service_proxy = MultiServiceProxy(rpc_urls, transportFactory=transport, stats=rpc_stats)
+        # A transaction stays what it is, but the hash at a height changes with a reorg, so getblockhash is asked every time
+        self.rpc_cache = ResultCache(["getrawtransaction", "decoderawtransaction"], config.rpc_cache_size, config.rpc_cache_file)
+        self.service_proxy = CachingServiceProxy(service_proxy, self.rpc_cache)
+        self.address_validator = AddressValidator(profile.chain, config.address_cache_size) if profile.validate_addresses else None
+
+        # Blocks come from the block files or over JSON-RPC
+        self.block_reader = None
+        self.process_pool = None
+        if config.blocks_dir is not None:
+            self.block_reader = BlockFileReader(config.blocks_dir, profile.chain)
+            if config.blocks_processes > 0:
+                _forked_extractors[profile.name] = self
+                self.process_pool = Pool(config.blocks_processes)
+                self.fetch = lambda height: self.process_pool.apply(_read_block_forked, (profile.name, height, self.block_reader.block_hash(height)))
+            else:
+                self.fetch = self.read_block
+            # new blocks show up in the files
+            (self.chain_height, tip) = (self.block_reader.update, self.block_reader.best_block_hash)
+            self.block_hash = self.block_reader.block_hash
+        else:
+            self.fetch = self.fetch_block
+            if profile.getblockcount:
+                self.chain_height = self.service_proxy.getblockcount
+            else:
+                self.chain_height = lambda: self.service_proxy.getblockchaininfo()["blocks"]
+            tip = self.service_proxy.getbestblockhash
+            self.block_hash = self.service_proxy.getblockhash
+
+        self.tip_follower = None
+        if follow:
+            self.tip_follower = TipFollower(tip, min_poll_interval, max_poll_interval, config.notify_port)
+
+    def fetch_full_block(self, block_hash):
+        """
+        Gets a block together with all its transactions in a single call, by
+        asking getblock for verbosity 2. Returns the block the way getblock
+        returns it by default and the transactions the way
+        decoderawtransaction does, or (None, None) if the daemon cannot do that.
+        """
+        try:
+            block = self.service_proxy.getblock(block_hash, 2)
+        except JSONRPCException, e:
+            # only a daemon that takes no verbosity 2 rejects the argument; anything else, e.g. a block that is
+            # gone after a reorg, is for the caller
+            if isinstance(e.error, dict) and e.error.get("code") in VERBOSITY_REJECTED:
+                return (None, None)
+            raise
+        tx_decs = block["tx"]
+        if not all(isinstance(tx_dec, dict) for tx_dec in tx_decs):
+            # daemons that only know verbose true/false return something else
+            return (None, None)
+        block["tx"] = [tx_dec["txid"] for tx_dec in tx_decs]
+        for tx_dec in tx_decs:
+            tx_hex = tx_dec.pop("hex", None)
+            if self.profile.raw_tx_sizes and tx_hex is not None:
+                # as the tx path works it out from the raw TX
+                tx_dec["size"] = len(tx_hex) / 2
+            tx_dec.pop("fee", None)
+        return (OrderedDict(block), tx_decs)
+
+    def fetch_block(self, height):
+        """
+        Fetches the block at the given height with all its transactions and
+        returns the message to publish for it. Runs on the fetch workers,
+        several blocks at a time.
+        """
+        block_hash = self.service_proxy.getblockhash(height)
+        # Treat genesis block differently
+        if height == 0:
+            with open(os.path.join(self.config.genesis_dir, "genesis_block.json"), "r") as fh:
+                block = json.load(fh, object_pairs_hook=OrderedDict)
+        else:
+            (block, tx_decs) = (None, None)
+            if self.rpc_fetch_mode == "block":
+                (block, tx_decs) = self.fetch_full_block(block_hash)
+                # the other workers may have found out already
+                if block is None and self.rpc_fetch_mode == "block":
+                    logging.info("getblock does not return transactions, fetching them one by one.")
+                    self.rpc_fetch_mode = "tx"
+            if block is None:
+                block = OrderedDict(self.service_proxy.getblock(block_hash))
+        # Treat genesis TX differently
+        if height == 0:
+            with open(os.path.join(self.config.genesis_dir, "genesis_tx.json"), "r") as fh:
+                tx_decs = [json.load(fh)]
+        elif tx_decs is None:
+            # We should not get any TX errors after the genesis block. If we do, that's a problem and we
+            # exit gracefully!
+            try:
+                tx_raws = self.service_proxy.batch([("getrawtransaction", [tx_id]) for tx_id in block["tx"]], self.config.rpc_batch_size)
+            except JSONRPCException, e:
+                tx_id = block["tx"][e.callIndex] if e.callIndex is not None else "(unknown)"
+                logging.error("Tx " + tx_id + " cannot be found. Bad.")
+                # abandon, this TX does not exist
+                raise InconsistentIndexError(tx_id)
+
+            # OK, decode and write to TX
+            tx_decs = self.service_proxy.batch([("decoderawtransaction", [tx_raw]) for tx_raw in tx_raws], self.config.rpc_batch_size)
+            if self.profile.raw_tx_sizes:
+                for tx_raw, tx_dec in zip(tx_raws, tx_decs):
+                    tx_dec["size"] = len(tx_raw) / 2
+        return self.block_message(block, tx_decs)
+
+    def read_block(self, height):
+        """
+        Reads the block at the given height from the block files and returns
+        the message to publish for it.
+        """
+        (block, tx_decs) = self.block_reader.read_block(height)
+        return self.block_message(block, tx_decs)
+
+    def read_block_forked(self, height, block_hash):
+        """
+        read_block in a worker process, whose copy of the block reader dates
+        from when it was forked; block_hash is the hash of the block at
+        height as the parent process knows it.
+        """
+        if height > self.block_reader.height or self.block_reader.block_hash(height) != block_hash:
+            self.block_reader.update()
+        return self.read_block(height)
+
+    def block_message(self, block, tx_decs):
+        """The message to publish for a block and its decoded transactions."""
+        block_hash = block["hash"]
+        # dive into vins to get the scriptSigs (they are not returned as JSON),
+        # decoded here the way decodescript would
+        for tx_dec in tx_decs:
+            for vin in tx_dec["vin"]:
+                if "scriptSig" in vin:
+                    vin["scriptSig"]["dec"] = decode_script(vin["scriptSig"]["hex"], self.profile.script_chain)
+
+        parsed_txs = OrderedDict()
+        for tx_index, tx_dec in enumerate(tx_decs):
+            if self.address_validator is not None:
+                addresses_valid = dict()
+                for vout in tx_dec["vout"]:
+                    if "addresses" in vout["scriptPubKey"]:
+                        for address in vout["scriptPubKey"]["addresses"]:
+                            addresses_valid[address] = self.address_validator.is_valid(address)
+                tx_dec["addresses_valid"] = addresses_valid
+
+            # add the hash of the block this TX belongs to
+            tx_dec["block_hash"] = block_hash
+            # add the index of the TX in the serialised output
+            tx_dec["tx_index"] = tx_index
+            # Even though we use OrderedDicts, we need to serialsise them for pika,
+            # and that does not seem to support it. So we need to have keys by which
+            # we can order.
+            parsed_txs[tx_index] = tx_dec
+
+        msg = OrderedDict()
+        msg["block"] = block
+        msg["parsed_txs"] = parsed_txs
+        if self.profile.auxpow and "auxpow" in block:
+            # The TX in the auxpow is a coinbase TX (because it refers to
+            # a merge-mined block). It lacks the block hash of the block
+            # where it is included, so we add that manually back:
+            block["auxpow"]["block_hash"] = block_hash
+            aux_tx = block["auxpow"]["tx"]
+            aux_tx["block_hash"] = block_hash
+            # The tx_index is always 0 because it is the only TX in the auxpow
+            # Note: the NMC docs say there can be more than one. Doesn't matter,
+            # this is not part of the analysis anyway.
+            aux_tx["tx_index"] = 0
+            msg["auxpow"] = block["auxpow"]
+
+        return msg
+
+    def orphaned_blocks(self):
+        """
+        The blocks published provisionally that are no longer on the chain, as
+        (height, hash) from the lowest up.
+        """
+        orphaned = []
+        for (height, published_hash) in reversed(self.state.provisional_blocks):
+            try:
+                current_hash = self.block_hash(height)
+            except (JSONRPCException, IndexError):
+                # the chain got shorter
+                current_hash = None
+            if current_hash == published_hash:
+                break
+            orphaned.insert(0, (height, published_hash))
+        return orphaned
+
+    def run(self, publisher):
+        """
+        Gets the new blocks from the chain and has publisher publish them.
+        With a tip follower, it keeps going, waiting for new blocks in
+        between, until stop() is called.
+        """
+        state = self.state
+        depth = self.profile.confirmations
+        cur_block = self.startfrom if self.startfrom is not None else state.last_known_block + 1
+        last_checkpoint = time.time()
+        last_checkpoint_block = cur_block
+
+        try:
+            while not self.__stopped.is_set():
+                tip_height = self.chain_height()
+                if self.provisional:
+                    # Blocks are published right away, marked provisional while they are not deep enough
+                    last_block = self.stopat if self.stopat is not None else tip_height
+                else:
+                    # We wait for a number of confirmations before accepting a block as incorporated
+                    last_block = self.stopat if self.stopat is not None else tip_height - depth
+
+                # Blocks published provisionally that have left the chain are rolled back, the last one first
+                orphaned = self.orphaned_blocks()
+                if orphaned:
+                    logging.info("Blocks %d to %d left the chain, rolling them back." % (orphaned[0][0], orphaned[-1][0]))
+                    rollback = OrderedDict()
+                    rollback["rollback"] = [orphaned_hash for (height, orphaned_hash) in reversed(orphaned)]
+                    del state.provisional_blocks[-len(orphaned):]
+                    state.last_known_block = orphaned[0][0] - 1
+                    publisher.rollback(self.profile.name, orphaned, rollback, state.checkpoint())
+                    cur_block = orphaned[0][0]
+                while state.provisional_blocks and state.provisional_blocks[0][0] <= tip_height - depth:
+                    del state.provisional_blocks[0]
+
+                print("Starting at block %s" % str(cur_block))
+                print("Stopping at block %s" % str(last_block))
+
+                chain_changed = False
+                fetch_failed = False
+                if cur_block > last_block:
+                    logging.info("No new blocks.")
+                else:
+                    # Blocks are fetched ahead by several workers, but published strictly in order
+                    pipeline = OrderedPipeline(self.fetch, self.config.rpc_fetch_workers, self.config.rpc_fetch_window,
+                                               self.config.rpc_fetch_max_bytes, lambda msg: msg["block"].get("size", 0))
+                    blocks = pipeline.map(xrange(cur_block, last_block + 1))
+                    while True:
+                        try:
+                            msg = next(blocks, None)
+                        except JSONRPCException, e:
+                            if self.tip_follower is None:
+                                raise
+                            # e.g. a block lost in a reorg while it was fetched, or a replica lagging behind
+                            logging.warning("Fetching block %d failed: %s. Trying again." % (cur_block, e.error))
+                            fetch_failed = True
+                            break
+                        if msg is None:
+                            break
+                        if self.__stopped.is_set():
+                            return
+                        if (state.provisional_blocks and state.provisional_blocks[-1][0] == cur_block - 1
+                                and msg["block"].get("previousblockhash") != state.provisional_blocks[-1][1]):
+                            # the chain changed while the blocks were fetched, so look again
+                            chain_changed = True
+                            break
+                        if self.provisional:
+                            msg["provisional"] = cur_block > tip_height - depth
+                            msg["confirmations"] = tip_height - cur_block + 1
+                        print("Going for block %s of %s" % (str(cur_block), str(last_block)))
+                        if self.provisional and cur_block > tip_height - depth:
+                            state.provisional_blocks.append((cur_block, msg["block"]["hash"]))
+                        state.last_known_block = cur_block
+                        # the state is only saved this far once the publisher has delivered the block
+                        publisher.publish(self.profile.name, cur_block, msg, state.checkpoint())
+                        cur_block = cur_block + 1
+                        if (time.time() - last_checkpoint >= self.checkpoint_interval
+                                or cur_block - last_checkpoint_block >= self.checkpoint_blocks):
+                            state.save()
+                            last_checkpoint = time.time()
+                            last_checkpoint_block = cur_block
+
+                if chain_changed:
+                    continue
+                if self.tip_follower is None:
+                    break
+                if fetch_failed:
+                    self.tip_follower.sleep(self.tip_follower.min_interval, self.__check_stopped, 1.0)
+                    continue
+                # caught up, so the state is saved before the wait
+                if state.last_known_block == last_block:
+                    publisher.flush()
+                    state.save()
+                    last_checkpoint = time.time()
+                self.tip_follower.wait(self.__check_stopped, 1.0)
+        except _Stopped:
+            pass
+
+    def stop(self):
+        """Makes run() return, once it is done with the block at hand."""
+        self.__stopped.set()
+
+    def close(self):
+        if self.tip_follower is not None:
+            self.tip_follower.close()
+        if self.process_pool is not None:
+            self.process_pool.terminate()
+        if self.block_reader is not None:
+            self.block_reader.close()
+        self.rpc_cache.close()
+        logging.info("RPC cache for %s: %d hits, %d misses" % (self.profile.name, self.rpc_cache.hits, self.rpc_cache.misses))
+
+    def __check_stopped(self):
+        if self.__stopped.is_set():
+            raise _Stopped()
+
+
+class ExtractorEngine(object):
+    """
+    Runs the ChainExtractors of several chains at once, each on a thread of
+    its own named after the chain, sharing one publisher. run() returns once
+    all of them are done; should one of them fail, the others are stopped
+    and its exception is raised.
+    """
+
+    def __init__(self, extractors, publisher):
+        self.extractors = extractors
+        self.publisher = publisher
+        self.__error = None
+
+    def run(self):
+        threads = []
+        for extractor in self.extractors:
+            thread = threading.Thread(target=self.__run_extractor, args=(extractor,), name=extractor.profile.name)
+            thread.setDaemon(True)
+            thread.start()
+            threads.append(thread)
+
+        try:
+            while self.__error is None:
+                alive = [thread for thread in threads if thread.isAlive()]
+                if not alive:
+                    break
+                alive[0].join(1.0)
+                # pika only answers the broker's heartbeats while it is called
+                self.publisher.idle()
+        finally:
+            for extractor in self.extractors:
+                extractor.stop()
+            for thread in threads:
+                thread.join(10.0)
+        if self.__error is not None:
+            raise self.__error[0], self.__error[1], self.__error[2]
+
+    def __run_extractor(self, extractor):
+        try:
+            extractor.run(self.publisher)
+        except BaseException:
+            logging.exception("Extracting %s failed." % extractor.profile.name)
+            if self.__error is None:
+                self.__error = sys.exc_info()
+
+
+def main(description, profiles, default_config, default_log, genesis_dirs=None):
+    """
+    Runs the extractor for the chains of the given profiles, as a script
+    does. With more than one profile, the chains whose daemon has a section
+    in the config file are extracted, or those picked with --chains, and
+    genesis_dirs may tell where their genesis files are.
+    """
+    multi = len(profiles) > 1
+    genesis_dirs = genesis_dirs if genesis_dirs is not None else {}
+
+    # Initialize argument parser
+    parser = argparse.ArgumentParser(description=description)
+
+    # A config file is needed.
+    parser.add_argument("-c", "--config", action="store", help="config file name", default=default_config)
+
+    # Debug output - this will be written to log file
+    parser.add_argument("-d", "--debug", action="store_true", help="Enable debug output")
+
+    # Enable AMQP dry-run -- do not send to AMQP, but print out to stdout
+    parser.add_argument("--amqpdry", action="store_true", help="Do dry run for AMQP, i.e. print to stdout instead of sending to AMQP.")
+
+    # Enable storing to a block archive -- implies amqpdry
+    parser.add_argument("--archive", "--pickle", dest="archive", action="store_true", help="Store to a block archive in working_dir of [archive]. Implies --amqpdry.")
+
+    if multi:
+        # Pick chains
+        parser.add_argument("--chains", action="store", help="Extract these chains (comma separated) only, of %s" % ", ".join(profile.name for profile in profiles))
+    else:
+        # Start from given block
+        parser.add_argument("--startfrom", action="store", type=int, help="Start from block with given index")
+
+        # Stop at given block
+        parser.add_argument("--stopat", action="store", type=int, help="Stop at block with given index")
+
+    # Time the RPC calls
+    parser.add_argument("--rpcstats", action="store", help="Write per-method RPC call statistics as JSON to the given file")
+
+    # Keep running
+    parser.add_argument("--follow", action="store_true", help="Keep running, publishing new blocks as they get confirmed")
+
+    # Do not wait for confirmations
+    parser.add_argument("--provisional", action="store_true", help="Publish blocks as soon as they are there, marked provisional until they are confirmed, and roll back those that leave the chain")
+
+    # Go through options passed.
+    args = parser.parse_args()
+    startfrom = None if multi else args.startfrom
+    stopat = None if multi else args.stopat
+
+    # Now parse config file options
+    config_fn = args.config
+    scp = ConfigParser.SafeConfigParser()
+    scp.read(config_fn)
+
+    config_read_fail = False
+    if not scp.has_section("logging"):
+        print("Missing section logging in config file.")
+        config_read_fail = True
+
+    # Pick the chains
+    if not multi:
+        chosen = profiles
+    elif args.chains:
+        by_name = dict((profile.name, profile) for profile in profiles)
+        chosen = []
+        for name in args.chains.split(","):
+            if name.strip() not in by_name:
+                print("Unknown chain %s." % name.strip())
+                config_read_fail = True
+            else:
+                chosen.append(by_name[name.strip()])
+    else:
+        chosen = [profile for profile in profiles if scp.has_section(profile.daemon)]
+    if not chosen:
+        print("No chains to extract.")
+        config_read_fail = True
+
+    configs = []
+    for profile in chosen:
+        config = ChainConfig(scp, profile, genesis_dirs.get(profile.name, "."))
+        for error in config.errors:
+            print(error)
+            config_read_fail = True
+        configs.append(config)
+    # the exchanges are fanout exchanges, so chains sharing one would get each other's blocks
+    exchanges = [config.amqp_exchange for config in configs if not config.errors]
+    if len(set(exchanges)) < len(exchanges):
+        print("Each chain needs an amqp_exchange of its own.")
+        config_read_fail = True
+    notify_ports = [config.notify_port for config in configs if not config.errors and config.notify_port is not None]
+    if args.follow and len(set(notify_ports)) < len(notify_ports):
+        print("Each chain needs a notify_port of its own.")
+        config_read_fail = True
+
+    # With --follow, the daemon is asked for its best block every min_poll_interval seconds, less and less
+    # often while there is no new one, down to every max_poll_interval seconds. A datagram to notify_port
+    # on localhost (sent by -blocknotify, see TipFollower) makes it ask right away.
+    follow_min_poll_interval = config_option(scp, "follow", "min_poll_interval", 1, float)
+    follow_max_poll_interval = config_option(scp, "follow", "max_poll_interval", 10, float)
+    if args.follow and stopat is not None:
+        print("--follow and --stopat cannot be used together.")
+        config_read_fail = True
+
+    # set up dry run
+    dry_run = True if args.amqpdry or args.archive else False
+
+    # Check archive configuration; with several chains, each gets a directory of its own in working_dir.
+    # Older config files name the directory in [pickle].
+    archive_dirs = {}
+    if args.archive:
+        archive_path = config_option(scp, "archive", "working_dir", config_option(scp, "pickle", "working_dir", None))
+        if archive_path is None:
+            print("Missing option working_dir in archive configuration.")
+            config_read_fail = True
+        else:
+            for profile in chosen:
+                archive_dirs[profile.name] = os.path.join(archive_path, profile.name) if multi else archive_path
+    # Blocks are appended to segment files of up to segment_size bytes, synced to disk every sync_interval seconds
+    archive_segment_size = config_option(scp, "archive", "segment_size", 256 * 1024 * 1024, int)
+    archive_sync_interval = config_option(scp, "archive", "sync_interval", 1, float)
+
+    # Go through AMQP configuration
+    if not dry_run:
+        for option in ["amqp_host", "amqp_port", "amqp_exchange", "amqp_queue", "amqp_user", "amqp_password", "amqp_routing_key"]:
+            if not scp.has_option("amqp", option):
+                print("Missing option %s in AMQP confguration." % option)
+                config_read_fail = True
+    # The blocks are sent as JSON, compressed for the consumers that take it (see chainutil.message)
+    message_compression = config_option(scp, "amqp", "message_compression", "none")
+    if message_compression not in COMPRESSIONS:
+        print("message_compression must be one of %s." % ", ".join(sorted(COMPRESSIONS)))
+        config_read_fail = True
+    # Messages are committed to the broker batch_size at a time, or flush_interval seconds after the first of them
+    # at most; only the blocks committed count as extracted when the state is saved
+    batch_size = config_option(scp, "amqp", "batch_size", 32, int)
+    flush_interval = config_option(scp, "amqp", "flush_interval", 1, float)
+
+    # The state of the chains is saved to checkpoint_file (by default next to the config file) every checkpoint_blocks
+    # blocks or every checkpoint_interval seconds, whichever comes first. Older config files set the interval in [follow].
+    checkpoint_file = config_option(scp, "checkpoint", "checkpoint_file", os.path.splitext(config_fn)[0] + ".checkpoint")
+    checkpoint_blocks = config_option(scp, "checkpoint", "checkpoint_blocks", 1000, int)
+    checkpoint_interval = config_option(scp, "checkpoint", "checkpoint_interval",
+                                        config_option(scp, "follow", "checkpoint_interval", 60, float), float)
+    try:
+        checkpoint_store = CheckpointStore(checkpoint_file)
+    except (IOError, ValueError), e:
+        print("Cannot read checkpoint file %s: %s" % (checkpoint_file, e))
+        config_read_fail = True
+
+    if config_read_fail:
+        sys.exit(-1)
+
+    # Set up log
+    log_file = config_option(scp, "logging", "log_file", default_log)
+    level = logging.DEBUG if args.debug else logging.INFO
+    logging.basicConfig(filename=log_file, filemode="w", level=level, format='%(asctime)s:%(levelname)s:%(threadName)s: %(message)s')
+
+    # the chains share the checkpoint file to keep their state in, and the HTTP connection pools
+    transports = {}
+    extractors = []
+    publisher = None
+    rpc_stats = OrderedDict()
+    try:
+        for (profile, config) in zip(chosen, configs):
+            state = ChainState(checkpoint_store, profile.name, scp, "state_" + profile.name if multi else "state")
+            rpc_stats[profile.name] = RPCStats() if args.rpcstats else None
+            extractors.append(ChainExtractor(profile, config, state, transports, rpc_stats[profile.name],
+                                             startfrom, stopat, args.follow, args.provisional, follow_min_poll_interval,
+                                             follow_max_poll_interval, checkpoint_interval, checkpoint_blocks))
+
+        # set up AMQP, once the block decoding processes are forked
+        if args.archive:
+            archives = dict((profile.name, BlockArchive(archive_dirs[profile.name], True, archive_segment_size))
+                            for profile in chosen)
+            publisher = ArchivePublisher(archives, archive_sync_interval)
+        elif dry_run:
+            print("Dry-run selected.")
+            publisher = DryRunPublisher()
+        else:
+            publisher = AMQPPublisher(config_option(scp, "amqp", "amqp_host", "localhost"),
+                                      config_option(scp, "amqp", "amqp_port", 5672, int),
+                                      config_option(scp, "amqp", "amqp_user", "guest"),
+                                      config_option(scp, "amqp", "amqp_password", "guest"),
+                                      message_compression, batch_size, flush_interval)
+        for extractor in extractors:
+            publisher.add_chain(extractor.profile.name, extractor.config.amqp_exchange, extractor.config.amqp_queue,
+                                extractor.profile.decimals)
+
+        # a kill ends it like Ctrl-C does, with the state saved on the way out
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        try:
+            ExtractorEngine(extractors, publisher).run()
+        except InconsistentIndexError, e:
+            # logged by the engine already; the state is saved as far as the blocks were published
+            print("%s Exiting." % e)
+            sys.exit(-1)
+    finally:
+        try:
+            # commits what is left, so that the states can be saved that far
+            if publisher is not None:
+                publisher.close()
+        finally:
+            for extractor in extractors:
+                extractor.state.save()
+                extractor.close()
+        if args.rpcstats and rpc_stats:
+            # several chains' statistics go into one file, by chain
+            if multi:
+                report = json.dumps(dict((name, stats.asDict()) for (name, stats) in rpc_stats.items()))
+            else:
+                report = rpc_stats.values()[0].dumps()
+            with open(args.rpcstats, "w") as stats_fh:
+                stats_fh.write(report)
@@ -0,0 +1,78 @@
+import errno
+import select
+import socket
+import time
+
+
+class TipFollower(object):
+    """
+    Waits for the tip of a chain to move on, as told by tip(), e.g. a
+    proxy's getbestblockhash. While it stays put, tip() is called every
+    min_interval seconds at first and less and less often, down to every
+    max_interval seconds. With notify_port, a datagram to that UDP port
+    makes it look right away; the daemon can send one for every new block:
+
+        -blocknotify="sh -c 'echo %s | nc -u -w1 127.0.0.1 28400'"
+    """
+
+    def __init__(self, tip, min_interval=1.0, max_interval=10.0, notify_port=None, notify_host="127.0.0.1"):
+        self.tip = tip
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.__socket = None
+        if notify_port is not None:
+            self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.__socket.bind((notify_host, notify_port))
+            self.__socket.setblocking(False)
+        self.__last = tip()
+
+    def wait(self, idle=None, idle_interval=5.0):
+        """
+        Returns the new tip once it differs from the one seen last. idle, if
+        given, is called at least every idle_interval seconds meanwhile, e.g.
+        to keep a connection alive.
+        """
+        interval = self.min_interval
+        while True:
+            self.sleep(interval, idle, idle_interval)
+            tip = self.tip()
+            if tip != self.__last:
+                self.__last = tip
+                return tip
+            interval = min(interval * 2, self.max_interval)
+
+    def sleep(self, interval, idle=None, idle_interval=5.0):
+        """Waits interval seconds, or less if notified, calling idle as wait() does."""
+        deadline = time.time() + interval
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0 or self.__notified(min(remaining, idle_interval)):
+                return
+            if idle is not None:
+                idle()
+
+    def close(self):
+        if self.__socket is not None:
+            self.__socket.close()
+            self.__socket = None
+
+    def __notified(self, timeout):
+        if self.__socket is None:
+            time.sleep(timeout)
+            return False
+        try:
+            (readable, writable, failed) = select.select([self.__socket], [], [], timeout)
+        except select.error, e:
+            if e.args[0] == errno.EINTR:
+                return False
+            raise
+        if not readable:
+            return False
+        # one look at the tip covers all the blocks announced so far
+        try:
+            while True:
+                self.__socket.recv(512)
+        except socket.error, e:
+            if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+        return True
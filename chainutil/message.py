@@ -0,0 +1,43 @@
+import zlib
+from jsonrpc import dumps, loads, JSONDecodeException
+
+# the AMQP content type of the block messages
+JSON_CONTENT_TYPE = "application/json"
+
+# how a message may be compressed; the name goes in the AMQP content encoding, none leaving it out
+COMPRESSIONS = ("none", "zlib")
+
+
+class MessageFormatException(Exception):
+    pass
+
+
+def encode_message(msg, compression="none"):
+    """
+    Encodes a message, e.g. a block message of an extractor, as JSON,
+    compressed as compression says. Sent with content type
+    JSON_CONTENT_TYPE and, if compressed, the compression as the content
+    encoding, it is what the database writers read.
+    """
+    if compression not in COMPRESSIONS:
+        raise MessageFormatException("Unknown compression %s" % compression)
+    body = dumps(msg)
+    if compression == "zlib":
+        body = zlib.compress(body, 6)
+    return body
+
+
+def decode_message(data, compression="none", amounts=None):
+    """
+    Decodes a message encoded by encode_message with the same compression,
+    with loads; with an AmountHook as amounts, the amounts come out as
+    integers in base units.
+    """
+    if compression not in COMPRESSIONS:
+        raise MessageFormatException("Unknown compression %s" % compression)
+    try:
+        if compression == "zlib":
+            data = zlib.decompress(data)
+        return loads(data, amounts)
+    except (zlib.error, JSONDecodeException), e:
+        raise MessageFormatException("Corrupt message: %s" % e)
@@ -0,0 +1,103 @@
+import sys
+import threading
+
+
+class OrderedPipeline(object):
+    """
+    Computes fn(item) for a sequence of items on several worker threads,
+    working ahead of the consumer, and hands the results back strictly in
+    the order of the items:
+
+        pipeline = OrderedPipeline(fetch, workers=4, window=16)
+        for result in pipeline.map(heights):
+            publish(result)
+
+    No more than window results past the one to be handed back next are
+    being computed or waiting in the reorder buffer at a time. With
+    max_size, no new one is started either while the size() of those
+    waiting adds up to more than that, short of the one the consumer is
+    waiting for. An exception raised by fn is raised by map where its
+    result would have been handed back.
+    """
+
+    def __init__(self, fn, workers=4, window=16, max_size=None, size=len):
+        self.fn = fn
+        self.workers = max(workers, 1)
+        self.window = max(window, 1)
+        self.max_size = max_size
+        self.size = size
+
+    def map(self, items):
+        state = _PipelineState(iter(items))
+        threads = [threading.Thread(target=self.__work, args=(state,)) for i in range(self.workers)]
+        for thread in threads:
+            thread.setDaemon(True)
+            thread.start()
+
+        try:
+            while True:
+                with state.cond:
+                    while state.next_out not in state.done and not (state.exhausted and state.next_out >= state.next_in):
+                        state.cond.wait()
+                    if state.next_out not in state.done:
+                        return
+                    (ok, value, size) = state.done.pop(state.next_out)
+                    state.held -= size
+                    state.next_out += 1
+                    state.cond.notify_all()
+                if not ok:
+                    raise value[0], value[1], value[2]
+                yield value
+        finally:
+            with state.cond:
+                # the workers finish what they are at and leave
+                state.stopped = True
+                state.cond.notify_all()
+
+    def __work(self, state):
+        while True:
+            with state.cond:
+                while not state.stopped and not state.exhausted and self.__must_wait(state):
+                    state.cond.wait()
+                if state.stopped or state.exhausted:
+                    return
+                try:
+                    item = state.items.next()
+                except StopIteration:
+                    state.exhausted = True
+                    state.cond.notify_all()
+                    return
+                index = state.next_in
+                state.next_in += 1
+
+            try:
+                value = self.fn(item)
+                size = self.size(value) if self.max_size is not None else 0
+                result = (True, value, size)
+            except:
+                result = (False, sys.exc_info(), 0)
+
+            with state.cond:
+                state.done[index] = result
+                state.held += result[2]
+                state.cond.notify_all()
+
+    def __must_wait(self, state):
+        if state.next_in >= state.next_out + self.window:
+            return True
+        # the result the consumer waits for is always fetched
+        return self.max_size is not None and state.held > self.max_size and state.next_in > state.next_out
+
+
+class _PipelineState(object):
+    def __init__(self, items):
+        self.items = items
+        self.cond = threading.Condition()
+        # index of the next item to hand to a worker, and of the next result to hand back
+        self.next_in = 0
+        self.next_out = 0
+        # the reorder buffer: index -> (True, result, size) or (False, exc_info, 0)
+        self.done = {}
+        self.held = 0
+        self.exhausted = False
+        self.stopped = False
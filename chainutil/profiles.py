@@ -0,0 +1,53 @@
+from chainutil.chains import BITCOIN, NAMECOIN, PEERCOIN
+
+
+class ChainProfile(object):
+    """
+    What sets the extraction of one chain apart from another's:
+
+    - daemon, rpc_port: the config section with its daemon's options, and
+      the daemon's default JSON-RPC port
+    - confirmations: how deep a block must be before it is taken as part of
+      the chain for good
+    - decimals: the number of decimals of a coin, i.e. 10 ** decimals base
+      units make one
+    - auxpow: whether blocks may come with a merge-mining proof (auxpow)
+    - validate_addresses: whether output addresses are checked, and the
+      result sent along as addresses_valid
+    - script_chain: the chain whose addresses scriptSigs are decoded with,
+      the way its daemon's decodescript would (by default, chain itself)
+    - getblockcount: whether the daemon only tells its height that way,
+      rather than by getblockchaininfo
+    - raw_tx_sizes: whether transaction sizes are worked out from the raw
+      transactions, for daemons that do not report them
+    - block_files: whether BlockFileReader can read the daemon's blk*.dat
+      files
+    """
+
+    def __init__(self, name, chain, daemon, rpc_port, confirmations, decimals, auxpow=False, validate_addresses=False,
+                 script_chain=None, getblockcount=False, raw_tx_sizes=False, block_files=False):
+        self.name = name
+        self.chain = chain
+        self.daemon = daemon
+        self.rpc_port = rpc_port
+        self.confirmations = confirmations
+        self.decimals = decimals
+        self.auxpow = auxpow
+        self.validate_addresses = validate_addresses
+        self.script_chain = script_chain if script_chain is not None else chain
+        self.getblockcount = getblockcount
+        self.raw_tx_sizes = raw_tx_sizes
+        self.block_files = block_files
+
+    def __repr__(self):
+        return "ChainProfile(%r)" % self.name
+
+
+BITCOIN_PROFILE = ChainProfile("bitcoin", BITCOIN, "bitcoind", 8332, 6, 8, block_files=True)
+NAMECOIN_PROFILE = ChainProfile("namecoin", NAMECOIN, "namecoind", 8336, 12, 8, auxpow=True, validate_addresses=True)
+# ppcoind does not support decodescript; the script format is Bitcoin's, so scriptSigs are
+# decoded the way a bitcoind would, Bitcoin addresses included, as they used to come from one
+PEERCOIN_PROFILE = ChainProfile("peercoin", PEERCOIN, "ppcoind", 9901, 6, 6, validate_addresses=True,
+                                script_chain=BITCOIN, getblockcount=True, raw_tx_sizes=True)
+
+PROFILES = dict((profile.name, profile) for profile in [BITCOIN_PROFILE, NAMECOIN_PROFILE, PEERCOIN_PROFILE])
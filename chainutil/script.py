@@ -0,0 +1,240 @@
+import struct
+from binascii import hexlify, unhexlify
+from chainutil.base58 import b58encode_check
+from chainutil.bech32 import segwit_address
+from chainutil.chains import BITCOIN
+from chainutil.hashes import hash160
+
+OP_0 = 0x00
+OP_PUSHDATA1 = 0x4c
+OP_PUSHDATA2 = 0x4d
+OP_PUSHDATA4 = 0x4e
+OP_1 = 0x51
+OP_16 = 0x60
+OP_RETURN = 0x6a
+OP_DUP = 0x76
+OP_EQUAL = 0x87
+OP_EQUALVERIFY = 0x88
+OP_HASH160 = 0xa9
+OP_CHECKSIG = 0xac
+OP_CHECKMULTISIG = 0xae
+
+OP_NAMES = {0x00: "0", 0x4c: "OP_PUSHDATA1", 0x4d: "OP_PUSHDATA2", 0x4e: "OP_PUSHDATA4", 0x4f: "-1", 0x50: "OP_RESERVED",
+            0x61: "OP_NOP", 0x62: "OP_VER", 0x63: "OP_IF", 0x64: "OP_NOTIF", 0x65: "OP_VERIF", 0x66: "OP_VERNOTIF",
+            0x67: "OP_ELSE", 0x68: "OP_ENDIF", 0x69: "OP_VERIFY", 0x6a: "OP_RETURN", 0x6b: "OP_TOALTSTACK",
+            0x6c: "OP_FROMALTSTACK", 0x6d: "OP_2DROP", 0x6e: "OP_2DUP", 0x6f: "OP_3DUP", 0x70: "OP_2OVER",
+            0x71: "OP_2ROT", 0x72: "OP_2SWAP", 0x73: "OP_IFDUP", 0x74: "OP_DEPTH", 0x75: "OP_DROP", 0x76: "OP_DUP",
+            0x77: "OP_NIP", 0x78: "OP_OVER", 0x79: "OP_PICK", 0x7a: "OP_ROLL", 0x7b: "OP_ROT", 0x7c: "OP_SWAP",
+            0x7d: "OP_TUCK", 0x7e: "OP_CAT", 0x7f: "OP_SUBSTR", 0x80: "OP_LEFT", 0x81: "OP_RIGHT", 0x82: "OP_SIZE",
+            0x83: "OP_INVERT", 0x84: "OP_AND", 0x85: "OP_OR", 0x86: "OP_XOR", 0x87: "OP_EQUAL",
+            0x88: "OP_EQUALVERIFY", 0x89: "OP_RESERVED1", 0x8a: "OP_RESERVED2", 0x8b: "OP_1ADD", 0x8c: "OP_1SUB",
+            0x8d: "OP_2MUL", 0x8e: "OP_2DIV", 0x8f: "OP_NEGATE", 0x90: "OP_ABS", 0x91: "OP_NOT",
+            0x92: "OP_0NOTEQUAL", 0x93: "OP_ADD", 0x94: "OP_SUB", 0x95: "OP_MUL", 0x96: "OP_DIV", 0x97: "OP_MOD",
+            0x98: "OP_LSHIFT", 0x99: "OP_RSHIFT", 0x9a: "OP_BOOLAND", 0x9b: "OP_BOOLOR", 0x9c: "OP_NUMEQUAL",
+            0x9d: "OP_NUMEQUALVERIFY", 0x9e: "OP_NUMNOTEQUAL", 0x9f: "OP_LESSTHAN", 0xa0: "OP_GREATERTHAN",
+            0xa1: "OP_LESSTHANOREQUAL", 0xa2: "OP_GREATERTHANOREQUAL", 0xa3: "OP_MIN", 0xa4: "OP_MAX",
+            0xa5: "OP_WITHIN", 0xa6: "OP_RIPEMD160", 0xa7: "OP_SHA1", 0xa8: "OP_SHA256", 0xa9: "OP_HASH160",
+            0xaa: "OP_HASH256", 0xab: "OP_CODESEPARATOR", 0xac: "OP_CHECKSIG", 0xad: "OP_CHECKSIGVERIFY",
+            0xae: "OP_CHECKMULTISIG", 0xaf: "OP_CHECKMULTISIGVERIFY", 0xb0: "OP_NOP1",
+            0xb1: "OP_CHECKLOCKTIMEVERIFY", 0xb2: "OP_CHECKSEQUENCEVERIFY", 0xb3: "OP_NOP4", 0xb4: "OP_NOP5",
+            0xb5: "OP_NOP6", 0xb6: "OP_NOP7", 0xb7: "OP_NOP8", 0xb8: "OP_NOP9", 0xb9: "OP_NOP10",
+            0xff: "OP_INVALIDOPCODE"}
+for n in range(1, 17):
+    OP_NAMES[OP_1 + n - 1] = str(n)
+
+
+def parse_script(script):
+    """
+    Splits a serialized script into (opcode, data) pairs, data being the
+    pushed bytes for pushes and None otherwise. Returns the pairs and
+    whether the script parsed to its end; a push running past the end
+    stops the parsing there.
+    """
+    ops = []
+    pos = 0
+    end = len(script)
+    while pos < end:
+        opcode = ord(script[pos])
+        pos += 1
+        if opcode > OP_PUSHDATA4:
+            ops.append((opcode, None))
+            continue
+        if opcode < OP_PUSHDATA1:
+            size = opcode
+        elif opcode == OP_PUSHDATA1:
+            if end - pos < 1:
+                return (ops, False)
+            size = ord(script[pos])
+            pos += 1
+        elif opcode == OP_PUSHDATA2:
+            if end - pos < 2:
+                return (ops, False)
+            size = struct.unpack_from("<H", script, pos)[0]
+            pos += 2
+        else:
+            if end - pos < 4:
+                return (ops, False)
+            size = struct.unpack_from("<L", script, pos)[0]
+            pos += 4
+        if end - pos < size:
+            return (ops, False)
+        ops.append((opcode, script[pos:pos + size]))
+        pos += size
+    return (ops, True)
+
+
+def script_num(data):
+    """The number a push of up to 4 bytes stands for (little endian, sign bit on top)."""
+    if not data:
+        return 0
+    n = 0
+    for (i, byte) in enumerate(bytearray(data)):
+        n |= byte << (8 * i)
+    sign_bit = 0x80 << (8 * (len(data) - 1))
+    if n & sign_bit:
+        return -(n & ~sign_bit)
+    return n
+
+
+SIGHASH_NAMES = {0x01: "ALL", 0x02: "NONE", 0x03: "SINGLE",
+                 0x81: "ALL|ANYONECANPAY", 0x82: "NONE|ANYONECANPAY", 0x83: "SINGLE|ANYONECANPAY"}
+
+
+def _is_der_signature(sig):
+    # BIP 66 strict DER, with the sighash type byte at the end
+    sig = bytearray(sig)
+    size = len(sig)
+    if size < 9 or size > 73 or sig[0] != 0x30 or sig[1] != size - 3:
+        return False
+    len_r = sig[3]
+    if 5 + len_r >= size:
+        return False
+    len_s = sig[5 + len_r]
+    if len_r + len_s + 7 != size:
+        return False
+    if sig[2] != 0x02 or len_r == 0 or sig[4] & 0x80 or (len_r > 1 and sig[4] == 0 and not sig[5] & 0x80):
+        return False
+    if (sig[len_r + 4] != 0x02 or len_s == 0 or sig[len_r + 6] & 0x80
+            or (len_s > 1 and sig[len_r + 6] == 0 and not sig[len_r + 7] & 0x80)):
+        return False
+    return True
+
+
+def script_to_asm(ops, complete=True, sighash_decode=False):
+    """
+    The asm text of parsed ops, the way bitcoind's decodescript writes it.
+    With sighash_decode, signatures are written with their sighash type
+    spelled out, e.g. [ALL], as decoderawtransaction does for scriptSigs.
+    """
+    if sighash_decode and ops and ops[0] == (OP_RETURN, None):
+        sighash_decode = False
+    words = []
+    for (opcode, data) in ops:
+        if data is None:
+            words.append(OP_NAMES.get(opcode, "OP_UNKNOWN"))
+        elif len(data) <= 4:
+            words.append(str(script_num(data)))
+        elif sighash_decode and ord(data[-1]) in SIGHASH_NAMES and _is_der_signature(data):
+            words.append(hexlify(data[:-1]) + "[" + SIGHASH_NAMES[ord(data[-1])] + "]")
+        else:
+            words.append(hexlify(data))
+    if not complete:
+        words.append("[error]")
+    return " ".join(words)
+
+
+def _is_pubkey(data):
+    # compressed or uncompressed, going by the first byte
+    if len(data) == 33:
+        return data[0] in "\x02\x03"
+    elif len(data) == 65:
+        return data[0] in "\x04\x06\x07"
+    return False
+
+
+def _is_small_int(opcode):
+    return OP_1 <= opcode <= OP_16
+
+
+def solve_script(script, ops, complete):
+    """
+    Matches a script against the standard templates. Returns its type and,
+    for the types that pay to someone, the number of signatures required
+    and a list of (kind, data) destinations, kind being one of "pubkeyhash",
+    "scripthash" or "witness" (with data a (version, program) pair).
+    """
+    size = len(script)
+    if size == 23 and script[0] == chr(OP_HASH160) and script[1] == "\x14" and script[22] == chr(OP_EQUAL):
+        return ("scripthash", 1, [("scripthash", script[2:22])])
+
+    if 4 <= size <= 42 and (script[0] == chr(OP_0) or _is_small_int(ord(script[0]))) and ord(script[1]) + 2 == size:
+        version = 0 if script[0] == chr(OP_0) else ord(script[0]) - OP_1 + 1
+        program = script[2:]
+        if version == 0 and len(program) == 20:
+            return ("witness_v0_keyhash", 1, [("witness", (version, program))])
+        elif version == 0 and len(program) == 32:
+            return ("witness_v0_scripthash", 1, [("witness", (version, program))])
+        elif version == 0:
+            return ("nonstandard", None, None)
+        elif version == 1 and len(program) == 32:
+            return ("witness_v1_taproot", 1, [("witness", (version, program))])
+        return ("witness_unknown", 1, [("witness", (version, program))])
+
+    if complete and ops and ops[0] == (OP_RETURN, None) and all(opcode <= OP_16 for (opcode, data) in ops[1:]):
+        return ("nulldata", None, None)
+
+    if ((size == 35 or size == 67) and ord(script[0]) == size - 2 and script[-1] == chr(OP_CHECKSIG)
+            and _is_pubkey(script[1:-1])):
+        return ("pubkey", 1, [("pubkeyhash", hash160(script[1:-1]))])
+
+    if (size == 25 and script[:3] == chr(OP_DUP) + chr(OP_HASH160) + "\x14"
+            and script[23:] == chr(OP_EQUALVERIFY) + chr(OP_CHECKSIG)):
+        return ("pubkeyhash", 1, [("pubkeyhash", script[3:23])])
+
+    if complete and len(ops) >= 4 and ops[-1] == (OP_CHECKMULTISIG, None) and _is_small_int(ops[0][0]):
+        required = ops[0][0] - OP_1 + 1
+        keys = []
+        for (opcode, data) in ops[1:-2]:
+            if data is None or not _is_pubkey(data):
+                break
+            keys.append(data)
+        count = ops[-2][0]
+        if len(keys) == len(ops) - 3 and _is_small_int(count) and count - OP_1 + 1 == len(keys) >= required:
+            return ("multisig", required, [("pubkeyhash", hash160(key)) for key in keys])
+
+    return ("nonstandard", None, None)
+
+
+def destination_address(kind, data, chain=BITCOIN):
+    if kind == "pubkeyhash":
+        return b58encode_check(chain.pubkey_hash_version, data)
+    elif kind == "scripthash":
+        return b58encode_check(chain.script_hash_version, data)
+    (version, program) = data
+    return segwit_address(chain.bech32_hrp, version, program)
+
+
+def decode_script(script_hex, chain=BITCOIN):
+    """
+    Decodes a hex encoded script without asking the daemon: returns what
+    its decodescript call does, i.e. a dict with asm and type, plus reqSigs
+    and addresses for scripts paying to an address and the P2SH address of
+    the script itself, with the version bytes of chain. Raises ValueError
+    for anything that is not hex.
+    """
+    try:
+        script = unhexlify(script_hex)
+    except TypeError, e:
+        raise ValueError("Script is not hexadecimal: %s" % e)
+
+    (ops, complete) = parse_script(script)
+    result = {"asm": script_to_asm(ops, complete)}
+    (script_type, required, destinations) = solve_script(script, ops, complete)
+    result["type"] = script_type
+    if destinations:
+        result["reqSigs"] = required
+        result["addresses"] = [destination_address(kind, data, chain) for (kind, data) in destinations]
+    if script_type != "scripthash":
+        # a P2SH script cannot be wrapped in another one
+        result["p2sh"] = b58encode_check(chain.script_hash_version, hash160(script))
+    return result
@@ -19,8 +19,16 @@
   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """
 
-from jsonrpc.json import loads, dumps, JSONEncodeException, JSONDecodeException
-from jsonrpc.proxy import ServiceProxy, JSONRPCException
-from jsonrpc.serviceHandler import ServiceMethod, ServiceHandler, ServiceMethodNotFound, ServiceException
+from jsonrpc.json import loads, dumps, AmountHook, JSONEncodeException, JSONDecodeException
+from jsonrpc.proxy import ServiceProxy, JSONRPCException, StreamedResult
+from jsonrpc.transport import HTTPTransport
+from jsonrpc.stream import JSONStream
+from jsonrpc.asyncproxy import AsyncServiceProxy, RPCFuture, RPCTimeout, ProxyClosed
+from jsonrpc.cache import LRUCache, ResultCache, CachingServiceProxy
+from jsonrpc.stats import RPCStats
+from jsonrpc.multiproxy import MultiServiceProxy
+from jsonrpc.serviceHandler import ServiceMethod, CPUBoundServiceMethod, ServiceHandler, ServiceMethodNotFound, ServiceException
 from jsonrpc.cgiwrapper import handleCGI
-from jsonrpc.modpywrapper import handler
\ No newline at end of file
+from jsonrpc.modpywrapper import handler
+from jsonrpc.wsgiwrapper import WSGIServiceHandler, wsgiApplication
+from jsonrpc.httpserver import ServiceHTTPServer, serveHTTP
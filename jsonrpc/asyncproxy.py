@@ -0,0 +1,208 @@
+"""
+  Copyright (c) 2007 Jan-Klaas Kollhof
+
+  This file is part of jsonrpc.
+
+  jsonrpc is free software; you can redistribute it and/or modify
+  it under the terms of the GNU Lesser General Public License as published by
+  the Free Software Foundation; either version 2.1 of the License, or
+  (at your option) any later version.
+
+  This software is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU Lesser General Public License for more details.
+
+  You should have received a copy of the GNU Lesser General Public License
+  along with this software; if not, write to the Free Software
+  Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import sys
+import threading
+import Queue
+from jsonrpc.proxy import ServiceProxy
+from jsonrpc.transport import HTTPTransport
+
+
+class RPCFuture(object):
+    """The pending result of a call made through an AsyncServiceProxy."""
+
+    def __init__(self):
+        self.__done = threading.Event()
+        self.__result = None
+        self.__excInfo = None
+        self.__callbacks = []
+        self.__lock = threading.Lock()
+
+    def done(self):
+        return self.__done.isSet()
+
+    def result(self, timeout=None):
+        """
+        Waits for the call and returns its result, or raises whatever the
+        call raised (a JSONRPCException for errors reported by the server).
+        """
+        if not self.__done.wait(timeout):
+            raise RPCTimeout()
+        if self.__excInfo != None:
+            raise self.__excInfo[0], self.__excInfo[1], self.__excInfo[2]
+        return self.__result
+
+    def exception(self, timeout=None):
+        if not self.__done.wait(timeout):
+            raise RPCTimeout()
+        if self.__excInfo != None:
+            return self.__excInfo[1]
+        return None
+
+    def addDoneCallback(self, fn):
+        """Calls fn(future) once the call finished, right away if it has."""
+        self.__lock.acquire()
+        try:
+            if not self.__done.isSet():
+                self.__callbacks.append(fn)
+                return
+        finally:
+            self.__lock.release()
+        fn(self)
+
+    def setResult(self, result):
+        self.__result = result
+        self.__finish()
+
+    def setExcInfo(self, excInfo):
+        self.__excInfo = excInfo
+        self.__finish()
+
+    def __finish(self):
+        self.__lock.acquire()
+        try:
+            self.__done.set()
+            callbacks = self.__callbacks
+            self.__callbacks = []
+        finally:
+            self.__lock.release()
+        for fn in callbacks:
+            fn(self)
+
+
+class RPCTimeout(Exception):
+    pass
+
+
+class ProxyClosed(Exception):
+    pass
+
+
+class _Dispatcher(object):
+    # Runs calls on maxInFlight worker threads. The semaphore makes callers
+    # block as soon as maxInFlight calls are outstanding, so a producer
+    # cannot queue up an unbounded number of requests.
+
+    def __init__(self, maxInFlight):
+        self.__slots = threading.Semaphore(maxInFlight)
+        self.__queue = Queue.Queue()
+        self.__closed = False
+        self.__lock = threading.Lock()
+        self.__workers = []
+        for i in range(maxInFlight):
+            worker = threading.Thread(target=self.__work, name="jsonrpc-async-%d" % i)
+            worker.daemon = True
+            worker.start()
+            self.__workers.append(worker)
+
+    def submit(self, fn, *args):
+        future = RPCFuture()
+        self.__slots.acquire()
+        self.__lock.acquire()
+        try:
+            if self.__closed:
+                # nobody would run it
+                self.__slots.release()
+                raise ProxyClosed()
+            self.__queue.put((future, fn, args))
+        finally:
+            self.__lock.release()
+        return future
+
+    def shutdown(self):
+        # the calls submitted so far are queued before the workers are told to stop
+        self.__lock.acquire()
+        try:
+            if self.__closed:
+                return
+            self.__closed = True
+            for worker in self.__workers:
+                self.__queue.put(None)
+        finally:
+            self.__lock.release()
+        for worker in self.__workers:
+            worker.join()
+
+    def __work(self):
+        while True:
+            item = self.__queue.get()
+            if item == None:
+                return
+            (future, fn, args) = item
+            try:
+                result = fn(*args)
+            except:
+                self.__slots.release()
+                future.setExcInfo(sys.exc_info())
+            else:
+                self.__slots.release()
+                future.setResult(result)
+
+
+class AsyncServiceProxy(object):
+    """
+    Same attribute-call interface as ServiceProxy, but every call returns an
+    RPCFuture right away and runs in the background. At most maxInFlight
+    calls are on the wire at a time; a caller issuing more blocks until one
+    of them finished.
+
+        futures = [proxy.getrawtransaction(txid) for txid in txids]
+        raws = [f.result() for f in futures]
+    """
+
+    def __init__(self, serviceURL, serviceName=None, maxInFlight=16, transport=None, dispatcher=None, stats=None):
+        self.__serviceURL = serviceURL
+        self.__serviceName = serviceName
+        if transport == None:
+            transport = HTTPTransport(serviceURL, poolSize=maxInFlight)
+        self.__transport = transport
+        if dispatcher == None:
+            dispatcher = _Dispatcher(maxInFlight)
+        self.__dispatcher = dispatcher
+        self.__maxInFlight = maxInFlight
+        self.__stats = stats
+        self.__proxy = ServiceProxy(serviceURL, serviceName, transport, stats)
+        # the proxy that made the dispatcher and transport closes them, not the ones derived from it
+        self.__root = True
+
+    def __getattr__(self, name):
+        if self.__serviceName != None:
+            name = "%s.%s" % (self.__serviceName, name)
+        proxy = AsyncServiceProxy(self.__serviceURL, name, self.__maxInFlight, self.__transport, self.__dispatcher, self.__stats)
+        proxy.__root = False
+        return proxy
+
+    def __call__(self, *args):
+        return self.__dispatcher.submit(self.__proxy, *args)
+
+    def batch(self, calls, maxBatchSize=None):
+        """Like ServiceProxy.batch, returning a future for the result list."""
+        return self.__dispatcher.submit(self.__proxy.batch, list(calls), maxBatchSize)
+
+    def close(self):
+        """
+        Waits for the outstanding calls and stops the worker threads; calls
+        made afterwards raise ProxyClosed. Only the proxy created directly
+        closes them, closing one derived from it (proxy.foo) does nothing.
+        """
+        if not self.__root:
+            return
+        self.__dispatcher.shutdown()
+        self.__transport.close()
@@ -0,0 +1,211 @@
+"""
+  Copyright (c) 2007 Jan-Klaas Kollhof
+
+  This file is part of jsonrpc.
+
+  jsonrpc is free software; you can redistribute it and/or modify
+  it under the terms of the GNU Lesser General Public License as published by
+  the Free Software Foundation; either version 2.1 of the License, or
+  (at your option) any later version.
+
+  This software is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU Lesser General Public License for more details.
+
+  You should have received a copy of the GNU Lesser General Public License
+  along with this software; if not, write to the Free Software
+  Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import shelve
+import threading
+from collections import OrderedDict
+from jsonrpc.json import dumps, loads
+from jsonrpc.proxy import JSONRPCException
+
+
+class LRUCache(object):
+    """
+    A mapping of at most maxSize entries; storing one more drops the entry
+    that was used least recently. Safe to share between threads.
+    """
+
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key, default=None):
+        self.__lock.acquire()
+        try:
+            try:
+                value = self.__entries.pop(key)
+            except KeyError:
+                return default
+            self.__entries[key] = value
+            return value
+        finally:
+            self.__lock.release()
+
+    def put(self, key, value):
+        self.__lock.acquire()
+        try:
+            self.__entries.pop(key, None)
+            self.__entries[key] = value
+            while len(self.__entries) > self.maxSize:
+                self.__entries.popitem(last=False)
+        finally:
+            self.__lock.release()
+
+    def clear(self):
+        self.__lock.acquire()
+        try:
+            self.__entries.clear()
+        finally:
+            self.__lock.release()
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+class ResultCache(object):
+    """
+    Results of the calls to the given methods, keyed by method and params.
+    The most recent maxSize of them are kept in memory; with a path, all of
+    them also go to a shelve file there, which outlives the process.
+
+    Only list methods whose result never changes for the same params, e.g.
+    getrawtransaction or decodescript; not getblockhash, whose answer
+    changes with a reorg. Results are stored as JSON text, so every caller
+    gets a fresh copy to modify; put() and result() turn them into the text
+    and back.
+    """
+
+    def __init__(self, methods, maxSize=10000, path=None):
+        self.methods = frozenset(methods)
+        self.hits = 0
+        self.misses = 0
+        self.__memory = LRUCache(maxSize)
+        self.__disk = None
+        self.__diskLock = threading.Lock()
+        self.__statsLock = threading.Lock()
+        if path != None:
+            self.__disk = shelve.open(path, "c", protocol=2)
+
+    def key(self, method, params):
+        return dumps([method, list(params)])
+
+    def get(self, key):
+        """The cached JSON text for key, or None."""
+        text = self.__memory.get(key)
+        if text == None and self.__disk != None:
+            self.__diskLock.acquire()
+            try:
+                text = self.__disk.get(key)
+            finally:
+                self.__diskLock.release()
+            if text != None:
+                self.__memory.put(key, text)
+        self.__statsLock.acquire()
+        try:
+            if text == None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        finally:
+            self.__statsLock.release()
+        return text
+
+    def result(self, text):
+        """The result get() returned the text of."""
+        return loads(text)[0]
+
+    def put(self, key, result):
+        # in a list, as loads takes only an array or object at the top; a number or true would not come back
+        text = dumps([result])
+        self.__memory.put(key, text)
+        if self.__disk != None:
+            self.__diskLock.acquire()
+            try:
+                self.__disk[key] = text
+            finally:
+                self.__diskLock.release()
+
+    def close(self):
+        """Writes out and closes the shelve file."""
+        if self.__disk != None:
+            self.__diskLock.acquire()
+            try:
+                self.__disk.close()
+                self.__disk = None
+            finally:
+                self.__diskLock.release()
+
+
+class CachingServiceProxy(object):
+    """
+    Wraps a ServiceProxy (or anything with its interface) and answers the
+    calls to the methods of cache from there, passing on only what is not
+    in it yet. Batches are split up the same way: only the calls that
+    missed go to the server, in one batch.
+
+        cache = ResultCache(["getrawtransaction", "decodescript"], 10000, "rpc.cache")
+        proxy = CachingServiceProxy(ServiceProxy(url), cache)
+    """
+
+    def __init__(self, proxy, cache, serviceName=None):
+        self.__proxy = proxy
+        self.__cache = cache
+        self.__serviceName = serviceName
+
+    def __getattr__(self, name):
+        proxy = getattr(self.__proxy, name)
+        if self.__serviceName != None:
+            name = "%s.%s" % (self.__serviceName, name)
+        return CachingServiceProxy(proxy, self.__cache, name)
+
+    def __call__(self, *args):
+        if self.__serviceName not in self.__cache.methods:
+            return self.__proxy(*args)
+        key = self.__cache.key(self.__serviceName, args)
+        text = self.__cache.get(key)
+        if text != None:
+            return self.__cache.result(text)
+        result = self.__proxy(*args)
+        self.__cache.put(key, result)
+        return result
+
+    def batch(self, calls, maxBatchSize=None):
+        calls = list(calls)
+        results = [None] * len(calls)
+        # (index in calls, cache key or None) of what has to be fetched
+        missing = []
+        for (i, (method, params)) in enumerate(calls):
+            if self.__serviceName != None:
+                method = "%s.%s" % (self.__serviceName, method)
+            if method not in self.__cache.methods:
+                missing.append((i, None))
+                continue
+            key = self.__cache.key(method, params)
+            text = self.__cache.get(key)
+            if text == None:
+                missing.append((i, key))
+            else:
+                results[i] = self.__cache.result(text)
+
+        if missing:
+            try:
+                fetched = self.__proxy.batch([calls[i] for (i, key) in missing], maxBatchSize)
+            except JSONRPCException, e:
+                if e.callIndex != None:
+                    e.callIndex = missing[e.callIndex][0]
+                raise
+            for ((i, key), result) in zip(missing, fetched):
+                results[i] = result
+                if key != None:
+                    self.__cache.put(key, result)
+        return results
@@ -6,7 +6,8 @@ class CGIServiceHandler(ServiceHandler):
         if service == None:
             import __main__ as service
 
-        ServiceHandler.__init__(self, service)
+        # a batch is answered on the thread pool of the process, not one of its own
+        ServiceHandler.__init__(self, service, sharePool=True)
 
     def handleRequest(self, fin=None, fout=None, env=None):
         if fin==None:
@@ -42,4 +43,8 @@ class CGIServiceHandler(ServiceHandler):
         fout.flush()
 
 def handleCGI(service=None, fin=None, fout=None, env=None):
-    CGIServiceHandler(service).handleRequest(fin, fout, env)
\ No newline at end of file
+    handler = CGIServiceHandler(service)
+    try:
+        handler.handleRequest(fin, fout, env)
+    finally:
+        handler.close()
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+  Copyright (c) 2007 Jan-Klaas Kollhof
+
+  This file is part of jsonrpc.
+
+  jsonrpc is free software; you can redistribute it and/or modify
+  it under the terms of the GNU Lesser General Public License as published by
+  the Free Software Foundation; either version 2.1 of the License, or
+  (at your option) any later version.
+
+  This software is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU Lesser General Public License for more details.
+
+  You should have received a copy of the GNU Lesser General Public License
+  along with this software; if not, write to the Free Software
+  Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import BaseHTTPServer
+import threading
+import Queue
+from jsonrpc.serviceHandler import ServiceHandler
+
+
+class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps the connection open between requests, as long as every
+    # response says how long it is
+    protocol_version = "HTTP/1.1"
+    # buffer the status line, headers and body and send them off at once
+    # when handle_one_request flushes, rather than in small packets that
+    # run into delayed ACKs
+    wbufsize = -1
+
+    def setup(self):
+        # a client that keeps an idle connection open holds a worker, so
+        # let it go after a while
+        self.timeout = self.server.keepAliveTimeout
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+    def do_POST(self):
+        try:
+            contLen = int(self.headers.getheader("content-length"))
+        except (TypeError, ValueError):
+            self.__fail(411, "Length Required")
+            return
+        if contLen > self.server.maxRequestSize:
+            # the body is not read, so the connection cannot be reused
+            self.__fail(413, "Request Entity Too Large")
+            return
+
+        data = self.rfile.read(contLen)
+        resultData = self.server.serviceHandler.handleRequest(data)
+        self.__respond(200, "application/json", resultData)
+
+    def __fail(self, code, message):
+        self.close_connection = 1
+        self.__respond(code, "text/plain", message, [("Connection", "close")])
+
+    def __respond(self, code, contentType, body, headers=[]):
+        self.send_response(code)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        for (name, value) in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.logRequests:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class ServiceHTTPServer(BaseHTTPServer.HTTPServer):
+    """
+    A long running HTTP server answering JSON-RPC requests (and batches)
+    POSTed to it for the ServiceMethods of service:
+
+        server = ServiceHTTPServer(("127.0.0.1", 8080), service)
+        server.serve_forever()
+
+    Connections are kept alive and handled by a fixed pool of worker
+    threads, so neither a process nor a thread is started per request.
+    Bodies larger than maxRequestSize bytes are turned down with 413.
+    threads and processes are passed on to the ServiceHandler.
+    """
+
+    allow_reuse_address = True
+
+    def __init__(self, address, service, workers=16, maxRequestSize=1 << 20, keepAliveTimeout=15, threads=4, processes=0, logRequests=False):
+        self.serviceHandler = ServiceHandler(service, threads, processes)
+        self.maxRequestSize = maxRequestSize
+        self.keepAliveTimeout = keepAliveTimeout
+        self.logRequests = logRequests
+        self.__connections = Queue.Queue()
+        self.__workers = []
+        # binds, and calls server_close if that fails
+        BaseHTTPServer.HTTPServer.__init__(self, address, _RequestHandler)
+        self.__workers = [threading.Thread(target=self.__work) for i in range(workers)]
+        for worker in self.__workers:
+            worker.setDaemon(True)
+            worker.start()
+
+    def process_request(self, request, client_address):
+        self.__connections.put((request, client_address))
+
+    def __work(self):
+        while True:
+            item = self.__connections.get()
+            if item == None:
+                return
+            (request, client_address) = item
+            try:
+                self.finish_request(request, client_address)
+            except:
+                self.handle_error(request, client_address)
+            self.shutdown_request(request)
+
+    def server_close(self):
+        BaseHTTPServer.HTTPServer.server_close(self)
+        for worker in self.__workers:
+            self.__connections.put(None)
+        self.serviceHandler.close()
+
+
+def serveHTTP(service=None, host="127.0.0.1", port=8080, **kw):
+    if service == None:
+        import __main__ as service
+
+    server = ServiceHTTPServer((host, port), service, **kw)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -19,18 +19,32 @@
   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """
 
+from __future__ import absolute_import
 from types import *
+from decimal import Decimal, ROUND_HALF_UP
+import binascii
+import gc
 import re
+import warnings
 
-CharReplacements ={
-        '\t': '\\t',
-        '\b': '\\b',
-        '\f': '\\f',
-        '\n': '\\n',
-        '\r': '\\r',
-        '\\': '\\\\',
-        '/': '\\/',
-        '"': '\\"'}
+# loads() hands valid JSON to a C scanner if one is available. simplejson
+# is preferred: like referenceLoads it gives str for ASCII strings, while
+# the json module of the standard library only produces unicode. Note the
+# absolute imports: without them "json" would be this very module.
+try:
+    from simplejson import decoder as _cDecoderModule, scanner as _cScanner
+    _cDecoderGivesStr = True
+    if _cScanner.c_make_scanner == None:
+        raise ImportError("simplejson lacks its C speedups")
+except ImportError:
+    try:
+        from json import decoder as _cDecoderModule, scanner as _cScanner
+        _cDecoderGivesStr = False
+        if _cScanner.c_make_scanner == None:
+            raise ImportError("json module lacks its C speedups")
+    except ImportError:
+        _cDecoderModule = None
+from json import JSONEncoder as _JSONEncoder, JSONDecoder as _JSONDecoder
 
 EscapeCharToChar = {
         't': '\t',
@@ -42,9 +56,19 @@ EscapeCharToChar = {
         '/': '/',
         '"' : '"'}
 
-StringEscapeRE= re.compile(r'[\x00-\x19\\"/\b\f\n\r\t]')
 Digits = ['0', '1', '2','3','4','5','6','7','8','9']
 
+WhitespaceRE = re.compile(r'[ \t\r\n]*')
+# Same number grammar as referenceLoads: an exponent needs a fraction and a sign
+NumberRE = re.compile(r'-?[0-9]+(?:\.[0-9]*(?:[eE][-+][0-9]*)?)?')
+StringChunkRE = re.compile(r'([^"\\]*)(["\\])')
+PlainStringRE = re.compile(r'[^"\\]*"')
+HexCodeRE = re.compile(r'[0-9a-fA-F]{4}$')
+ASCIIChars = "".join([chr(i) for i in range(128)])
+# Documents from this size up are decoded with the cyclic garbage collector
+# held off, see _scan
+GCPauseSize = 1 << 16
+
 
 class JSONEncodeException(Exception):
     def __init__(self, obj):
@@ -64,63 +88,59 @@ class JSONDecodeException(Exception):
        return self.message
 
     
-def escapeChar(match):
-    c=match.group(0)
-    try:
-        replacement = CharReplacements[c]
-        return replacement
-    except KeyError:
-        d = ord(c)
-        if d < 32:
-            return '\\u%04x' % d
-        else:
-            return c
+class _DecimalText(long):
+    # A Decimal dressed up as an integer: both the C and the Python encoder
+    # print integers with str(), which gives the Decimal in positional
+    # notation here (floats they print with float.__repr__, which would
+    # round it; and not all decoders take 1E-8). Its value as an integer is
+    # never looked at, so it is not worked out.
+    def __new__(cls, value):
+        obj = long.__new__(cls)
+        obj.text = '{0:f}'.format(value)
+        return obj
+
+    def __str__(self):
+        return self.text
+
+
+def _encodeDefault(obj):
+    if isinstance(obj, Decimal):
+        if not obj.is_finite():
+            raise JSONEncodeException(obj)
+        return _DecimalText(obj)
+    elif isinstance(obj, bytearray):
+        # raw bytes go out as a hex string, the way the daemons show them
+        return binascii.hexlify(obj)
+    elif type(obj) is GeneratorType:
+        return list(obj)
+    raise JSONEncodeException(obj)
+
+
+# Encoding is left to the json module of the standard library. Its C
+# encoder builds the whole document in one buffer and copies strings that
+# need no escaping as they are; what it cannot encode by itself goes
+# through _encodeDefault. Floats are printed with repr(), so they survive
+# the round trip, and anything beyond ASCII is escaped, so the result is a
+# plain ASCII str.
+_encoder = _JSONEncoder(separators=(',', ':'), check_circular=False, allow_nan=False, default=_encodeDefault)
 
 def dumps(obj):
-    return unicode("".join([part for part in dumpParts (obj)]))
+    try:
+        return _encoder.encode(obj)
+    except (TypeError, ValueError):
+        # an unsupported key type or a float that is NaN or infinite
+        raise JSONEncodeException(obj)
 
 def dumpParts (obj):
-    objType = type(obj)
-    if obj == None:
-       yield u'null'
-    elif objType is BooleanType:
-        if obj:
-            yield u'true'
-        else:
-            yield u'false'
-    elif objType is DictionaryType:
-        yield u'{'
-        isFirst=True
-        for (key, value) in obj.items():
-            if isFirst:
-                isFirst=False
-            else:
-                yield u","
-            yield u'"' + StringEscapeRE.sub(escapeChar, key) +u'":'
-            for part in dumpParts (value):
-                yield part
-        yield u'}'
-    elif objType in StringTypes:
-        yield u'"' + StringEscapeRE.sub(escapeChar, obj) +u'"'
-
-    elif objType in [TupleType, ListType, GeneratorType]:
-        yield u'['
-        isFirst=True
-        for item in obj:
-            if isFirst:
-                isFirst=False
-            else:
-                yield u","
-            for part in dumpParts (item):
-                yield part
-        yield u']'
-    elif objType in [IntType, LongType, FloatType]:
-        yield unicode(obj)
-    else:
+    try:
+        for part in _encoder.iterencode(obj):
+            yield part
+    except (TypeError, ValueError):
         raise JSONEncodeException(obj)
     
-
-def loads(s):
+# The original decoder, one character at a time. loads() falls back to it
+# for anything that is not plain JSON, and benchmark.py measures against it.
+def referenceLoads(s):
     stack = []
     chars = iter(s)
     value = None
@@ -228,3 +248,290 @@ def loads(s):
          raise JSONDecodeException("Unexpected end of JSON source")
 
 
+def loads(s, amounts=None):
+    """
+    Decodes s, giving the same result as referenceLoads (including str vs
+    unicode strings) and raising the same errors for the same input. Valid
+    JSON goes through the C scanner of simplejson or of the json module if
+    one is available, otherwise through pyLoads. Anything the fast paths reject is handed to
+    referenceLoads, which is lenient in its own ways.
+
+    With an AmountHook as amounts, the amounts it names come out as
+    integers in base units; see there.
+    """
+    if amounts != None:
+        return amounts.loads(s)
+    if _cDecoder == None:
+        warnings.warn("No C JSON scanner (simplejson or json) available, decoding in pure Python", RuntimeWarning)
+        return pyLoads(s)
+    if type(s) is not StringType or ('\\' in s and '\\u' in s):
+        # \u escapes are decoded differently by the C scanner (surrogate
+        # pairs), and for unicode documents the type of each string depends
+        # on whether it holds escapes, so these never take that path. (A
+        # daemon response rarely has a backslash at all, and looking for
+        # one is twice as fast as looking for \u.)
+        return pyLoads(s)
+    try:
+        value = _scan(_cDecoder, s)
+    except Exception:
+        return referenceLoads(s)
+    objType = type(value)
+    if objType is not DictionaryType and objType is not ListType:
+        # a lone scalar is cheap, let pyLoads deal with the corner cases of
+        # numbers at the very end of the input
+        return pyLoads(s)
+    if _cDecoderGivesStr and not s.translate(None, ASCIIChars):
+        return value
+    return _unicodeToStr(value)
+
+
+def _scan(decoder, s):
+    # Decoding a large document makes a great many objects and lists, and the
+    # garbage collector would go through all of them again every few hundred;
+    # none of them can be garbage before the decoder returns, so it waits.
+    if len(s) < GCPauseSize or not gc.isenabled():
+        return decoder.decode(s)
+    gc.disable()
+    try:
+        return decoder.decode(s)
+    finally:
+        gc.enable()
+
+def _rejectConstant(name):
+    raise JSONDecodeException('Expected []{}," or Number, Null, False or True')
+
+def _checkedFloat(text):
+    # referenceLoads only takes an exponent after a fraction, and only with
+    # an explicit sign
+    if 'e' in text or 'E' in text:
+        if not NumberRE.match(text).end() == len(text):
+            raise JSONDecodeException("Expected + or -")
+    return float(text)
+
+if _cDecoderModule != None:
+    _cDecoder = _cDecoderModule.JSONDecoder(parse_float=_checkedFloat, parse_constant=_rejectConstant, strict=False)
+else:
+    _cDecoder = None
+
+def _unicodeToStr(obj, keys=None):
+    # referenceLoads builds strings from the bytes of its input, so a str
+    # document gives str values. keys caches the converted object keys,
+    # which repeat all over a daemon response.
+    if keys == None:
+        keys = {}
+    objType = type(obj)
+    if objType is UnicodeType:
+        return obj.encode("utf-8")
+    elif objType is DictionaryType:
+        converted = {}
+        for (key, value) in obj.iteritems():
+            try:
+                strKey = keys[key]
+            except KeyError:
+                strKey = keys[key] = key.encode("utf-8")
+            valueType = type(value)
+            if valueType is UnicodeType:
+                converted[strKey] = value.encode("utf-8")
+            elif valueType is DictionaryType or valueType is ListType:
+                converted[strKey] = _unicodeToStr(value, keys)
+            else:
+                converted[strKey] = value
+        return converted
+    elif objType is ListType:
+        return [_unicodeToStr(item, keys) for item in obj]
+    return obj
+
+class _NumberText(str):
+    # the digits of a number with a fraction or exponent, kept as they are
+    # until AmountHook.pairs knows which member it belongs to
+    __slots__ = ()
+
+
+class AmountHook(object):
+    """
+    Decodes the numbers in the object members named in keys as integer
+    amounts of base units with decimals digits after the point (8 for
+    satoshis), straight from their digits, so no float is made for them on
+    the way. Other numbers decode as usual, strings as str and objects as
+    objectType.
+
+        amounts = AmountHook(["value"], 8)
+        tx = loads(body, amounts)
+        tx["vout"][0]["value"]      # 5000000000 for 50.00000000
+
+    Pass it to loads(), or use parseFloat and pairs as the parse_float and
+    object_pairs_hook of a json module decoder.
+    """
+
+    def __init__(self, keys=("value",), decimals=8, objectType=dict):
+        self.keys = frozenset(keys)
+        self.decimals = decimals
+        self.objectType = objectType
+        self.__scale = 10 ** decimals
+        if _cDecoderModule != None:
+            decoderClass = _cDecoderModule.JSONDecoder
+        else:
+            decoderClass = _JSONDecoder
+        self.__decoder = decoderClass(parse_float=self.parseFloat, object_pairs_hook=self.pairs, parse_constant=_rejectConstant, strict=False)
+
+    def loads(self, s):
+        try:
+            value = _scan(self.__decoder, s)
+        except ValueError, e:
+            raise JSONDecodeException(str(e))
+        return self.__plain([value])[0]
+
+    def toUnits(self, text):
+        """The amount written as text, in base units."""
+        (whole, point, fraction) = text.partition(".")
+        if len(fraction) <= self.decimals and fraction.isdigit() and whole.lstrip("-").isdigit():
+            return int(whole + fraction.ljust(self.decimals, "0"))
+        # an exponent or more digits than base units have: the long way,
+        # rounding like round() does
+        return int(Decimal(text).scaleb(self.decimals).to_integral_value(ROUND_HALF_UP))
+
+    def parseFloat(self, text):
+        return _NumberText(text)
+
+    def pairs(self, pairs):
+        keys = self.keys
+        converted = []
+        for (key, value) in pairs:
+            if type(key) is UnicodeType:
+                key = key.encode("utf-8")
+            valueType = type(value)
+            if valueType is _NumberText:
+                if key in keys:
+                    value = self.toUnits(value)
+                else:
+                    value = float(value)
+            elif valueType is UnicodeType:
+                value = value.encode("utf-8")
+            elif valueType is ListType:
+                value = self.__plain(value)
+            elif key in keys and (valueType is IntType or valueType is LongType):
+                value = value * self.__scale
+            converted.append((key, value))
+        return self.objectType(converted)
+
+    def __plain(self, items):
+        # array elements are no object members, so they are never amounts;
+        # objects among them have been through pairs already
+        converted = []
+        for item in items:
+            itemType = type(item)
+            if itemType is _NumberText:
+                item = float(item)
+            elif itemType is UnicodeType:
+                item = item.encode("utf-8")
+            elif itemType is ListType:
+                item = self.__plain(item)
+            converted.append(item)
+        return converted
+
+
+class _NotFast(Exception):
+    pass
+
+def pyLoads(s):
+    """
+    Pure-Python decoder working on regular expression matches instead of
+    single characters. Falls back to referenceLoads for anything that is not
+    plain JSON. It is only about twice as fast as referenceLoads, so loads()
+    warns when it has no C scanner and has to use it.
+    """
+    try:
+        return _pyValue(s, WhitespaceRE.match(s, 0).end())[0]
+    except Exception:
+        return referenceLoads(s)
+
+def _pyValue(s, idx):
+    c = s[idx]
+    if c == '"':
+        return _pyString(s, idx + 1)
+    elif c == '{':
+        obj = {}
+        idx = WhitespaceRE.match(s, idx + 1).end()
+        if s[idx] == '}':
+            return (obj, idx + 1)
+        while True:
+            if s[idx] != '"':
+                raise _NotFast()
+            (key, idx) = _pyString(s, idx + 1)
+            idx = WhitespaceRE.match(s, idx).end()
+            if s[idx] != ':':
+                raise _NotFast()
+            idx = WhitespaceRE.match(s, idx + 1).end()
+            (obj[key], idx) = _pyValue(s, idx)
+            idx = WhitespaceRE.match(s, idx).end()
+            c = s[idx]
+            if c == '}':
+                return (obj, idx + 1)
+            elif c != ',':
+                raise _NotFast()
+            idx = WhitespaceRE.match(s, idx + 1).end()
+    elif c == '[':
+        lst = []
+        idx = WhitespaceRE.match(s, idx + 1).end()
+        if s[idx] == ']':
+            return (lst, idx + 1)
+        while True:
+            (value, idx) = _pyValue(s, idx)
+            lst.append(value)
+            idx = WhitespaceRE.match(s, idx).end()
+            c = s[idx]
+            if c == ']':
+                return (lst, idx + 1)
+            elif c != ',':
+                raise _NotFast()
+            idx = WhitespaceRE.match(s, idx + 1).end()
+    elif c in Digits or c == '-':
+        m = NumberRE.match(s, idx)
+        # referenceLoads gives up on a number starting at the last character,
+        # and on an exponent without a sign
+        if m == None or idx + 1 == len(s):
+            raise _NotFast()
+        text = m.group(0)
+        if '.' in text:
+            if s[m.end():m.end() + 1] in ('e', 'E'):
+                raise _NotFast()
+            return (float(text), m.end())
+        return (int(text), m.end())
+    elif s.startswith('null', idx):
+        return (None, idx + 4)
+    elif s.startswith('true', idx):
+        return (True, idx + 4)
+    elif s.startswith('false', idx):
+        return (False, idx + 5)
+    raise _NotFast()
+
+def _pyString(s, idx):
+    m = PlainStringRE.match(s, idx)
+    if m != None:
+        end = m.end()
+        if end - 1 == idx:
+            # '' even in a unicode document, as in referenceLoads
+            return ('', end)
+        return (s[idx:end - 1], end)
+    chunks = []
+    while True:
+        m = StringChunkRE.match(s, idx)
+        if m == None:
+            raise _NotFast()
+        (content, terminator) = m.groups()
+        if content:
+            chunks.append(content)
+        idx = m.end()
+        if terminator == '"':
+            # like referenceLoads: str unless an \u escape made it unicode
+            return (''.join(chunks), idx)
+        c = s[idx]
+        if c == 'u':
+            hexCode = s[idx + 1:idx + 5]
+            if not HexCodeRE.match(hexCode):
+                raise _NotFast()
+            chunks.append(unichr(int(hexCode, 16)))
+            idx += 5
+        else:
+            chunks.append(EscapeCharToChar[c])
+            idx += 1
@@ -1,6 +1,13 @@
 import sys, os
+import threading
 from jsonrpc import ServiceHandler, ServiceException
 
+# The services behind the module files requests went to, with the endpoints
+# looked up on them so far, reused until the file is modified:
+# {module file: (mtime, service, {method name: endpoint})}
+_resolvedServices = {}
+_resolvedLock = threading.Lock()
+
 
 class ServiceImplementaionNotFound(ServiceException):
     pass
@@ -9,7 +16,8 @@ class ServiceImplementaionNotFound(ServiceException):
 class ModPyServiceHandler(ServiceHandler):
     def __init__(self, req):
         self.req = req
-        ServiceHandler.__init__(self, None)
+        # made for every request, so the batches share the thread pool of the process
+        ServiceHandler.__init__(self, None, sharePool=True)
 
 
     def findServiceEndpoint(self, name):
@@ -17,26 +25,43 @@ class ModPyServiceHandler(ServiceHandler):
 
         (modulePath, fileName) = os.path.split(req.filename)
         (moduleName, ext) = os.path.splitext(fileName)
-        
-        if not os.path.exists(os.path.join(modulePath, moduleName + ".py")):
+        moduleFile = os.path.join(modulePath, moduleName + ".py")
+
+        try:
+            mtime = os.stat(moduleFile).st_mtime
+        except OSError:
             raise ServiceImplementaionNotFound()
+
+        _resolvedLock.acquire()
+        try:
+            resolved = _resolvedServices.get(moduleFile)
+            if resolved == None or resolved[0] != mtime:
+                resolved = (mtime, self.loadService(modulePath, moduleName), {})
+                _resolvedServices[moduleFile] = resolved
+        finally:
+            _resolvedLock.release()
+
+        (mtime, self.service, endpoints) = resolved
+        try:
+            return endpoints[name]
+        except KeyError:
+            meth = endpoints[name] = ServiceHandler.findServiceEndpoint(self, name)
+            return meth
+
+    def loadService(self, modulePath, moduleName):
+        if not modulePath in sys.path:
+            sys.path.insert(0, modulePath)
+
+        from mod_python import apache
+        module = apache.import_module(moduleName, log=1)
+
+        if hasattr(module, "service"):
+            return module.service
+        elif hasattr(module, "Service"):
+            return module.Service()
         else:
-            if not modulePath in sys.path:
-                sys.path.insert(0, modulePath)
-
-            from mod_python import apache
-            module = apache.import_module(moduleName, log=1)
-            
-            if hasattr(module, "service"):
-                self.service = module.service
-            elif hasattr(module, "Service"):
-                self.service = module.Service()
-            else:
-                self.service = module
-
-        return ServiceHandler.findServiceEndpoint(self, name)
-            
-    
+            return module
+
     def handleRequest(self, data):
         self.req.content_type = "text/plain"
         data = self.req.read()
@@ -46,7 +71,11 @@ class ModPyServiceHandler(ServiceHandler):
 
 def handler(req):
     from mod_python import apache
-    ModPyServiceHandler(req).handleRequest(req)
+    handler = ModPyServiceHandler(req)
+    try:
+        handler.handleRequest(req)
+    finally:
+        handler.close()
     return apache.OK
     
 
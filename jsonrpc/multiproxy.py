@@ -0,0 +1,233 @@
+"""
+  Copyright (c) 2007 Jan-Klaas Kollhof
+
+  This file is part of jsonrpc.
+
+  jsonrpc is free software; you can redistribute it and/or modify
+  it under the terms of the GNU Lesser General Public License as published by
+  the Free Software Foundation; either version 2.1 of the License, or
+  (at your option) any later version.
+
+  This software is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU Lesser General Public License for more details.
+
+  You should have received a copy of the GNU Lesser General Public License
+  along with this software; if not, write to the Free Software
+  Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import httplib
+import socket
+import sys
+import threading
+import time
+import Queue
+from jsonrpc.json import JSONDecodeException
+from jsonrpc.proxy import ServiceProxy, JSONRPCException
+from jsonrpc.transport import HTTPTransport
+
+# Calls that only read, and may therefore be sent again to another replica
+ReadOnlyMethods = frozenset(["getbestblockhash", "getblock", "getblockchaininfo", "getblockcount", "getblockhash",
+                             "getblockheader", "getinfo", "getrawtransaction", "decoderawtransaction",
+                             "decodescript", "validateaddress"])
+
+# Errors a replica that lags behind the others reports for blocks and
+# transactions it does not have yet: no such block or transaction, and
+# invalid parameter (-8) when the message says it is a height out of range,
+# as getblockhash has it; any other -8 would fail everywhere
+LaggingReplicaErrors = frozenset([-5])
+OutOfRangeError = -8
+OutOfRangeMessage = "height out of range"
+
+# What a replica that is down or unreachable makes a call raise
+ConnectionErrors = (IOError, socket.error, httplib.HTTPException, JSONDecodeException)
+
+
+def _isLaggingReplicaError(error):
+    if type(error) is not dict:
+        return False
+    code = error.get("code")
+    if code == OutOfRangeError:
+        message = error.get("message")
+        return isinstance(message, basestring) and OutOfRangeMessage in message.lower()
+    return code in LaggingReplicaErrors
+
+
+class _Replica(object):
+    def __init__(self, url, proxy):
+        self.url = url
+        self.proxy = proxy
+        self.outstanding = 0
+        self.failures = 0
+        self.downUntil = 0
+
+
+class _ReplicaSet(object):
+    # Picks the replica with the fewest outstanding calls among those that
+    # are not cooling down after an error. Shared by all proxies derived
+    # from one MultiServiceProxy.
+
+    def __init__(self, replicas, cooldown):
+        self.replicas = replicas
+        self.cooldown = cooldown
+        self.__lock = threading.Lock()
+        self.__next = 0
+
+    def acquire(self, exclude=()):
+        now = time.time()
+        self.__lock.acquire()
+        try:
+            candidates = [r for r in self.replicas if r not in exclude]
+            if not candidates:
+                return None
+            up = [r for r in candidates if r.downUntil <= now]
+            if up:
+                # rotate the starting point so that ties are spread evenly
+                self.__next = (self.__next + 1) % len(up)
+                up = up[self.__next:] + up[:self.__next]
+                replica = min(up, key=lambda r: r.outstanding)
+            else:
+                # all of them are cooling down: try the one that is up first
+                replica = min(candidates, key=lambda r: r.downUntil)
+            replica.outstanding += 1
+            return replica
+        finally:
+            self.__lock.release()
+
+    def release(self, replica, failed=False):
+        self.__lock.acquire()
+        try:
+            replica.outstanding -= 1
+            if failed:
+                replica.failures += 1
+                replica.downUntil = time.time() + self.cooldown
+            else:
+                replica.failures = 0
+                replica.downUntil = 0
+        finally:
+            self.__lock.release()
+
+
+class MultiServiceProxy(object):
+    """
+    Same interface as ServiceProxy, over several replicas of a daemon. Every
+    call goes to the replica with the fewest calls outstanding; one that
+    fails to answer is left alone for cooldown seconds. Calls to readOnly
+    methods that failed that way, or that a lagging replica could not
+    answer yet, are retried on the other replicas before giving up.
+
+    The chunks of a batch are sent off in parallel, one per replica at a
+    time, which is where more replicas give more throughput.
+
+        proxy = MultiServiceProxy(["http://u:p@node1:8332", "http://u:p@node2:8332"])
+    """
+
+    def __init__(self, serviceURLs, serviceName=None, cooldown=30, readOnly=ReadOnlyMethods, transportFactory=HTTPTransport, stats=None, replicas=None):
+        if replicas == None:
+            replicas = _ReplicaSet([_Replica(url, ServiceProxy(url, transport=transportFactory(url), stats=stats)) for url in serviceURLs], cooldown)
+        self.__replicas = replicas
+        self.__serviceName = serviceName
+        self.__readOnly = frozenset(readOnly)
+
+    def __getattr__(self, name):
+        if self.__serviceName != None:
+            name = "%s.%s" % (self.__serviceName, name)
+        return MultiServiceProxy(None, name, readOnly=self.__readOnly, replicas=self.__replicas)
+
+    def __call__(self, *args):
+        return self.__run(self.__serviceName in self.__readOnly, lambda proxy: getattr(proxy, self.__serviceName)(*args))
+
+    def stream(self, path, *args):
+        """Like ServiceProxy.stream; never retried, as it may be half consumed."""
+        return self.__run(False, lambda proxy: getattr(proxy, self.__serviceName).stream(path, *args))
+
+    def batch(self, calls, maxBatchSize=None):
+        """Like ServiceProxy.batch, with the chunks spread over the replicas."""
+        calls = list(calls)
+        if maxBatchSize == None or maxBatchSize < 1:
+            maxBatchSize = max(len(calls), 1)
+        chunks = [(start, calls[start:start + maxBatchSize]) for start in range(0, len(calls), maxBatchSize)]
+        workers = min(len(chunks), len(self.__replicas.replicas))
+        if workers <= 1:
+            results = []
+            for (start, chunk) in chunks:
+                results.extend(self.__batchChunk(start, chunk))
+            return results
+
+        todo = Queue.Queue()
+        for chunk in chunks:
+            todo.put(chunk)
+        done = {}
+        errors = {}
+        def work():
+            while True:
+                try:
+                    (start, chunk) = todo.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    done[start] = self.__batchChunk(start, chunk)
+                except:
+                    errors[start] = sys.exc_info()
+        threads = [threading.Thread(target=work) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            # the same error a sequential run would have stopped at
+            excInfo = errors[min(errors)]
+            raise excInfo[0], excInfo[1], excInfo[2]
+        results = []
+        for (start, chunk) in chunks:
+            results.extend(done[start])
+        return results
+
+    def __batchChunk(self, start, chunk):
+        serviceName = self.__serviceName
+        readOnly = True
+        for (method, params) in chunk:
+            if serviceName != None:
+                method = "%s.%s" % (serviceName, method)
+            readOnly = readOnly and method in self.__readOnly
+
+        def post(proxy):
+            if serviceName != None:
+                proxy = getattr(proxy, serviceName)
+            try:
+                return proxy.batch(chunk)
+            except JSONRPCException, e:
+                if e.callIndex != None:
+                    e.callIndex += start
+                raise
+        return self.__run(readOnly, post)
+
+    def __run(self, retry, fn):
+        tried = []
+        while True:
+            replica = self.__replicas.acquire(tried)
+            if replica == None:
+                # everybody had a go, re-raise what the last one said
+                raise lastExcInfo[0], lastExcInfo[1], lastExcInfo[2]
+            tried.append(replica)
+            try:
+                result = fn(replica.proxy)
+            except JSONRPCException, e:
+                self.__replicas.release(replica)
+                if not retry or not _isLaggingReplicaError(e.error):
+                    raise
+                lastExcInfo = sys.exc_info()
+            except ConnectionErrors:
+                self.__replicas.release(replica, failed=True)
+                if not retry:
+                    raise
+                lastExcInfo = sys.exc_info()
+            except:
+                self.__replicas.release(replica)
+                raise
+            else:
+                self.__replicas.release(replica)
+                return result
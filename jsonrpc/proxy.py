@@ -19,31 +19,194 @@
   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """
 
-import urllib
+import time
 from jsonrpc.json import dumps, loads
+from jsonrpc.transport import HTTPTransport
+from jsonrpc.stream import JSONStream
 
 class JSONRPCException(Exception):
-    def __init__(self, rpcError):
+    def __init__(self, rpcError, callIndex=None):
         Exception.__init__(self)
         self.error = rpcError
+        # position of the failing call inside a batch, None for single calls
+        self.callIndex = callIndex
         
 class ServiceProxy(object):
-    def __init__(self, serviceURL, serviceName=None):
+    def __init__(self, serviceURL, serviceName=None, transport=None, stats=None):
         self.__serviceURL = serviceURL
         self.__serviceName = serviceName
+        # all proxies derived from this one share the connection pool and
+        # the RPCStats, if any
+        if transport == None:
+            transport = HTTPTransport(serviceURL)
+        self.__transport = transport
+        self.__stats = stats
 
     def __getattr__(self, name):
         if self.__serviceName != None:
             name = "%s.%s" % (self.__serviceName, name)
-        return ServiceProxy(self.__serviceURL, name)
+        return ServiceProxy(self.__serviceURL, name, self.__transport, self.__stats)
 
     def __call__(self, *args):
          postdata = dumps({"method": self.__serviceName, 'params': args, 'id':'jsonrpc'})
-         respdata = urllib.urlopen(self.__serviceURL, postdata).read()
-         resp = loads(respdata)
+         resp = self.__post(self.__serviceName, 1, postdata)
          if resp['error'] != None:
              raise JSONRPCException(resp['error'])
          else:
              return resp['result']
-         
 
+    def stream(self, path, *args):
+        """
+        Calls the method like __call__, but returns a StreamedResult that
+        yields the elements of the array at path inside the result while the
+        response is still arriving, e.g. the transactions of a block:
+
+            block = proxy.getblock.stream(["tx"], blockhash, 2)
+            for tx in block:
+                ...
+            height = block.fields["height"]
+        """
+        postdata = dumps({"method": self.__serviceName, 'params': args, 'id':'jsonrpc'})
+        if self.__stats == None:
+            return StreamedResult(self.__transport.open(postdata), ["result"] + list(path))
+        start = time.time()
+        try:
+            resp = self.__transport.open(postdata)
+        except:
+            self.__stats.record(self.__serviceName, 1, len(postdata), 0, time.time() - start, 0.0, 1)
+            raise
+        return StreamedResult(_CountingResponse(resp, self.__stats, self.__serviceName, len(postdata), start), ["result"] + list(path))
+
+    def batch(self, calls, maxBatchSize=None):
+        """
+        Sends a list of (method, params) calls as JSON-RPC batches and
+        returns their results in call order. At most maxBatchSize calls go
+        into one POST (all of them if None). The first call that returned an
+        error raises a JSONRPCException carrying its index in calls.
+        """
+        calls = list(calls)
+        if maxBatchSize == None or maxBatchSize < 1:
+            maxBatchSize = max(len(calls), 1)
+
+        results = []
+        for start in range(0, len(calls), maxBatchSize):
+            results.extend(self.__postBatch(calls[start:start + maxBatchSize], start))
+        return results
+
+    def __postBatch(self, calls, offset):
+        reqs = []
+        for (i, (method, params)) in enumerate(calls):
+            if self.__serviceName != None:
+                method = "%s.%s" % (self.__serviceName, method)
+            reqs.append({"method": method, 'params': list(params), 'id': i})
+
+        methods = set([req["method"] for req in reqs])
+        if len(methods) == 1:
+            statsName = methods.pop()
+        else:
+            statsName = "(batch)"
+        resps = self.__post(statsName, len(reqs), dumps(reqs))
+        # a server that cannot handle the batch at all answers with a
+        # single error object instead of an array
+        if type(resps) is not list:
+            raise JSONRPCException(resps.get('error'), offset)
+
+        respsById = {}
+        for resp in resps:
+            respsById[resp.get('id')] = resp
+
+        results = []
+        for i in range(len(calls)):
+            try:
+                resp = respsById[i]
+            except KeyError:
+                raise JSONRPCException({"code": None, "message": "No response for batched call"}, offset + i)
+            if resp.get('error') != None:
+                raise JSONRPCException(resp['error'], offset + i)
+            results.append(resp['result'])
+        return results
+
+    def __post(self, method, calls, postdata):
+        # posts, decodes and, with stats, records how long each took
+        if self.__stats == None:
+            return loads(self.__transport.request(postdata))
+
+        start = time.time()
+        try:
+            respdata = self.__transport.request(postdata)
+            received = time.time()
+            resp = loads(respdata)
+        except:
+            self.__stats.record(method, calls, len(postdata), 0, time.time() - start, 0.0, calls)
+            raise
+        decoded = time.time()
+
+        if type(resp) is list:
+            errors = len([r for r in resp if type(r) is dict and r.get('error') != None])
+        elif type(resp) is dict and resp.get('error') != None:
+            errors = calls
+        else:
+            errors = 0
+        self.__stats.record(method, calls, len(postdata), len(respdata), received - start, decoded - received, errors)
+        return resp
+
+
+class _CountingResponse(object):
+    # Hands a streamed response to JSONStream and records it in the stats
+    # once closed. Reading and parsing are interleaved there, so everything
+    # after the response headers counts as decode time.
+
+    def __init__(self, resp, stats, method, requestBytes, start):
+        self.__resp = resp
+        self.__stats = stats
+        self.__method = method
+        self.__requestBytes = requestBytes
+        self.__start = start
+        self.__opened = time.time()
+        self.__bytes = 0
+
+    def read(self, amt=None):
+        data = self.__resp.read(amt)
+        self.__bytes += len(data)
+        return data
+
+    def close(self):
+        if self.__stats == None:
+            return
+        self.__resp.close()
+        self.__stats.record(self.__method, 1, self.__requestBytes, self.__bytes, self.__opened - self.__start, time.time() - self.__opened)
+        self.__stats = None
+
+
+
+
+class StreamedResult(object):
+    """
+    Iterates over an array inside the result of a streamed call. Once the
+    iteration is over, fields holds the other keys of the object the array
+    sits in. An error reported by the server raises a JSONRPCException at
+    the end of the iteration, when the error member has been read.
+    """
+
+    def __init__(self, resp, path, chunkSize=65536):
+        self.__resp = resp
+        self.__stream = JSONStream(resp, path, chunkSize)
+        self.fields = None
+
+    def __iter__(self):
+        try:
+            for item in self.__stream:
+                yield item
+        finally:
+            self.close()
+
+        siblings = self.__stream.siblings
+        if siblings and siblings[0].get('error') != None:
+            raise JSONRPCException(siblings[0]['error'])
+        if not self.__stream.found:
+            raise JSONRPCException({"code": None, "message": "No array in the result to stream"})
+        self.fields = siblings[-1]
+
+    def close(self):
+        """Gives the connection back, needed only when stopping early."""
+        self.__resp.close()
@@ -19,6 +19,10 @@
   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """
 
+import os
+import threading
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 from jsonrpc import loads, dumps, JSONEncodeException
 
 
@@ -26,6 +30,15 @@ def ServiceMethod(fn):
     fn.IsServiceMethod = True
     return fn
 
+def CPUBoundServiceMethod(fn):
+    """
+    A ServiceMethod that is run in a worker process, if the ServiceHandler
+    has any; its arguments and result have to be picklable.
+    """
+    fn.IsServiceMethod = True
+    fn.IsCPUBound = True
+    return fn
+
 class ServiceException(Exception):
     pass
 
@@ -39,29 +52,92 @@ class ServiceMethodNotFound(ServiceException):
     def __init__(self, name):
         self.methodName=name
 
-class ServiceHandler(object):
+# The service of a worker process, handed to it by the pool's initializer
+# when it is forked off, so a call only needs to tell it the method name
+# and the arguments.
+_workerService = None
+
+def _initWorker(service):
+    global _workerService
+    _workerService = service
+
+def _invokeForked(methName, args):
+    return getattr(_workerService, methName)(*args)
+
+# The thread pools shared by the handlers of this process, by size, and the
+# process they were started in: a forked child starts its own.
+_sharedThreadPools = {}
+_sharedThreadPoolsLock = threading.Lock()
+
+def _sharedThreadPool(threads):
+    _sharedThreadPoolsLock.acquire()
+    try:
+        (pid, pool) = _sharedThreadPools.get(threads, (None, None))
+        if pid != os.getpid():
+            pool = ThreadPool(threads)
+            _sharedThreadPools[threads] = (os.getpid(), pool)
+        return pool
+    finally:
+        _sharedThreadPoolsLock.release()
 
-    def __init__(self, service):
+class ServiceHandler(object):
+    """
+    Answers JSON-RPC requests for the ServiceMethods of service. A batch,
+    i.e. an array of requests, is answered with an array of responses in
+    the same order, leaving out the notifications (nothing at all for a
+    batch of only those); its calls are made concurrently on up to threads
+    threads. With processes, methods marked with CPUBoundServiceMethod run
+    in that many worker processes instead of taking the GIL. Both pools are
+    set up when first needed; close() shuts them down. With sharePool, the
+    thread pool is one kept for the whole process instead, for handlers
+    that are made for a single request, and close() leaves it running.
+    """
+
+    def __init__(self, service, threads=4, processes=0, sharePool=False):
         self.service=service
+        self.threads = threads
+        self.processes = processes
+        self.sharePool = sharePool
+        self.__threadPool = None
+        self.__processPool = None
+        self.__poolLock = threading.Lock()
     
     def handleRequest(self, json):
-        err=None
-        result = None
-        id_=''
-        
         try:
             req = self.translateRequest(json)
         except ServiceRequestNotTranslatable, e:
-            err = e
-            req={'id':id_}
+            return self.translateResult(None, e, '')
+
+        if type(req) is list:
+            if not req:
+                return self.translateResult(None, BadServiceRequest(json), '')
+            # notifications, with a null id or none at all, are called but not answered
+            notifications = [type(r) is dict and r.get('id') == None for r in req]
+            req = [dict(r, id=None) if notification else r for (r, notification) in zip(req, notifications)]
+            if self.threads > 1 and len(req) > 1:
+                responses = self.__getThreadPool().map(self.dispatchRequest, req)
+            else:
+                responses = [self.dispatchRequest(r) for r in req]
+            responses = [response for (response, notification) in zip(responses, notifications) if not notification]
+            if not responses:
+                return ""
+            return "[" + ",".join([self.translateResult(result, err, id_) for (result, err, id_) in responses]) + "]"
 
-        if err==None:
-            try:
-                id_ = req['id']
-                methName = req['method']
-                args = req['params']
-            except:
-                err = BadServiceRequest(json)
+        (result, err, id_) = self.dispatchRequest(req)
+        return self.translateResult(result, err, id_)
+
+    def dispatchRequest(self, req):
+        """Calls the method one request asks for; returns (result, error, id)."""
+        err=None
+        result = None
+        id_=''
+
+        try:
+            id_ = req['id']
+            methName = req['method']
+            args = req['params']
+        except:
+            err = BadServiceRequest(req)
                 
         if err == None:
             try:
@@ -75,9 +151,21 @@ class ServiceHandler(object):
             except Exception, e:
                 err = e
 
-        resultdata = self.translateResult(result, err, id_)
+        return (result, err, id_)
 
-        return resultdata
+    def close(self):
+        self.__poolLock.acquire()
+        try:
+            (threadPool, processPool) = (self.__threadPool, self.__processPool)
+            (self.__threadPool, self.__processPool) = (None, None)
+        finally:
+            self.__poolLock.release()
+        if threadPool != None and not self.sharePool:
+            threadPool.close()
+            threadPool.join()
+        if processPool != None:
+            processPool.terminate()
+            processPool.join()
 
     def translateRequest(self, data):
         try:
@@ -97,8 +185,31 @@ class ServiceHandler(object):
             raise ServiceMethodNotFound(name)
 
     def invokeServiceEndpoint(self, meth, args):
+        if self.processes > 0 and getattr(meth, "IsCPUBound", False):
+            return self.__getProcessPool().apply(_invokeForked, (meth.__name__, args))
         return meth(*args)
 
+    def __getThreadPool(self):
+        self.__poolLock.acquire()
+        try:
+            if self.__threadPool == None:
+                if self.sharePool:
+                    self.__threadPool = _sharedThreadPool(self.threads)
+                else:
+                    self.__threadPool = ThreadPool(self.threads)
+            return self.__threadPool
+        finally:
+            self.__poolLock.release()
+
+    def __getProcessPool(self):
+        self.__poolLock.acquire()
+        try:
+            if self.__processPool == None:
+                self.__processPool = Pool(self.processes, _initWorker, (self.service,))
+            return self.__processPool
+        finally:
+            self.__poolLock.release()
+
     def translateResult(self, rslt, err, id_):
         if err != None:
             err = {"name": err.__class__.__name__, "message":err.message}
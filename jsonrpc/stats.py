@@ -0,0 +1,146 @@
+"""
+  Copyright (c) 2007 Jan-Klaas Kollhof
+
+  This file is part of jsonrpc.
+
+  jsonrpc is free software; you can redistribute it and/or modify
+  it under the terms of the GNU Lesser General Public License as published by
+  the Free Software Foundation; either version 2.1 of the License, or
+  (at your option) any later version.
+
+  This software is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU Lesser General Public License for more details.
+
+  You should have received a copy of the GNU Lesser General Public License
+  along with this software; if not, write to the Free Software
+  Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import bisect
+import threading
+from jsonrpc.json import dumps
+
+# upper bounds of the latency buckets, in seconds; one more bucket takes
+# everything above the last
+LatencyBuckets = [0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0]
+
+
+class Histogram(object):
+    def __init__(self, bounds=LatencyBuckets):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def asDict(self):
+        # the last bound is None, for "no limit"
+        buckets = [[bound, n] for (bound, n) in zip(self.bounds + [None], self.counts)]
+        return {"count": self.count, "total": self.total, "max": self.max, "buckets": buckets}
+
+
+class MethodStats(object):
+    def __init__(self):
+        self.calls = 0
+        self.requests = 0
+        self.errors = 0
+        self.requestBytes = 0
+        self.responseBytes = 0
+        self.networkTime = Histogram()
+        self.decodeTime = Histogram()
+
+    def asDict(self):
+        return {"calls": self.calls, "requests": self.requests, "errors": self.errors,
+                "requestBytes": self.requestBytes, "responseBytes": self.responseBytes,
+                "networkTime": self.networkTime.asDict(), "decodeTime": self.decodeTime.asDict()}
+
+
+class RPCStats(object):
+    """
+    Counts, byte totals and latency histograms per RPC method, for the
+    ServiceProxy (and everything derived from it) it is handed to:
+
+        stats = RPCStats()
+        proxy = ServiceProxy(url, stats=stats)
+        ...
+        print stats.dumps()
+
+    Network time runs from sending the request to having read the whole
+    response, decode time is the time spent in loads(). A batch counts once
+    per request, and once per call in it, under the name of its method (or
+    "(batch)" when it mixes methods). Calls that raised, be it an error
+    reported by the server or a failed connection, count as errors.
+
+    Listeners added with addListener are called with the method name and a
+    dict describing every request as it is recorded, e.g. to feed an
+    external metrics system.
+    """
+
+    def __init__(self):
+        self.__methods = {}
+        self.__listeners = []
+        self.__lock = threading.Lock()
+
+    def record(self, method, calls, requestBytes, responseBytes, networkTime, decodeTime, errors=0):
+        self.__lock.acquire()
+        try:
+            try:
+                stats = self.__methods[method]
+            except KeyError:
+                stats = self.__methods[method] = MethodStats()
+            stats.calls += calls
+            stats.requests += 1
+            stats.errors += errors
+            stats.requestBytes += requestBytes
+            stats.responseBytes += responseBytes
+            stats.networkTime.add(networkTime)
+            stats.decodeTime.add(decodeTime)
+            listeners = list(self.__listeners)
+        finally:
+            self.__lock.release()
+
+        if listeners:
+            sample = {"calls": calls, "errors": errors, "requestBytes": requestBytes, "responseBytes": responseBytes,
+                      "networkTime": networkTime, "decodeTime": decodeTime}
+            for fn in listeners:
+                fn(method, sample)
+
+    def addListener(self, fn):
+        self.__lock.acquire()
+        try:
+            self.__listeners.append(fn)
+        finally:
+            self.__lock.release()
+
+    def removeListener(self, fn):
+        self.__lock.acquire()
+        try:
+            self.__listeners.remove(fn)
+        finally:
+            self.__lock.release()
+
+    def asDict(self):
+        self.__lock.acquire()
+        try:
+            return dict([(method, stats.asDict()) for (method, stats) in self.__methods.items()])
+        finally:
+            self.__lock.release()
+
+    def dumps(self):
+        return dumps(self.asDict())
+
+    def reset(self):
+        self.__lock.acquire()
+        try:
+            self.__methods = {}
+        finally:
+            self.__lock.release()
@@ -0,0 +1,234 @@
+"""
+  Copyright (c) 2007 Jan-Klaas Kollhof
+
+  This file is part of jsonrpc.
+
+  jsonrpc is free software; you can redistribute it and/or modify
+  it under the terms of the GNU Lesser General Public License as published by
+  the Free Software Foundation; either version 2.1 of the License, or
+  (at your option) any later version.
+
+  This software is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU Lesser General Public License for more details.
+
+  You should have received a copy of the GNU Lesser General Public License
+  along with this software; if not, write to the Free Software
+  Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import re
+from jsonrpc.json import loads, JSONDecodeException
+
+WhitespaceRE = re.compile(r'[ \t\r\n]*')
+# skips to the next string literal or bracket; strings are matched whole so
+# that brackets inside them do not count
+StructureRE = re.compile(r'[^"\[\]{}]*(?:("[^"\\]*(?:\\.[^"\\]*)*")|([\[\]{}]))', re.S)
+ScalarEndRE = re.compile(r'[ \t\r\n,\]}]')
+
+
+class JSONStream(object):
+    """
+    Parses a JSON document while it is being read from fileobj and yields
+    the elements of the array found at path, one at a time.
+
+    path lists the object keys (or array indexes) leading from the top of
+    the document to the array, e.g. ["result", "tx"] for the transactions
+    of a getblock response. Only the element currently being decoded is
+    held in memory, on top of one chunk of input or, for an element larger
+    than a chunk, up to as much again as it takes. Each element is decoded
+    with jsonrpc.json.loads, so it comes out exactly as it would from
+    decoding the whole document.
+
+    Everything else along the path is decoded as usual and ends up in
+    siblings, one dict per object on the path: siblings[0] holds the other
+    keys of the top level object, siblings[-1] the other keys next to the
+    array. Keys that follow the array are only there once the iteration is
+    over. found tells whether the array was there at all.
+    """
+
+    def __init__(self, fileobj, path, chunkSize=65536):
+        self.__file = fileobj
+        self.__path = list(path)
+        self.__chunkSize = chunkSize
+        self.__buf = ""
+        self.__pos = 0
+        # input dropped from the front of the buffer, for error positions
+        self.__dropped = 0
+        self.__eof = False
+        self.siblings = []
+        self.found = False
+
+    def __iter__(self):
+        for item in self.__walk(self.__path):
+            yield item
+        self.__skipWhitespace()
+        if self.__pos < len(self.__buf):
+            raise JSONDecodeException("Expected end of input at %d" % (self.__dropped + self.__pos))
+
+    def __walk(self, path):
+        if not path:
+            self.found = True
+            for item in self.__array():
+                yield item
+            return
+
+        c = self.__peek()
+        if c == "{" and not isinstance(path[0], (int, long)):
+            fields = {}
+            self.siblings.append(fields)
+            self.__pos += 1
+            if self.__peek() == "}":
+                self.__pos += 1
+                return
+            while True:
+                key = self.__value()
+                if not isinstance(key, basestring):
+                    raise JSONDecodeException("Expected string as key")
+                self.__expect(":")
+                if key == path[0] and not self.found:
+                    for item in self.__walk(path[1:]):
+                        yield item
+                else:
+                    fields[key] = self.__value()
+                if self.__endOfContainer("}"):
+                    return
+        elif c == "[" and isinstance(path[0], (int, long)):
+            self.siblings.append({})
+            self.__pos += 1
+            if self.__peek() == "]":
+                self.__pos += 1
+                return
+            index = 0
+            while True:
+                if index == path[0] and not self.found:
+                    for item in self.__walk(path[1:]):
+                        yield item
+                else:
+                    self.__value()
+                index += 1
+                if self.__endOfContainer("]"):
+                    return
+        else:
+            # not what the path asked for (a null result, say)
+            self.__value()
+
+    def __array(self):
+        if self.__peek() != "[":
+            raise JSONDecodeException("Expected array at %d" % (self.__dropped + self.__pos))
+        self.__pos += 1
+        if self.__peek() == "]":
+            self.__pos += 1
+            return
+        while True:
+            yield self.__value()
+            if self.__endOfContainer("]"):
+                return
+
+    def __endOfContainer(self, close):
+        c = self.__peek()
+        self.__pos += 1
+        if c == close:
+            return True
+        elif c != ",":
+            raise JSONDecodeException("Expected , or %s at %d" % (close, self.__dropped + self.__pos - 1))
+        return False
+
+    def __expect(self, c):
+        if self.__peek() != c:
+            raise JSONDecodeException("Expected %s at %d" % (c, self.__dropped + self.__pos))
+        self.__pos += 1
+
+    def __value(self):
+        c = self.__peek()
+        start = self.__pos
+        if c in "[{":
+            end = self.__containerEnd(start)
+            text = self.__buf[start:end]
+        else:
+            end = self.__scalarEnd(start)
+            # loads wants something after a number to know it ended
+            text = self.__buf[start:end] + " "
+        self.__pos = end
+        value = loads(text)
+        self.__compact()
+        return value
+
+    def __containerEnd(self, start):
+        depth = 0
+        scan = start
+        while True:
+            match = StructureRE.match(self.__buf, scan)
+            if match == None:
+                # an unterminated string or no bracket in what we have yet
+                if not self.__fill():
+                    raise JSONDecodeException("Unexpected end of input")
+                continue
+            scan = match.end()
+            bracket = match.group(2)
+            if bracket == None:
+                continue
+            if bracket in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return scan
+
+    def __scalarEnd(self, start):
+        if self.__buf[start] == '"':
+            while True:
+                match = StructureRE.match(self.__buf, start)
+                if match != None:
+                    return match.end(1)
+                if not self.__fill():
+                    raise JSONDecodeException("Unexpected end of input")
+        while True:
+            match = ScalarEndRE.search(self.__buf, start)
+            if match != None:
+                return match.start()
+            if not self.__fill():
+                return len(self.__buf)
+
+    def __peek(self):
+        self.__skipWhitespace()
+        if self.__pos >= len(self.__buf):
+            raise JSONDecodeException("Unexpected end of input")
+        return self.__buf[self.__pos]
+
+    def __skipWhitespace(self):
+        while True:
+            self.__pos = WhitespaceRE.match(self.__buf, self.__pos).end()
+            if self.__pos < len(self.__buf) or not self.__fill():
+                return
+
+    def __fill(self):
+        # reads at least as much as is left unparsed in the buffer and joins
+        # it on in one go, so an element spanning many chunks is copied and
+        # rescanned a number of times logarithmic in its size, not once per
+        # chunk
+        if self.__eof:
+            return False
+        chunks = [self.__buf]
+        wanted = max(self.__chunkSize, len(self.__buf) - self.__pos)
+        read = 0
+        while read < wanted:
+            chunk = self.__file.read(self.__chunkSize)
+            if not chunk:
+                self.__eof = True
+                break
+            chunks.append(chunk)
+            read += len(chunk)
+        if not read:
+            return False
+        self.__buf = "".join(chunks)
+        return True
+
+    def __compact(self):
+        # drop what has been decoded, but not on every call so the copying
+        # stays proportional to the input
+        if self.__pos >= self.__chunkSize:
+            self.__buf = self.__buf[self.__pos:]
+            self.__dropped += self.__pos
+            self.__pos = 0
@@ -0,0 +1,215 @@
+"""
+  Copyright (c) 2007 Jan-Klaas Kollhof
+
+  This file is part of jsonrpc.
+
+  jsonrpc is free software; you can redistribute it and/or modify
+  it under the terms of the GNU Lesser General Public License as published by
+  the Free Software Foundation; either version 2.1 of the License, or
+  (at your option) any later version.
+
+  This software is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU Lesser General Public License for more details.
+
+  You should have received a copy of the GNU Lesser General Public License
+  along with this software; if not, write to the Free Software
+  Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import base64
+import errno
+import httplib
+import socket
+import threading
+import time
+import urllib
+import urlparse
+
+# the line of the BadStatusLine for a connection closed before any reply, as
+# the versions of httplib have it
+NoReplyLines = frozenset(["", repr(""), "No status line received - the server has closed the connection"])
+
+
+class HTTPTransport(object):
+    """
+    Posts JSON-RPC requests over a pool of persistent HTTP/1.1 connections.
+
+    At most poolSize connections are open at any time; callers beyond that
+    wait for a free one. Connections that sat idle for longer than
+    idleTimeout seconds are closed instead of reused, and a reused
+    connection that the server dropped in the meantime is replaced by a
+    fresh one and the request is sent again, as long as it cannot have
+    reached the server. One transport can be shared
+    by any number of threads.
+    """
+
+    def __init__(self, serviceURL, poolSize=4, idleTimeout=30, timeout=None):
+        url = urlparse.urlsplit(serviceURL)
+        if url.scheme == "https":
+            self.__connClass = httplib.HTTPSConnection
+        elif url.scheme == "http":
+            self.__connClass = httplib.HTTPConnection
+        else:
+            raise ValueError("Unsupported URL scheme: %s" % url.scheme)
+
+        self.__host = url.hostname
+        self.__port = url.port
+        self.__path = url.path or "/"
+        if url.query:
+            self.__path += "?" + url.query
+
+        self.__headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        if url.username != None:
+            credentials = "%s:%s" % (urllib.unquote(url.username), urllib.unquote(url.password or ""))
+            self.__headers["Authorization"] = "Basic " + base64.b64encode(credentials)
+
+        self.idleTimeout = idleTimeout
+        self.timeout = timeout
+        self.__slots = threading.Semaphore(poolSize)
+        self.__lock = threading.Lock()
+        # (connection, time it was last returned) pairs, most recent last
+        self.__idle = []
+
+    def request(self, body):
+        """Posts body and returns the complete response body."""
+        resp = self.open(body)
+        try:
+            data = resp.read()
+        finally:
+            resp.close()
+
+        if resp.status != 200 and not data:
+            raise IOError("http error", resp.status, resp.reason)
+        return data
+
+    def open(self, body):
+        """
+        Posts body and returns the response as a file-like object, for
+        reading it incrementally. Its connection goes back to the pool when
+        it is closed after having been read to the end.
+        """
+        if isinstance(body, unicode):
+            body = body.encode("utf-8")
+        self.__slots.acquire()
+        try:
+            (conn, reused) = self.__checkout()
+            try:
+                resp = self.__post(conn, body, reused)
+                if resp == None:
+                    # the server closed the idle connection under us, go
+                    # again on a fresh one
+                    conn.close()
+                    conn = self.__connect()
+                    resp = self.__post(conn, body, False)
+            except:
+                conn.close()
+                raise
+        except:
+            self.__slots.release()
+            raise
+        return PooledResponse(self, conn, resp)
+
+    def close(self):
+        """Closes all idle connections."""
+        self.__lock.acquire()
+        try:
+            idle = self.__idle
+            self.__idle = []
+        finally:
+            self.__lock.release()
+        for (conn, lastUsed) in idle:
+            conn.close()
+
+    def __post(self, conn, body, reused):
+        """
+        Posts body on conn and returns the response, or None if conn is a
+        reused one that the server had closed before the request got to it,
+        so that sending it again is safe. Failures once the request is out,
+        e.g. a timeout waiting for the response, are raised, as the server
+        may have acted on it.
+        """
+        try:
+            conn.request("POST", self.__path, body, self.__headers)
+        except socket.error, e:
+            if reused and e.errno in (errno.EPIPE, errno.ECONNRESET):
+                return None
+            raise
+        try:
+            return conn.getresponse()
+        except httplib.BadStatusLine, e:
+            # closed without a word in reply, as a server does with an idle
+            # connection; any other answer means the request got there
+            if reused and e.line in NoReplyLines:
+                return None
+            raise
+
+    def __connect(self):
+        if self.timeout != None:
+            return self.__connClass(self.__host, self.__port, timeout=self.timeout)
+        return self.__connClass(self.__host, self.__port)
+
+    def __checkout(self):
+        now = time.time()
+        stale = []
+        conn = None
+        self.__lock.acquire()
+        try:
+            while self.__idle:
+                (candidate, lastUsed) = self.__idle.pop()
+                if now - lastUsed <= self.idleTimeout:
+                    conn = candidate
+                    break
+                stale.append(candidate)
+            # anything older than what we just popped is stale as well
+            if conn != None:
+                while self.__idle and now - self.__idle[0][1] > self.idleTimeout:
+                    stale.append(self.__idle.pop(0)[0])
+        finally:
+            self.__lock.release()
+
+        for candidate in stale:
+            candidate.close()
+
+        if conn != None:
+            return (conn, True)
+        return (self.__connect(), False)
+
+    def release(self, conn, reusable):
+        # called by PooledResponse.close()
+        if reusable:
+            self.__lock.acquire()
+            try:
+                self.__idle.append((conn, time.time()))
+            finally:
+                self.__lock.release()
+        else:
+            conn.close()
+        self.__slots.release()
+
+
+class PooledResponse(object):
+    """An HTTP response that hands its connection back to the pool on close()."""
+
+    def __init__(self, transport, conn, resp):
+        self.__transport = transport
+        self.__conn = conn
+        self.__resp = resp
+        self.status = resp.status
+        self.reason = resp.reason
+
+    def read(self, amt=None):
+        return self.__resp.read(amt)
+
+    def close(self):
+        if self.__conn == None:
+            return
+        # only a response read to the end leaves the connection usable
+        reusable = self.__resp.isclosed() and not self.__resp.will_close
+        self.__resp.close()
+        self.__transport.release(self.__conn, reusable)
+        self.__conn = None
+
+    def __del__(self):
+        self.close()
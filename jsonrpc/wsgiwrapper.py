@@ -0,0 +1,40 @@
+
+from jsonrpc import ServiceHandler
+
+class WSGIServiceHandler(ServiceHandler):
+    """
+    A WSGI application answering JSON-RPC requests (and batches) for the
+    ServiceMethods of service. Unlike handleCGI it lives as long as the
+    WSGI server, so the service is set up once and not on every request.
+    Bodies larger than maxRequestSize bytes are turned down.
+    """
+
+    def __init__(self, service, maxRequestSize=1 << 20, threads=4, processes=0):
+        if service == None:
+            import __main__ as service
+
+        ServiceHandler.__init__(self, service, threads, processes)
+        self.maxRequestSize = maxRequestSize
+
+    def __call__(self, environ, start_response):
+        if environ.get("REQUEST_METHOD") != "POST":
+            return self.__fail(start_response, "405 Method Not Allowed", [("Allow", "POST")])
+        try:
+            contLen = int(environ.get("CONTENT_LENGTH"))
+        except (TypeError, ValueError):
+            return self.__fail(start_response, "411 Length Required")
+        if contLen > self.maxRequestSize:
+            return self.__fail(start_response, "413 Request Entity Too Large")
+
+        data = environ["wsgi.input"].read(contLen)
+        resultData = self.handleRequest(data)
+        start_response("200 OK", [("Content-Type", "application/json"), ("Content-Length", str(len(resultData)))])
+        return [resultData]
+
+    def __fail(self, start_response, status, headers=[]):
+        start_response(status, [("Content-Type", "text/plain"), ("Content-Length", str(len(status)))] + headers)
+        return [status]
+
+
+def wsgiApplication(service=None, maxRequestSize=1 << 20, threads=4, processes=0):
+    return WSGIServiceHandler(service, maxRequestSize, threads, processes)
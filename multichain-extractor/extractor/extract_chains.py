@@ -0,0 +1,12 @@
+import os
+from chainutil import BITCOIN_PROFILE, NAMECOIN_PROFILE, PEERCOIN_PROFILE
+from chainutil.extractor import main
+
+# the genesis files that come with the single-chain extractors
+here = os.path.dirname(os.path.abspath(__file__))
+genesis_dirs = {"bitcoin": os.path.join(here, "..", "..", "bitcoin-extractor", "extractor"),
+                "namecoin": os.path.join(here, "..", "..", "namecoin-extractor", "extract"),
+                "peercoin": os.path.join(here, "..", "..", "peercoin-extractor", "extractor")}
+
+main("Extract data from several blockchains at once.", [BITCOIN_PROFILE, NAMECOIN_PROFILE, PEERCOIN_PROFILE],
+     "multichain_extractor.conf", "multichain_extract.log", genesis_dirs)
@@ -0,0 +1,137 @@
+"""
+A chain for FakeDaemon to answer from, the way bitcoind does, and the
+configuration of a ChainExtractor extracting it.
+"""
+
+import ConfigParser
+import copy
+import logging
+import StringIO
+import sys
+import unittest
+from fakedaemon import FakeDaemon, RPCError
+
+
+class FakeChain(object):
+    """
+    Blocks of one coinbase transaction each, from height 0 up. reorg()
+    replaces the blocks from a height on, as another branch taking over
+    does; missing holds block hashes getblock does not find, once each.
+    """
+
+    def __init__(self, height):
+        self.blocks = []
+        self.missing = set()
+        self.extend(height)
+
+    def height(self):
+        return len(self.blocks) - 1
+
+    def extend(self, height, branch=0):
+        while len(self.blocks) <= height:
+            self.__add(branch)
+
+    def reorg(self, height, branch):
+        tip = self.height()
+        del self.blocks[height:]
+        self.extend(tip, branch)
+
+    def daemon(self):
+        return FakeDaemon(self.answer)
+
+    def __add(self, branch):
+        height = len(self.blocks)
+        block_hash = "%060x%04x" % (height + 1, branch)
+        txid = "%056x%04x0007" % (height + 1, branch)
+        tx = {"txid": txid, "hash": txid, "version": 1, "size": 60, "locktime": 0,
+              "vin": [{"coinbase": "03%06x" % height, "sequence": 4294967295}],
+              "vout": [{"value": 50.0, "n": 0, "scriptPubKey": {"asm": "", "hex": "51", "type": "nonstandard"}}],
+              "hex": "00" * 60}
+        block = {"hash": block_hash, "height": height, "size": 141, "version": 1, "merkleroot": txid,
+                 "time": 1231006505 + 600 * height, "nonce": 1, "bits": "1d00ffff", "difficulty": 1.0, "tx": [tx]}
+        if height:
+            block["previousblockhash"] = self.blocks[-1]["hash"]
+        self.blocks.append(block)
+
+    def answer(self, method, params):
+        if method == "getblockcount":
+            return self.height()
+        if method == "getblockchaininfo":
+            return {"chain": "main", "blocks": self.height(), "bestblockhash": self.blocks[-1]["hash"]}
+        if method == "getbestblockhash":
+            return self.blocks[-1]["hash"]
+        if method == "getblockhash":
+            if params[0] > self.height():
+                raise RPCError(-8, "Block height out of range")
+            return self.blocks[params[0]]["hash"]
+        if method == "getblock":
+            blocks = [block for block in self.blocks if block["hash"] == params[0]]
+            if not blocks or params[0] in self.missing:
+                self.missing.discard(params[0])
+                raise RPCError(-5, "Block not found")
+            block = copy.deepcopy(blocks[0])
+            if len(params) < 2 or params[1] in (1, True):
+                block["tx"] = [tx["txid"] for tx in block["tx"]]
+            return block
+        raise RPCError(-32601, "Method not found")
+
+
+def chain_config(daemon, **options):
+    """The config file of an extractor for the chain daemon answers for, as read by ConfigParser."""
+    scp = ConfigParser.RawConfigParser()
+    scp.add_section("bitcoind")
+    address = daemon.url.split("@")[1].rstrip("/")
+    for (option, value) in [("rpc_host", address), ("rpc_user", "user"), ("rpc_password", "secret"),
+                            ("rpc_fetch_workers", 2)] + sorted(options.items()):
+        scp.set("bitcoind", option, str(value))
+    return scp
+
+
+class QuietTestCase(unittest.TestCase):
+    """A test case that keeps what the extractor prints and logs to itself."""
+
+    def setUp(self):
+        self.stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        logging.disable(logging.NOTSET)
+
+
+class RecordingPublisher(object):
+    """
+    A publisher keeping what it is given in published, in order, as
+    (height, msg) or (None, msg) for a rollback. The messages are delivered
+    at flush(), or right away with deliver_at_once.
+    """
+
+    def __init__(self, deliver_at_once=True):
+        self.published = []
+        self.deliver_at_once = deliver_at_once
+        self.undelivered = []
+
+    def add_chain(self, name, exchange, queue, decimals):
+        pass
+
+    def publish(self, name, height, msg, delivered=None):
+        self.published.append((height, msg))
+        self.undelivered.append(delivered)
+        if self.deliver_at_once:
+            self.flush()
+
+    def rollback(self, name, orphaned, msg, delivered=None):
+        self.publish(name, None, msg, delivered)
+
+    def flush(self):
+        (undelivered, self.undelivered) = (self.undelivered, [])
+        for delivered in undelivered:
+            if delivered is not None:
+                delivered()
+
+    def idle(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,33 @@
+import json
+import os
+import unittest
+from chainutil.address import AddressValidator, is_valid_address
+from chainutil.chains import CHAINS
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+class ValidateAddressTest(unittest.TestCase):
+    """is_valid_address against the isvalid of each chain's validateaddress in data/validateaddress.json."""
+
+    def setUp(self):
+        with open(os.path.join(DATA_DIR, "validateaddress.json"), "r") as fh:
+            self.corpus = json.load(fh)["chains"]
+
+    def test_matches_validateaddress(self):
+        for (name, chain_corpus) in self.corpus.items():
+            for case in chain_corpus["addresses"]:
+                self.assertEqual(is_valid_address(str(case["address"]), CHAINS[name]), case["isvalid"],
+                                 "%s: %s (%s)" % (name, case["name"], case["address"]))
+
+    def test_validator_caches_the_same_answers(self):
+        for (name, chain_corpus) in self.corpus.items():
+            validator = AddressValidator(CHAINS[name], cache_size=4)
+            for repeat in range(2):
+                for case in chain_corpus["addresses"]:
+                    self.assertEqual(validator.is_valid(str(case["address"])), case["isvalid"],
+                                     "%s: %s (%s)" % (name, case["name"], case["address"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
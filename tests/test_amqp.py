@@ -0,0 +1,162 @@
+import time
+import unittest
+from chainutil.message import decode_message
+try:
+    from chainutil import extractor
+except ImportError:
+    # the extractor needs pika
+    extractor = None
+
+
+class FakeChannel(object):
+    """Records what is done on an AMQP channel; commits fail while fail_commits is set."""
+
+    def __init__(self):
+        self.published = []
+        self.committed = []
+        self.commits = 0
+        self.fail_commits = False
+        self.transactional = False
+
+    def tx_select(self):
+        self.transactional = True
+
+    def tx_commit(self):
+        if self.fail_commits:
+            # the broker drops what was published in the transaction
+            self.published = []
+            raise IOError("channel closed")
+        self.commits += 1
+        (self.committed, self.published) = (self.committed + self.published, [])
+
+    def exchange_declare(self, exchange, type):
+        pass
+
+    def queue_declare(self, queue):
+        pass
+
+    def queue_bind(self, exchange, queue):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append((exchange, routing_key, body, properties))
+
+
+class FakeConnection(object):
+
+    def __init__(self, parameters):
+        self.channel_ = FakeChannel()
+        self.events = 0
+        self.closed = False
+
+    def channel(self):
+        return self.channel_
+
+    def process_data_events(self):
+        self.events += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakePika(object):
+    """Stands in for pika in the extractor module, keeping the connections made."""
+
+    def __init__(self):
+        self.connections = []
+
+    def PlainCredentials(self, user, password):
+        return (user, password)
+
+    def ConnectionParameters(self, **parameters):
+        return parameters
+
+    def BasicProperties(self, **properties):
+        return properties
+
+    def BlockingConnection(self, parameters):
+        connection = FakeConnection(parameters)
+        self.connections.append(connection)
+        return connection
+
+
+@unittest.skipIf(extractor is None, "pika is not installed")
+class AMQPPublisherTest(unittest.TestCase):
+    """AMQPPublisher committing the messages in batches."""
+
+    def setUp(self):
+        self.pika = extractor.pika
+        extractor.pika = FakePika()
+        self.delivered = []
+
+    def tearDown(self):
+        extractor.pika = self.pika
+
+    def publisher(self, **options):
+        publisher = extractor.AMQPPublisher("localhost", 5672, "guest", "guest", **options)
+        publisher.add_chain("bitcoin", "bitcoin", "bitcoin", 8)
+        connection = extractor.pika.connections[-1]
+        self.assertTrue(connection.channel_.transactional)
+        return (publisher, connection.channel_)
+
+    def publish(self, publisher, height):
+        publisher.publish("bitcoin", height, {"height": height}, lambda: self.delivered.append(height))
+
+    def test_commits_a_batch_at_a_time(self):
+        (publisher, channel) = self.publisher(batch_size=3, flush_interval=60)
+        for height in range(7):
+            self.publish(publisher, height)
+        self.assertEqual(channel.commits, 2)
+        self.assertEqual(self.delivered, range(6))
+        self.assertEqual(len(channel.published), 1)
+        publisher.flush()
+        self.assertEqual(channel.commits, 3)
+        self.assertEqual(self.delivered, range(7))
+        self.assertEqual([decode_message(body)["height"] for (exchange, queue, body, properties) in channel.committed],
+                         range(7))
+        # nothing to commit
+        publisher.flush()
+        self.assertEqual(channel.commits, 3)
+
+    def test_flush_interval(self):
+        (publisher, channel) = self.publisher(batch_size=100, flush_interval=0.2)
+        self.publish(publisher, 1)
+        publisher.idle()
+        self.assertEqual((channel.commits, self.delivered), (0, []))
+        time.sleep(0.1)
+        self.publish(publisher, 2)
+        time.sleep(0.15)
+        # the first message is old enough, if the second is not
+        publisher.idle()
+        self.assertEqual((channel.commits, self.delivered), (1, [1, 2]))
+        self.publish(publisher, 3)
+        publisher.idle()
+        self.assertEqual(channel.commits, 1)
+        self.assertEqual(extractor.pika.connections[-1].events, 3)
+
+    def test_failed_commit_delivers_nothing(self):
+        (publisher, channel) = self.publisher(batch_size=2)
+        self.publish(publisher, 1)
+        channel.fail_commits = True
+        self.assertRaises(IOError, self.publish, publisher, 2)
+        self.assertEqual(self.delivered, [])
+        self.assertEqual(channel.committed, [])
+
+    def test_close_commits_the_rest(self):
+        (publisher, channel) = self.publisher(batch_size=10)
+        self.publish(publisher, 1)
+        publisher.rollback("bitcoin", [(1, "00")], {"rollback": ["00"]}, lambda: self.delivered.append(None))
+        publisher.close()
+        self.assertEqual(self.delivered, [1, None])
+        self.assertTrue(extractor.pika.connections[-1].closed)
+
+    def test_compressed_messages_tell_their_encoding(self):
+        (publisher, channel) = self.publisher(message_compression="zlib", batch_size=1)
+        self.publish(publisher, 1)
+        (exchange, queue, body, properties) = channel.committed[0]
+        self.assertEqual(properties, {"content_type": "application/json", "content_encoding": "zlib"})
+        self.assertEqual(decode_message(body, "zlib"), {"height": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+from jsonrpc import AmountHook
+from chainutil.archive import INDEX_NAME, ArchiveException, BlockArchive, is_archive
+from chainutil.message import encode_message, decode_message
+
+
+def block_message(height):
+    return {"block": {"hash": "%064x" % (height + 1), "height": height}, "parsed_txs": {}}
+
+
+class BlockArchiveTest(unittest.TestCase):
+    """BlockArchive, and what it makes of an archive after a crash."""
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "archive")
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.path))
+
+    def heights(self):
+        archive = BlockArchive(self.path)
+        try:
+            for (height, msg) in archive.blocks():
+                self.assertEqual(msg, block_message(height))
+            return archive.heights()
+        finally:
+            archive.close()
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.path) if name.startswith("segment"))
+
+    def test_append_and_rollback(self):
+        self.assertRaises(ArchiveException, BlockArchive, self.path)
+        archive = BlockArchive(self.path, write=True, segment_size=300)
+        for height in range(10):
+            archive.append(height, block_message(height))
+        archive.rollback(7)
+        archive.append(7, block_message(7))
+        archive.sync()
+        archive.close()
+        self.assertTrue(is_archive(self.path))
+        self.assertTrue(len(self.segments()) > 1)
+        self.assertEqual(self.heights(), range(8))
+
+    def test_reads_amounts_as_the_amqp_path_does(self):
+        msg = block_message(3)
+        msg["parsed_txs"] = {"0": {"txid": "ab", "vout": [{"value": 12.5, "n": 0}, {"value": 0.00000001, "n": 1}]}}
+        archive = BlockArchive(self.path, write=True)
+        archive.append(3, msg)
+        archive.close()
+        amounts = AmountHook(["value"], 8, OrderedDict)
+        archive = BlockArchive(self.path)
+        try:
+            read = archive.read(3, amounts)
+            self.assertEqual([vout["value"] for vout in read["parsed_txs"]["0"]["vout"]], [1250000000, 1])
+            self.assertTrue(isinstance(read["block"], OrderedDict))
+            self.assertEqual(read, decode_message(encode_message(msg, "zlib"), "zlib", amounts))
+            self.assertEqual(list(archive.blocks(amounts=amounts)), [(3, read)])
+        finally:
+            archive.close()
+
+    def test_recovers_from_a_record_torn_at_the_start_of_a_segment(self):
+        archive = BlockArchive(self.path, write=True, segment_size=300)
+        for height in range(11):
+            archive.append(height, block_message(height))
+        archive.rollback(7)
+        archive.append(7, block_message(7))
+        archive.sync()
+        archive.close()
+        # four records to a segment, so the 7 appended again starts the fourth; a crash while it was
+        # written, before it went to the index
+        self.assertEqual(len(self.segments()), 4)
+        last = os.path.join(self.path, self.segments()[-1])
+        with open(last, "r+b") as fh:
+            fh.truncate(10)
+        with open(os.path.join(self.path, INDEX_NAME), "r+b") as fh:
+            fh.seek(0, os.SEEK_END)
+            fh.truncate(fh.tell() - 17 - 5)
+
+        archive = BlockArchive(self.path, write=True, segment_size=300)
+        self.assertEqual(archive.heights(), range(7))
+        for height in range(7, 9):
+            archive.append(height, block_message(height))
+        archive.sync()
+        archive.close()
+        self.assertEqual(self.heights(), range(9))
+
+    def test_recovers_records_missing_from_the_index(self):
+        archive = BlockArchive(self.path, write=True, segment_size=300)
+        for height in range(6):
+            archive.append(height, block_message(height))
+        archive.sync()
+        archive.close()
+        with open(os.path.join(self.path, INDEX_NAME), "r+b") as fh:
+            fh.truncate(17 * 2 + 3)
+        archive = BlockArchive(self.path, write=True, segment_size=300)
+        archive.append(6, block_message(6))
+        archive.close()
+        self.assertEqual(self.heights(), range(7))
+
+
+if __name__ == "__main__":
+    unittest.main()
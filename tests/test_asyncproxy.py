@@ -0,0 +1,90 @@
+import threading
+import time
+import unittest
+from jsonrpc import JSONRPCException
+from jsonrpc.asyncproxy import AsyncServiceProxy, ProxyClosed, RPCTimeout
+from fakedaemon import FakeDaemon, RPCError
+
+
+class SlowChain(object):
+    """Answers getblockhash after wait seconds, keeping count of the calls in flight."""
+
+    def __init__(self):
+        self.wait = 0
+        self.inFlight = 0
+        self.mostInFlight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, method, params):
+        with self.lock:
+            self.inFlight += 1
+            self.mostInFlight = max(self.mostInFlight, self.inFlight)
+        try:
+            time.sleep(self.wait)
+            if params[0] < 0:
+                raise RPCError(-8, "Block height out of range")
+            return "%064x" % params[0]
+        finally:
+            with self.lock:
+                self.inFlight -= 1
+
+
+class AsyncServiceProxyTest(unittest.TestCase):
+    """AsyncServiceProxy against a local daemon."""
+
+    def setUp(self):
+        self.chain = SlowChain()
+        self.daemon = FakeDaemon(self.chain)
+        self.proxy = AsyncServiceProxy(self.daemon.url, maxInFlight=3)
+
+    def tearDown(self):
+        self.proxy.close()
+        self.daemon.close()
+
+    def test_results(self):
+        futures = [self.proxy.getblockhash(i) for i in range(10)]
+        self.assertEqual([f.result(5) for f in futures], ["%064x" % i for i in range(10)])
+        self.assertEqual(self.proxy.batch([("getblockhash", [i]) for i in range(4)], 2).result(5),
+                         ["%064x" % i for i in range(4)])
+
+    def test_errors(self):
+        future = self.proxy.getblockhash(-1)
+        self.assertRaises(JSONRPCException, future.result, 5)
+        self.assertEqual(future.exception().error["code"], -8)
+        self.assertEqual(self.proxy.batch([("getblockhash", [0]), ("getblockhash", [-1])]).exception(5).callIndex, 1)
+
+    def test_in_flight_limit(self):
+        self.chain.wait = 0.2
+        start = time.time()
+        futures = [self.proxy.getblockhash(i) for i in range(3)]
+        self.assertTrue(time.time() - start < 0.1)
+        # the fourth call waits for a free slot
+        futures.append(self.proxy.getblockhash(3))
+        self.assertTrue(time.time() - start >= 0.15)
+        futures.extend(self.proxy.getblockhash(i) for i in range(4, 9))
+        self.assertEqual([f.result(5) for f in futures], ["%064x" % i for i in range(9)])
+        self.assertEqual(self.chain.mostInFlight, 3)
+
+    def test_timeout_and_callbacks(self):
+        self.chain.wait = 0.3
+        future = self.proxy.getblockhash(1)
+        self.assertRaises(RPCTimeout, future.result, 0.05)
+        done = []
+        future.addDoneCallback(done.append)
+        self.assertEqual(future.result(5), "%064x" % 1)
+        self.assertEqual(done, [future])
+        future.addDoneCallback(done.append)
+        self.assertEqual(done, [future, future])
+
+    def test_close_waits_for_the_calls(self):
+        self.chain.wait = 0.1
+        futures = [self.proxy.getblockhash(i) for i in range(5)]
+        # closing a derived proxy leaves the calls running
+        self.proxy.getblockhash.close()
+        self.proxy.close()
+        self.assertTrue(all(f.done() for f in futures))
+        self.assertRaises(ProxyClosed, self.proxy.getblockhash, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from chainutil.block import hash_hex
+from chainutil.hashes import sha256d
+from chainutil.blockfile import BlockFileReader
+from chainutil.chains import BITCOIN
+
+# a coinbase transaction paying 50 coins to an empty script
+COINBASE = ("01000000" + "01" + "00" * 32 + "ffffffff" + "0100" + "ffffffff" +
+            "01" + "00f2052a01000000" + "00" + "00000000").decode("hex")
+
+
+def make_block(prev_hash, time, bits=0x207fffff):
+    """A block with just a coinbase, and its hash."""
+    header = struct.pack("<I32s32sIII", 1, prev_hash, sha256d(COINBASE), time, bits, 0)
+    return (header + "\x01" + COINBASE, sha256d(header))
+
+
+def record(block):
+    return BITCOIN.magic + struct.pack("<I", len(block)) + block
+
+
+class BlockFileReaderTest(unittest.TestCase):
+    """BlockFileReader on block files written out here."""
+
+    def setUp(self):
+        self.blocks_dir = tempfile.mkdtemp()
+        self.hashes = []
+        self.chain = []
+        prev_hash = "\x00" * 32
+        for height in range(5):
+            (block, prev_hash) = make_block(prev_hash, 1000 + height)
+            self.chain.append(block)
+            self.hashes.append(prev_hash)
+
+    def tearDown(self):
+        shutil.rmtree(self.blocks_dir)
+
+    def write(self, data, number=0):
+        with open(os.path.join(self.blocks_dir, "blk%05d.dat" % number), "ab") as fh:
+            fh.write(data)
+
+    def test_reads_the_chain(self):
+        self.write("".join(record(block) for block in self.chain))
+        reader = BlockFileReader(self.blocks_dir)
+        self.assertEqual(reader.height, 4)
+        self.assertEqual(reader.best_block_hash(), hash_hex(self.hashes[4]))
+        (block, txs) = reader.read_block(2)
+        self.assertEqual(block["hash"], hash_hex(self.hashes[2]))
+        self.assertEqual(block["confirmations"], 3)
+        self.assertEqual(block["previousblockhash"], hash_hex(self.hashes[1]))
+        self.assertEqual(block["nextblockhash"], hash_hex(self.hashes[3]))
+        self.assertEqual(len(txs), 1)
+        reader.close()
+
+    def test_tip_hash_changes_with_a_reorg_of_the_same_height(self):
+        self.write("".join(record(block) for block in self.chain))
+        reader = BlockFileReader(self.blocks_dir)
+        # a sibling of the tip with more work takes its place
+        (block, block_hash) = make_block(self.hashes[3], 2000, bits=0x1f7fffff)
+        self.write(record(block))
+        self.assertEqual(reader.update(), 4)
+        self.assertEqual(reader.best_block_hash(), hash_hex(block_hash))
+        self.assertEqual(reader.block_hash(4), hash_hex(block_hash))
+        reader.close()
+
+    def test_resyncs_after_a_damaged_record(self):
+        damaged = BITCOIN.magic + struct.pack("<I", 0xffffffff) + "\x00" * 100
+        cut_short = BITCOIN.magic + struct.pack("<I", 10000) + self.chain[2][:50]
+        self.write(record(self.chain[0]) + record(self.chain[1]) + damaged + cut_short +
+                   "".join(record(block) for block in self.chain[2:]))
+        reader = BlockFileReader(self.blocks_dir)
+        self.assertEqual(reader.height, 4)
+        self.assertEqual(reader.best_block_hash(), hash_hex(self.hashes[4]))
+        reader.close()
+
+    def test_waits_for_an_unfinished_last_record(self):
+        self.write("".join(record(block) for block in self.chain[:4]) + record(self.chain[4])[:60])
+        reader = BlockFileReader(self.blocks_dir)
+        self.assertEqual(reader.height, 3)
+        self.write(record(self.chain[4])[60:])
+        self.assertEqual(reader.update(), 4)
+        reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
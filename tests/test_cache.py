@@ -0,0 +1,103 @@
+import copy
+import os
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+from jsonrpc.cache import CachingServiceProxy, LRUCache, ResultCache
+
+RESULTS = {"getblockcount": 7, "verifychain": True, "getrawtransaction": "0100",
+           "decoderawtransaction": OrderedDict([("txid", "ab"), ("vout", [{"value": 1.5, "n": 0}])])}
+
+
+class FakeProxy(object):
+    """Answers every method with its entry in RESULTS, counting the calls that reach it."""
+
+    def __init__(self, calls, name=None):
+        self.calls = calls
+        self.name = name
+
+    def __getattr__(self, name):
+        return FakeProxy(self.calls, name)
+
+    def __call__(self, *args):
+        self.calls.append((self.name, args))
+        return copy.deepcopy(RESULTS[self.name])
+
+    def batch(self, calls, maxBatchSize=None):
+        self.calls.extend(calls)
+        return [copy.deepcopy(RESULTS[method]) for (method, params) in calls]
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_drops_the_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual((cache.get("a"), cache.get("c"), len(cache)), (1, 3, 2))
+
+
+class CachingServiceProxyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def proxy(self, cache):
+        return CachingServiceProxy(FakeProxy(self.calls), cache)
+
+    def test_hits_and_misses(self):
+        cache = ResultCache(RESULTS.keys(), 10)
+        proxy = self.proxy(cache)
+        for method in sorted(RESULTS):
+            for repeat in range(2):
+                self.assertEqual(getattr(proxy, method)("x"), RESULTS[method])
+        self.assertEqual(len(self.calls), len(RESULTS))
+        self.assertEqual((cache.hits, cache.misses), (len(RESULTS), len(RESULTS)))
+
+    def test_every_hit_is_a_copy(self):
+        proxy = self.proxy(ResultCache(["decoderawtransaction"], 10))
+        proxy.decoderawtransaction("x")["vout"].append("changed")
+        self.assertEqual(proxy.decoderawtransaction("x"), RESULTS["decoderawtransaction"])
+
+    def test_other_methods_are_passed_on(self):
+        proxy = self.proxy(ResultCache(["getrawtransaction"], 10))
+        proxy.getblockcount()
+        proxy.getblockcount()
+        self.assertEqual(len(self.calls), 2)
+
+    def test_batch_fetches_only_what_missed(self):
+        cache = ResultCache(["getblockcount", "getrawtransaction"], 10)
+        proxy = self.proxy(cache)
+        proxy.getblockcount()
+        calls = [("getblockcount", []), ("verifychain", []), ("getrawtransaction", ["x"])]
+        self.assertEqual(proxy.batch(calls), [7, True, "0100"])
+        self.assertEqual(self.calls[1:], calls[1:])
+        self.assertEqual(proxy.batch(calls), [7, True, "0100"])
+        self.assertEqual(self.calls[3:], calls[1:2])
+
+    def test_results_read_back_from_the_store(self):
+        path = os.path.join(self.dir, "rpc.cache")
+        cache = ResultCache(RESULTS.keys(), 10, path)
+        proxy = self.proxy(cache)
+        for method in RESULTS:
+            getattr(proxy, method)("x")
+        cache.close()
+        cache = ResultCache(RESULTS.keys(), 10, path)
+        proxy = self.proxy(cache)
+        for method in RESULTS:
+            self.assertEqual(getattr(proxy, method)("x"), RESULTS[method])
+        self.assertEqual(len(self.calls), len(RESULTS))
+        self.assertEqual((cache.hits, cache.misses), (len(RESULTS), 0))
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import ConfigParser
+import json
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from chainutil.extractor import ChainState, CheckpointStore
+except ImportError:
+    # the extractor needs pika
+    CheckpointStore = None
+
+
+@unittest.skipIf(CheckpointStore is None, "pika is not installed")
+class CheckpointStoreTest(unittest.TestCase):
+    """CheckpointStore replacing its file whole, and ChainState starting from it."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "extractor.checkpoint")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_missing_file(self):
+        store = CheckpointStore(self.path)
+        self.assertEqual(store.get("bitcoin"), None)
+        self.assertFalse(os.path.exists(self.path))
+        state = ChainState(store, "bitcoin")
+        self.assertEqual((state.last_known_block, state.provisional_blocks), (-1, []))
+
+    def test_state_from_the_config_file_before(self):
+        scp = ConfigParser.RawConfigParser()
+        scp.add_section("state")
+        scp.set("state", "last_known_block", "41")
+        scp.set("state", "provisional_blocks", "40:00aa,41:00bb")
+        state = ChainState(CheckpointStore(self.path), "bitcoin", scp)
+        self.assertEqual((state.last_known_block, state.provisional_blocks), (41, [(40, "00aa"), (41, "00bb")]))
+
+    def test_saved_entries_are_read_back(self):
+        store = CheckpointStore(self.path)
+        store.save("bitcoin", {"last_known_block": 5, "provisional_blocks": []})
+        store.save("namecoin", {"last_known_block": 7, "provisional_blocks": [[7, "00cc"]]})
+        store.save("bitcoin", {"last_known_block": 6, "provisional_blocks": []})
+        self.assertEqual(os.listdir(self.dir), ["extractor.checkpoint"])
+        state = ChainState(CheckpointStore(self.path), "namecoin")
+        self.assertEqual((state.last_known_block, state.provisional_blocks), (7, [(7, "00cc")]))
+        self.assertEqual(CheckpointStore(self.path).get("bitcoin")["last_known_block"], 6)
+
+    def test_crash_before_the_rename_keeps_the_old_file(self):
+        store = CheckpointStore(self.path)
+        store.save("bitcoin", {"last_known_block": 5, "provisional_blocks": []})
+        rename = os.rename
+        def crash(src, dst):
+            raise OSError("killed")
+        os.rename = crash
+        try:
+            self.assertRaises(OSError, store.save, "bitcoin", {"last_known_block": 6, "provisional_blocks": []})
+        finally:
+            os.rename = rename
+        self.assertEqual(CheckpointStore(self.path).get("bitcoin")["last_known_block"], 5)
+
+    def test_torn_temporary_file_is_ignored(self):
+        CheckpointStore(self.path).save("bitcoin", {"last_known_block": 5, "provisional_blocks": []})
+        with open(self.path + ".tmp", "w") as fh:
+            fh.write('{"bitcoin": {"last_known_bl')
+        store = CheckpointStore(self.path)
+        self.assertEqual(store.get("bitcoin")["last_known_block"], 5)
+        store.save("bitcoin", {"last_known_block": 6, "provisional_blocks": []})
+        self.assertEqual(os.listdir(self.dir), ["extractor.checkpoint"])
+        self.assertEqual(CheckpointStore(self.path).get("bitcoin")["last_known_block"], 6)
+
+    def test_corrupt_file_is_not_taken_for_a_missing_one(self):
+        # starting over would extract the whole chain again, so the script refuses to start
+        with open(self.path, "w") as fh:
+            fh.write("{not json")
+        self.assertRaises(ValueError, CheckpointStore, self.path)
+        with open(self.path, "r") as fh:
+            self.assertEqual(fh.read(), "{not json")
+
+    def test_state_saves_what_was_delivered(self):
+        store = CheckpointStore(self.path)
+        state = ChainState(store, "bitcoin")
+        state.last_known_block = 3
+        delivered = state.checkpoint()
+        state.last_known_block = 4
+        state.provisional_blocks.append((4, "00dd"))
+        state.checkpoint()
+        state.save()
+        with open(self.path, "r") as fh:
+            self.assertEqual(json.load(fh)["bitcoin"],
+                             {"last_known_block": -1, "last_published_block": 4, "provisional_blocks": []})
+        delivered()
+        state.save()
+        state = ChainState(CheckpointStore(self.path), "bitcoin")
+        self.assertEqual((state.last_known_block, state.provisional_blocks), (3, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
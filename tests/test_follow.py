@@ -0,0 +1,142 @@
+import socket
+import threading
+import time
+import unittest
+from chainutil.follow import TipFollower
+from chainutil.profiles import BITCOIN_PROFILE
+from fakechain import FakeChain, chain_config, QuietTestCase, RecordingPublisher
+try:
+    from chainutil.extractor import ChainExtractor, ChainConfig, ChainState, CheckpointStore
+except ImportError:
+    # the extractor needs pika
+    ChainExtractor = None
+
+
+class Tip(object):
+    """A tip that moves on at the given time, counting the looks at it."""
+
+    def __init__(self):
+        self.value = "a"
+        self.looks = []
+
+    def __call__(self):
+        self.looks.append(time.time())
+        return self.value
+
+
+def free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TipFollowerTest(unittest.TestCase):
+    """TipFollower waiting for a new tip, by polling and by notification."""
+
+    def test_waits_for_the_tip_to_move(self):
+        tip = Tip()
+        follower = TipFollower(tip, 0.02, 0.1)
+        threading.Timer(0.3, setattr, (tip, "value", "b")).start()
+        self.assertEqual(follower.wait(), "b")
+        # not once every min_interval all along
+        self.assertTrue(len(tip.looks) < 12)
+        gaps = [later - earlier for (earlier, later) in zip(tip.looks, tip.looks[1:])]
+        self.assertTrue(gaps[0] < 0.05 and max(gaps) > 0.08)
+
+    def test_idle_is_called_while_waiting(self):
+        tip = Tip()
+        idles = []
+        follower = TipFollower(tip, 0.2, 0.2)
+        threading.Timer(0.5, setattr, (tip, "value", "b")).start()
+        follower.wait(lambda: idles.append(time.time()), 0.05)
+        self.assertTrue(len(idles) >= 5)
+
+    def test_notification_cuts_the_wait_short(self):
+        tip = Tip()
+        port = free_port()
+        follower = TipFollower(tip, 5.0, 5.0, notify_port=port)
+        try:
+            def notify():
+                tip.value = "b"
+                sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                for i in range(3):
+                    sender.sendto("0" * 64, ("127.0.0.1", port))
+                sender.close()
+            threading.Timer(0.1, notify).start()
+            start = time.time()
+            self.assertEqual(follower.wait(), "b")
+            self.assertTrue(time.time() - start < 1.0)
+            # the notifications are all taken in one look
+            self.assertEqual(len(tip.looks), 2)
+        finally:
+            follower.close()
+
+
+@unittest.skipIf(ChainExtractor is None, "pika is not installed")
+class FollowModeTest(QuietTestCase):
+    """A ChainExtractor with follow publishing the blocks as they get confirmed."""
+
+    def setUp(self):
+        QuietTestCase.setUp(self)
+        self.chain = FakeChain(10)
+        self.daemon = self.chain.daemon()
+
+    def tearDown(self):
+        self.daemon.close()
+        QuietTestCase.tearDown(self)
+
+    def heights(self):
+        return [height for (height, msg) in self.publisher.published]
+
+    def wait_for(self, condition, timeout=5.0):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertTrue(condition())
+
+    def test_publishes_new_blocks_until_stopped(self):
+        state = ChainState(MemoryStore(), "bitcoin")
+        state.last_known_block = 0
+        extractor = ChainExtractor(BITCOIN_PROFILE, ChainConfig(chain_config(self.daemon), BITCOIN_PROFILE), state,
+                                   follow=True, min_poll_interval=0.05, max_poll_interval=0.1)
+        self.publisher = RecordingPublisher()
+        thread = threading.Thread(target=extractor.run, args=(self.publisher,))
+        thread.start()
+        try:
+            # 10 blocks, of which the last 6 are not deep enough yet
+            self.wait_for(lambda: self.heights() == range(1, 5))
+            self.wait_for(lambda: state.store.saved and state.store.saved[-1]["last_known_block"] == 4)
+            self.chain.extend(12)
+            self.wait_for(lambda: self.heights() == range(1, 7))
+            # a block lost while it is fetched is tried again
+            self.chain.missing.add(self.chain.blocks[7]["hash"])
+            self.chain.extend(13)
+            self.wait_for(lambda: self.heights() == range(1, 8))
+            self.assertEqual([msg["block"]["hash"] for (height, msg) in self.publisher.published],
+                             [block["hash"] for block in self.chain.blocks[1:8]])
+        finally:
+            extractor.stop()
+            thread.join(5.0)
+            extractor.close()
+        self.assertFalse(thread.isAlive())
+
+
+class MemoryStore(object):
+    """A CheckpointStore keeping the entries saved in memory."""
+
+    def __init__(self):
+        self.entries = {}
+        self.saved = []
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def save(self, name, entry):
+        self.entries[name] = entry
+        self.saved.append(entry)
+
+
+if __name__ == "__main__":
+    unittest.main()
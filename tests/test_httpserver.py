@@ -0,0 +1,101 @@
+import httplib
+import json
+import StringIO
+import threading
+import unittest
+from jsonrpc import ServiceProxy, ServiceMethod, JSONRPCException, WSGIServiceHandler
+from jsonrpc.httpserver import ServiceHTTPServer
+
+
+class Service(object):
+
+    @ServiceMethod
+    def add(self, a, b):
+        return a + b
+
+    @ServiceMethod
+    def fail(self):
+        raise ValueError("failed")
+
+
+class ServiceHTTPServerTest(unittest.TestCase):
+    """ServiceHTTPServer answering over real connections."""
+
+    def setUp(self):
+        self.server = ServiceHTTPServer(("127.0.0.1", 0), Service(), workers=2, maxRequestSize=1000)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        self.thread.start()
+        self.url = "http://127.0.0.1:%d/" % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def post(self, conn, body):
+        conn.request("POST", "/", body, {"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        return (resp.status, resp.read())
+
+    def test_calls_and_batches(self):
+        proxy = ServiceProxy(self.url)
+        self.assertEqual(proxy.add(1, 2), 3)
+        self.assertEqual(proxy.batch([("add", [i, i]) for i in range(5)], 2), [0, 2, 4, 6, 8])
+        try:
+            proxy.fail()
+            self.fail("no error")
+        except JSONRPCException, e:
+            self.assertEqual(e.error["name"], "ValueError")
+
+    def test_keeps_the_connection_alive(self):
+        conn = httplib.HTTPConnection("127.0.0.1", self.server.server_address[1])
+        for i in range(3):
+            (status, body) = self.post(conn, json.dumps({"method": "add", "params": [i, 1], "id": i}))
+            self.assertEqual((status, json.loads(body)["result"]), (200, i + 1))
+        sock = conn.sock
+        self.post(conn, json.dumps({"method": "add", "params": [0, 0], "id": 0}))
+        self.assertTrue(conn.sock is sock)
+        conn.close()
+
+    def test_turns_down_large_requests(self):
+        conn = httplib.HTTPConnection("127.0.0.1", self.server.server_address[1])
+        (status, body) = self.post(conn, json.dumps({"method": "add", "params": ["x" * 1000, "y"], "id": 1}))
+        self.assertEqual(status, 413)
+        conn.close()
+
+
+class WSGIServiceHandlerTest(unittest.TestCase):
+    """WSGIServiceHandler called the way a WSGI server does."""
+
+    def setUp(self):
+        self.app = WSGIServiceHandler(Service(), maxRequestSize=1000)
+
+    def tearDown(self):
+        self.app.close()
+
+    def call(self, method, body=None, length=None):
+        environ = {"REQUEST_METHOD": method, "wsgi.input": StringIO.StringIO(body or "")}
+        if length is not None:
+            environ["CONTENT_LENGTH"] = str(length)
+        started = []
+        data = "".join(self.app(environ, lambda status, headers: started.append((status, dict(headers)))))
+        (status, headers) = started[0]
+        self.assertEqual(int(headers["Content-Length"]), len(data))
+        return (status, data)
+
+    def test_answers(self):
+        body = json.dumps([{"method": "add", "params": [1, 2], "id": 1}, {"method": "nosuch", "params": [], "id": 2}])
+        (status, data) = self.call("POST", body, len(body))
+        self.assertEqual(status, "200 OK")
+        responses = json.loads(data)
+        self.assertEqual(responses[0]["result"], 3)
+        self.assertEqual(responses[1]["error"]["name"], "ServiceMethodNotFound")
+
+    def test_turns_down(self):
+        self.assertEqual(self.call("GET")[0], "405 Method Not Allowed")
+        self.assertEqual(self.call("POST", "{}")[0], "411 Length Required")
+        self.assertEqual(self.call("POST", "x" * 2000, 2000)[0], "413 Request Entity Too Large")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from collections import OrderedDict
+from chainutil.message import MessageFormatException, decode_message, encode_message
+from jsonrpc import AmountHook, dumps, loads
+
+
+def block_message():
+    """A block message the way the extractor publishes it."""
+    tx = OrderedDict()
+    tx["txid"] = "4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127b7afdeda33b"
+    tx["vout"] = [{"value": 50.0, "n": 0}, {"value": 0.00000001, "n": 1}]
+    tx["block_hash"] = "000000000019d6689c085ae165831e934ff763ae46a2a6c172b3f1b60a8ce26f"
+    tx["tx_index"] = 0
+    block = OrderedDict([("hash", tx["block_hash"]), ("height", 0), ("difficulty", 1.0), ("tx", [tx["txid"]])])
+    return OrderedDict([("block", block), ("parsed_txs", OrderedDict([(0, tx)]))])
+
+
+class MessageTest(unittest.TestCase):
+
+    def test_decodes_as_the_json_does(self):
+        msg = block_message()
+        amounts = AmountHook(["value"], 8, OrderedDict)
+        from_json = loads(dumps(msg), amounts)
+        self.assertEqual(from_json["parsed_txs"]["0"]["vout"][1]["value"], 1)
+        for compression in ("none", "zlib"):
+            data = encode_message(msg, compression)
+            self.assertEqual(repr(decode_message(data, compression, amounts)), repr(from_json))
+        self.assertEqual(encode_message(msg), dumps(msg))
+
+    def test_rejects_what_it_cannot_decode(self):
+        data = encode_message(block_message(), "zlib")
+        self.assertRaises(MessageFormatException, decode_message, data[:-3], "zlib")
+        self.assertRaises(MessageFormatException, decode_message, data, "none")
+        self.assertRaises(MessageFormatException, decode_message, data, "lz4")
+        self.assertRaises(MessageFormatException, encode_message, {}, "lz4")
+
+
+if __name__ == "__main__":
+    unittest.main()
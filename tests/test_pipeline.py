@@ -0,0 +1,91 @@
+import random
+import threading
+import time
+import unittest
+from chainutil.pipeline import OrderedPipeline
+
+
+class OrderedPipelineTest(unittest.TestCase):
+    """OrderedPipeline handing back results in order, whatever order they finish in."""
+
+    def test_results_in_order(self):
+        def fn(i):
+            time.sleep(random.random() * 0.01)
+            return i * i
+        for workers in (1, 3, 8):
+            pipeline = OrderedPipeline(fn, workers=workers, window=5)
+            self.assertEqual(list(pipeline.map(range(50))), [i * i for i in range(50)])
+
+    def test_later_items_finishing_first(self):
+        finished = []
+        def fn(i):
+            time.sleep(0.1 if i == 0 else 0)
+            finished.append(i)
+            return i
+        self.assertEqual(list(OrderedPipeline(fn, workers=4).map(range(4))), range(4))
+        self.assertEqual(finished[-1], 0)
+
+    def test_window_bounds_the_work_ahead(self):
+        started = []
+        release = threading.Event()
+        def fn(i):
+            started.append(i)
+            if i == 0:
+                release.wait()
+            return i
+        results = OrderedPipeline(fn, workers=8, window=3).map(range(20))
+        threading.Timer(0.2, release.set).start()
+        self.assertEqual(next(results), 0)
+        # nothing past the window was started while item 0 held it up
+        self.assertTrue(max(started) <= 3)
+        self.assertEqual(list(results), range(1, 20))
+
+    def test_max_size_bounds_what_is_held(self):
+        started = []
+        release = threading.Event()
+        def fn(i):
+            started.append(i)
+            if i == 0:
+                release.wait()
+            return "x" * 10
+        results = OrderedPipeline(fn, workers=4, window=16, max_size=25).map(range(10))
+        threading.Timer(0.2, release.set).start()
+        next(results)
+        self.assertTrue(len(started) <= 5)
+        self.assertEqual(len(list(results)), 9)
+
+    def test_error_raised_in_place(self):
+        def fn(i):
+            if i == 5:
+                raise ValueError("item %d" % i)
+            return i
+        results = []
+        try:
+            for result in OrderedPipeline(fn, workers=4, window=4).map(range(20)):
+                results.append(result)
+            self.fail("no error")
+        except ValueError, e:
+            self.assertEqual(str(e), "item 5")
+        self.assertEqual(results, range(5))
+
+    def test_workers_stop_when_the_consumer_does(self):
+        calls = []
+        def fn(i):
+            calls.append(i)
+            time.sleep(0.01)
+            return i
+        results = OrderedPipeline(fn, workers=2, window=2).map(xrange(10 ** 6))
+        next(results)
+        results.close()
+        time.sleep(0.1)
+        count = len(calls)
+        time.sleep(0.1)
+        self.assertEqual(len(calls), count)
+        self.assertTrue(count < 10)
+
+    def test_empty(self):
+        self.assertEqual(list(OrderedPipeline(lambda i: i).map([])), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
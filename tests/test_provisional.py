@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import unittest
+from chainutil.profiles import BITCOIN_PROFILE
+from fakechain import FakeChain, chain_config, QuietTestCase, RecordingPublisher
+try:
+    from chainutil.extractor import ChainExtractor, ChainConfig, ChainState, CheckpointStore
+except ImportError:
+    # the extractor needs pika
+    ChainExtractor = None
+
+
+@unittest.skipIf(ChainExtractor is None, "pika is not installed")
+class ProvisionalTest(QuietTestCase):
+    """Blocks published provisionally, and rolled back by a later run once they leave the chain."""
+
+    def setUp(self):
+        QuietTestCase.setUp(self)
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "extractor.checkpoint")
+        self.chain = FakeChain(10)
+        self.daemon = self.chain.daemon()
+
+    def tearDown(self):
+        self.daemon.close()
+        shutil.rmtree(self.dir)
+        QuietTestCase.tearDown(self)
+
+    def run_extractor(self, last_known_block=None):
+        """Runs an extractor to the tip as a fresh start of the script does, and returns what it published."""
+        state = ChainState(CheckpointStore(self.path), "bitcoin")
+        if last_known_block is not None:
+            state.last_known_block = last_known_block
+        extractor = ChainExtractor(BITCOIN_PROFILE, ChainConfig(chain_config(self.daemon), BITCOIN_PROFILE), state,
+                                   provisional=True)
+        publisher = RecordingPublisher()
+        try:
+            extractor.run(publisher)
+        finally:
+            extractor.close()
+        state.save()
+        return publisher.published
+
+    def entry(self):
+        return CheckpointStore(self.path).get("bitcoin")
+
+    def hashes(self, start, end):
+        return [(height, self.chain.blocks[height]["hash"]) for height in range(start, end + 1)]
+
+    def test_blocks_are_marked_until_deep_enough(self):
+        published = self.run_extractor(0)
+        self.assertEqual([height for (height, msg) in published], range(1, 11))
+        # 6 confirmations are needed
+        self.assertEqual([msg["provisional"] for (height, msg) in published], [False] * 4 + [True] * 6)
+        self.assertEqual([msg["confirmations"] for (height, msg) in published], range(10, 0, -1))
+        self.assertEqual(self.entry()["provisional_blocks"], [list(block) for block in self.hashes(5, 10)])
+
+        self.chain.extend(13)
+        published = self.run_extractor()
+        self.assertEqual([height for (height, msg) in published], [11, 12, 13])
+        self.assertEqual(self.entry()["provisional_blocks"], [list(block) for block in self.hashes(8, 13)])
+
+    def test_rollback_after_a_restart(self):
+        self.run_extractor(0)
+        orphaned = self.hashes(8, 10)
+        self.chain.reorg(8, 1)
+        self.chain.extend(11, 1)
+
+        published = self.run_extractor()
+        (height, rollback) = published[0]
+        self.assertEqual(height, None)
+        # the last one first
+        self.assertEqual(rollback["rollback"], [block_hash for (height, block_hash) in reversed(orphaned)])
+        self.assertEqual([height for (height, msg) in published[1:]], [8, 9, 10, 11])
+        self.assertEqual([msg["block"]["hash"] for (height, msg) in published[1:]],
+                         [block_hash for (height, block_hash) in self.hashes(8, 11)])
+        entry = self.entry()
+        self.assertEqual(entry["last_known_block"], 11)
+        self.assertEqual(entry["provisional_blocks"], [list(block) for block in self.hashes(6, 11)])
+
+        # nothing left to roll back
+        self.assertEqual(self.run_extractor(), [])
+
+    def test_whole_provisional_branch_replaced(self):
+        self.run_extractor(0)
+        self.chain.reorg(5, 1)
+        published = self.run_extractor()
+        self.assertEqual(len(published[0][1]["rollback"]), 6)
+        self.assertEqual([height for (height, msg) in published[1:]], range(5, 11))
+
+    def test_undelivered_blocks_are_not_checkpointed(self):
+        CheckpointStore(self.path).save("bitcoin", {"last_known_block": 0, "provisional_blocks": []})
+        state = ChainState(CheckpointStore(self.path), "bitcoin")
+        extractor = ChainExtractor(BITCOIN_PROFILE, ChainConfig(chain_config(self.daemon), BITCOIN_PROFILE), state,
+                                   provisional=True, checkpoint_blocks=1)
+        publisher = RecordingPublisher(deliver_at_once=False)
+        try:
+            extractor.run(publisher)
+        finally:
+            extractor.close()
+        state.save()
+        self.assertEqual(self.entry()["last_known_block"], 0)
+        self.assertEqual(self.entry()["last_published_block"], 10)
+        publisher.flush()
+        state.save()
+        self.assertEqual(self.entry()["last_known_block"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
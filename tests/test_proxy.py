@@ -0,0 +1,74 @@
+import unittest
+from jsonrpc import ServiceProxy, JSONRPCException
+from fakedaemon import FakeDaemon, RPCError
+
+
+def answer(method, params):
+    if method == "getblockhash":
+        if params[0] < 0:
+            raise RPCError(-8, "Block height out of range")
+        return "%064x" % params[0]
+    if method == "getblockcount":
+        return 10
+    raise RPCError(-32601, "Method not found")
+
+
+class ServiceProxyBatchTest(unittest.TestCase):
+    """ServiceProxy.batch against a local daemon."""
+
+    def setUp(self):
+        self.daemon = FakeDaemon(answer)
+        self.proxy = ServiceProxy(self.daemon.url)
+
+    def tearDown(self):
+        self.daemon.close()
+
+    def test_results_in_call_order(self):
+        calls = [("getblockhash", [i]) for i in range(5)] + [("getblockcount", [])]
+        self.assertEqual(self.proxy.batch(calls), ["%064x" % i for i in range(5)] + [10])
+        self.assertEqual(len(self.daemon.requests), 1)
+
+    def test_responses_matched_by_id(self):
+        self.daemon.reverse_batches = True
+        self.assertEqual(self.proxy.batch([("getblockhash", [i]) for i in range(5)]), ["%064x" % i for i in range(5)])
+
+    def test_max_batch_size(self):
+        calls = [("getblockhash", [i]) for i in range(10)]
+        self.assertEqual(self.proxy.batch(calls, 4), ["%064x" % i for i in range(10)])
+        self.assertEqual([len(body) for body in self.daemon.requests], [4, 4, 2])
+        self.assertEqual(self.daemon.calls(), [(method, list(params)) for (method, params) in calls])
+
+    def test_no_calls(self):
+        self.assertEqual(self.proxy.batch([]), [])
+        self.assertEqual(self.daemon.requests, [])
+
+    def test_error_tells_the_call(self):
+        calls = [("getblockhash", [i]) for i in range(10)]
+        calls[6] = ("getblockhash", [-1])
+        for maxBatchSize in (None, 4):
+            try:
+                self.proxy.batch(calls, maxBatchSize)
+                self.fail("no error")
+            except JSONRPCException, e:
+                self.assertEqual(e.callIndex, 6)
+                self.assertEqual(e.error["code"], -8)
+
+    def test_single_call_error_has_no_index(self):
+        try:
+            self.proxy.getblockhash(-1)
+            self.fail("no error")
+        except JSONRPCException, e:
+            self.assertEqual(e.callIndex, None)
+
+    def test_daemon_without_batches(self):
+        self.daemon.batches = False
+        try:
+            self.proxy.batch([("getblockhash", [i]) for i in range(10)], 4)
+            self.fail("no error")
+        except JSONRPCException, e:
+            self.assertEqual(e.callIndex, 0)
+            self.assertEqual(e.error["code"], -32700)
+
+
+if __name__ == "__main__":
+    unittest.main()
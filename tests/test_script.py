@@ -0,0 +1,30 @@
+import json
+import os
+import unittest
+from chainutil.script import decode_script
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# what decode_script has to agree with decodescript on
+FIELDS = ("asm", "type", "reqSigs", "addresses")
+
+
+class DecodeScriptTest(unittest.TestCase):
+    """decode_script against the answers of the daemon's decodescript in data/decodescript.json."""
+
+    def test_matches_decodescript(self):
+        with open(os.path.join(DATA_DIR, "decodescript.json"), "r") as fh:
+            corpus = json.load(fh)
+        for case in corpus["scripts"]:
+            decoded = decode_script(str(case["hex"]))
+            for field in FIELDS:
+                self.assertEqual(decoded.get(field), case["result"].get(field),
+                                 "%s (%s): %s" % (case["name"], case["hex"], field))
+
+    def test_rejects_non_hex(self):
+        self.assertRaises(ValueError, decode_script, "76a9zz")
+        self.assertRaises(ValueError, decode_script, "76a")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import time
+import unittest
+from jsonrpc.serviceHandler import ServiceHandler, ServiceMethod, CPUBoundServiceMethod
+
+
+class Service(object):
+    """Methods to call, keeping a list of the calls made."""
+
+    def __init__(self):
+        self.calls = []
+        self.inFlight = 0
+        self.mostInFlight = 0
+        self.lock = threading.Lock()
+
+    @ServiceMethod
+    def echo(self, value):
+        self.calls.append(value)
+        return value
+
+    @ServiceMethod
+    def fail(self, message):
+        raise ValueError(message)
+
+    @ServiceMethod
+    def slow(self, value):
+        with self.lock:
+            self.inFlight += 1
+            self.mostInFlight = max(self.mostInFlight, self.inFlight)
+        time.sleep(0.1)
+        with self.lock:
+            self.inFlight -= 1
+        return value
+
+    @CPUBoundServiceMethod
+    def pid(self):
+        return os.getpid()
+
+    def hidden(self):
+        return "not a service method"
+
+
+def request(method, params, id_=1):
+    return {"method": method, "params": params, "id": id_}
+
+
+class ServiceHandlerTest(unittest.TestCase):
+    """ServiceHandler on single requests and on batches."""
+
+    def setUp(self):
+        self.service = Service()
+        self.handler = ServiceHandler(self.service)
+
+    def tearDown(self):
+        self.handler.close()
+
+    def handle(self, body):
+        return json.loads(self.handler.handleRequest(json.dumps(body)))
+
+    def test_single_request(self):
+        self.assertEqual(self.handle(request("echo", ["a"], 7)), {"result": "a", "error": None, "id": 7})
+        self.assertEqual(self.handle(request("hidden", []))["error"]["name"], "ServiceMethodNotFound")
+
+    def test_batch_answers_in_order(self):
+        responses = self.handle([request("echo", [i], i) for i in range(20)])
+        self.assertEqual([(r["id"], r["result"]) for r in responses], [(i, i) for i in range(20)])
+
+    def test_mixed_errors_and_results(self):
+        responses = self.handle([request("echo", [1], 1), request("fail", ["no"], 2), {"id": 3},
+                                 request("nosuchmethod", [], 4), request("echo", [5], 5)])
+        self.assertEqual([r["id"] for r in responses], [1, 2, 3, 4, 5])
+        self.assertEqual([r["result"] for r in responses], [1, None, None, None, 5])
+        self.assertEqual([r["error"] and r["error"]["name"] for r in responses],
+                         [None, "ValueError", "BadServiceRequest", "ServiceMethodNotFound", None])
+        self.assertEqual(responses[1]["error"]["message"], "no")
+
+    def test_notifications_are_called_but_not_answered(self):
+        notification = {"method": "echo", "params": ["without id"]}
+        responses = self.handle([request("echo", ["null id"], None), request("echo", ["answered"], 2), notification])
+        self.assertEqual(responses, [{"result": "answered", "error": None, "id": 2}])
+        self.assertEqual(sorted(self.service.calls), ["answered", "null id", "without id"])
+        self.assertEqual(self.handler.handleRequest(json.dumps([notification, notification])), "")
+
+    def test_empty_batch(self):
+        self.assertEqual(self.handle([])["error"]["name"], "BadServiceRequest")
+
+    def test_batch_calls_run_concurrently(self):
+        start = time.time()
+        responses = self.handle([request("slow", [i], i) for i in range(4)])
+        self.assertEqual([r["result"] for r in responses], range(4))
+        self.assertEqual(self.service.mostInFlight, 4)
+        self.assertTrue(time.time() - start < 0.35)
+
+    def test_close_joins_the_thread_pool(self):
+        before = threading.activeCount()
+        handler = ServiceHandler(self.service, threads=3)
+        handler.handleRequest(json.dumps([request("echo", [i], i) for i in range(3)]))
+        self.assertTrue(threading.activeCount() > before)
+        handler.close()
+        self.assertEqual(threading.activeCount(), before)
+
+    def test_shared_thread_pool(self):
+        # as the CGI and mod_python entry points do, a handler per request
+        for i in range(5):
+            handler = ServiceHandler(self.service, threads=3, sharePool=True)
+            responses = json.loads(handler.handleRequest(json.dumps([request("echo", [i], 1), request("echo", [i], 2)])))
+            self.assertEqual([r["result"] for r in responses], [i, i])
+            handler.close()
+            if i == 0:
+                running = threading.activeCount()
+        self.assertEqual(threading.activeCount(), running)
+
+    def test_cpu_bound_methods_run_in_worker_processes(self):
+        handler = ServiceHandler(self.service, processes=2)
+        try:
+            pids = set(r["result"] for r in json.loads(handler.handleRequest(json.dumps([request("pid", [], i) for i in range(8)]))))
+            self.assertFalse(os.getpid() in pids)
+            self.assertEqual(self.handle(request("pid", [], 1))["result"], os.getpid())
+        finally:
+            handler.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
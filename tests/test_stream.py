@@ -0,0 +1,70 @@
+import StringIO
+import unittest
+from jsonrpc.json import loads, JSONDecodeException
+from jsonrpc.stream import JSONStream
+
+GETBLOCK = ('{"result": {"hash": "00ab", "tx": [{"txid": "01", "vout": [{"value": 50.00000000, "n": 0}]}, '
+            '{"txid": "02", "vin": [{"txid": "01", "vout": 0, "scriptSig": {"asm": "[ALL] {}", "hex": "\\"]"}}]}, '
+            '"\\u00e9scaped", 12.5e-3, null], "height": 7}, "error": null, "id": "jsonrpc"}')
+
+
+class CountingFile(object):
+    """A file that keeps count of the bytes read from it."""
+
+    def __init__(self, data):
+        self.data = StringIO.StringIO(data)
+        self.read_bytes = 0
+
+    def read(self, size):
+        chunk = self.data.read(size)
+        self.read_bytes += len(chunk)
+        return chunk
+
+
+class JSONStreamTest(unittest.TestCase):
+    """JSONStream taking the elements of an array out of a document."""
+
+    def stream(self, doc, path, chunkSize=65536):
+        return JSONStream(StringIO.StringIO(doc), path, chunkSize)
+
+    def test_elements_as_loads_gives_them(self):
+        expected = loads(GETBLOCK)["result"]["tx"]
+        for chunkSize in (1, 2, 7, 65536):
+            stream = self.stream(GETBLOCK, ["result", "tx"], chunkSize)
+            self.assertEqual(list(stream), expected)
+            self.assertTrue(stream.found)
+            self.assertEqual(stream.siblings, [{"error": None, "id": "jsonrpc"}, {"hash": "00ab", "height": 7}])
+
+    def test_missing_array(self):
+        stream = self.stream('{"result": null, "error": {"code": -5, "message": "Block not found"}, "id": 1}', ["result", "tx"])
+        self.assertEqual(list(stream), [])
+        self.assertFalse(stream.found)
+        self.assertEqual(stream.siblings[0]["error"]["code"], -5)
+
+    def test_array_in_a_batch_response(self):
+        doc = '[{"result": [1, 2], "id": 0}, {"result": [3, [4, 5]], "id": 1}]'
+        self.assertEqual(list(self.stream(doc, [1, "result"], 3)), [3, [4, 5]])
+
+    def test_element_spanning_many_chunks(self):
+        tx = {"txid": "03", "hex": "ab" * 50000, "vin": [{"coinbase": "]}" * 1000}]}
+        doc = '{"result": {"tx": [%s, %s]}}' % (GETBLOCK, '{"txid": "03", "hex": "%s", "vin": [{"coinbase": "%s"}]}' % (tx["hex"], tx["vin"][0]["coinbase"]))
+        items = list(self.stream(doc, ["result", "tx"], 16))
+        self.assertEqual(items, [loads(GETBLOCK), tx])
+
+    def test_reads_as_it_goes(self):
+        doc = '{"result": {"tx": [%s]}}' % ",".join(['{"txid": "%064x"}' % i for i in range(1000)])
+        fh = CountingFile(doc)
+        items = iter(JSONStream(fh, ["result", "tx"], 1024))
+        self.assertEqual(next(items), {"txid": "%064x" % 0})
+        self.assertTrue(fh.read_bytes < 4096)
+        self.assertEqual(len(list(items)), 999)
+        self.assertEqual(fh.read_bytes, len(doc))
+
+    def test_malformed_input(self):
+        for doc in ['{"result": {"tx": [1, 2}}', '{"result": {"tx": [1, 2]}} x', '{"result": {"tx": [1, "2]}}',
+                    '{"result": {"tx": {}}}', '{"result" {"tx": []}}']:
+            self.assertRaises(JSONDecodeException, list, self.stream(doc, ["result", "tx"], 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
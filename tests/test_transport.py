@@ -0,0 +1,71 @@
+import json
+import socket
+import threading
+import time
+import unittest
+from jsonrpc.transport import HTTPTransport
+from fakedaemon import FakeDaemon
+
+
+def echo(method, params):
+    return params
+
+
+def call(transport, params):
+    return json.loads(transport.request(json.dumps({"method": "echo", "params": params, "id": 1})))["result"]
+
+
+class HTTPTransportTest(unittest.TestCase):
+    """HTTPTransport against a local server."""
+
+    def setUp(self):
+        self.daemon = FakeDaemon(echo)
+
+    def tearDown(self):
+        self.daemon.close()
+
+    def test_reuses_the_connection(self):
+        transport = HTTPTransport(self.daemon.url)
+        for i in range(3):
+            self.assertEqual(call(transport, [i]), [i])
+        self.assertEqual(self.daemon.connections, 1)
+        transport.close()
+
+    def test_reconnects_when_the_server_dropped_the_idle_connection(self):
+        self.daemon.drop_idle = True
+        transport = HTTPTransport(self.daemon.url)
+        self.assertEqual(call(transport, [1]), [1])
+        # the server's close reaches the pooled connection
+        time.sleep(0.1)
+        self.assertEqual(call(transport, [2]), [2])
+        self.assertEqual(self.daemon.connections, 2)
+        self.assertEqual(len(self.daemon.requests), 2)
+        transport.close()
+
+    def test_does_not_send_again_after_a_timeout(self):
+        transport = HTTPTransport(self.daemon.url, timeout=0.3)
+        self.assertEqual(call(transport, [1]), [1])
+        self.daemon.delay = 0.6
+        self.assertRaises(socket.timeout, call, transport, [2])
+        time.sleep(0.8)
+        self.assertEqual(len(self.daemon.requests), 2)
+        transport.close()
+
+    def test_waits_for_a_free_connection(self):
+        transport = HTTPTransport(self.daemon.url, poolSize=1)
+        first = transport.open(json.dumps({"method": "echo", "params": [1], "id": 1}))
+        got = []
+        thread = threading.Thread(target=lambda: got.append(call(transport, [2])))
+        thread.start()
+        time.sleep(0.2)
+        self.assertEqual(got, [])
+        first.read()
+        first.close()
+        thread.join(5)
+        self.assertEqual(got, [[2]])
+        self.assertEqual(self.daemon.connections, 1)
+        transport.close()
+
+
+if __name__ == "__main__":
+    unittest.main()